@@ -1,20 +1,91 @@
+import hashlib
+import importlib.util
 import logging
+import multiprocessing
 import os
 import shutil
+import sqlite3
 import tempfile
+import threading
+import time
+import tracemalloc
+import uuid
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
-from io import BytesIO
 
 import pandas as pd
-from flask import Flask, flash, redirect, render_template, request, send_file, url_for
+from flask import (
+    Flask,
+    Request,
+    Response,
+    current_app,
+    flash,
+    jsonify,
+    redirect,
+    render_template,
+    request,
+    send_file,
+    url_for,
+)
 from werkzeug.utils import secure_filename
 
+from attendance_core import (
+    ATTENDANCE_DUPLICATES,
+    OUTPUT_COLUMNS,
+    OUTPUT_FORMATS,
+    build_report,
+    finalize_report,
+    iter_csv,
+    iter_ndjson,
+    load_report,
+    merge_reports,
+    process_batch,
+    process_files,  # noqa: F401 - re-exported for existing callers
+    validate_report,
+    write_report,
+)
+from attendance_ledger import apply_history, week_start
+from attendance_metrics import MetricsRegistry, StageTimer, stage
+from attendance_preview import PREVIEW_SORTS, ReportPreview
+
+
+
+class UploadRequest(Request):
+    """Keeps each uploaded file in memory up to UPLOAD_SPOOL_BYTES before spilling it to a temporary file."""
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        return tempfile.SpooledTemporaryFile(max_size=current_app.config['UPLOAD_SPOOL_BYTES'], mode='rb+')
+
+
 app = Flask(__name__)
+app.request_class = UploadRequest
 app.secret_key = os.environ.get('SECRET_KEY', 'dev-secret-key-change-me')
 default_upload_root = '/tmp/uploads' if os.name != 'nt' else os.path.join(os.getcwd(), 'uploads')
 app.config['UPLOAD_FOLDER'] = os.environ.get('UPLOAD_FOLDER', default_upload_root)
 app.config['ALLOWED_EXTENSIONS'] = {'csv', 'xlsx'}
-app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16 MB limit
+app.config['MAX_CONTENT_LENGTH'] = int(os.environ.get('MAX_CONTENT_LENGTH', 16 * 1024 * 1024))  # 16 MB limit
+app.config['UPLOAD_CHUNK_SIZE'] = 64 * 1024  # bytes copied per read when saving uploads
+app.config['UPLOAD_SPOOL_BYTES'] = int(os.environ.get('UPLOAD_SPOOL_BYTES', 8 * 1024 * 1024))  # per file, before spilling to disk
+app.config['CSV_CHUNK_ROWS'] = int(os.environ.get('CSV_CHUNK_ROWS', 5000))  # rows per streamed CSV block
+app.config['RESULT_CACHE_MAX_BYTES'] = int(os.environ.get('RESULT_CACHE_MAX_BYTES', 200 * 1024 * 1024))  # 0 disables the cache
+app.config['RESULT_CACHE_TTL'] = int(os.environ.get('RESULT_CACHE_TTL', 7 * 24 * 60 * 60))  # seconds
+app.config['PREVIEW_MAX_BYTES'] = int(os.environ.get('PREVIEW_MAX_BYTES', 100 * 1024 * 1024))  # 0 keeps no previews
+app.config['PREVIEW_TTL'] = int(os.environ.get('PREVIEW_TTL', 60 * 60))  # seconds an unused preview is kept
+app.config['JOB_WORKERS'] = int(os.environ.get('JOB_WORKERS', 1))  # background processes per gunicorn worker
+app.config['JOB_TTL'] = int(os.environ.get('JOB_TTL', 24 * 60 * 60))  # seconds finished job results are kept
+app.config['MAX_CONCURRENT_JOBS'] = int(os.environ.get('MAX_CONCURRENT_JOBS', 0))  # reports processed at once per worker; 0 is unlimited
+app.config['JOB_SLOT_TIMEOUT'] = float(os.environ.get('JOB_SLOT_TIMEOUT', 30))  # seconds to wait for a slot before a 503
+app.config['BATCH_WORKERS'] = int(os.environ.get('BATCH_WORKERS', 0)) or None  # processes per batch; unset uses every core
+app.config['LEDGER_PATH'] = os.environ.get('LEDGER_PATH')  # SQLite weekly history; defaults to UPLOAD_FOLDER/ledger.sqlite3
+app.config['ROLLING_WEEKS'] = int(os.environ.get('ROLLING_WEEKS', 4))  # default window for rolling totals
+app.config['ATTENDANCE_DUPLICATES'] = ATTENDANCE_DUPLICATES  # first, last, keep or error for repeated roster names
+app.config['WEEKLY_CHUNKSIZE'] = int(os.environ.get('WEEKLY_CHUNKSIZE', 0)) or None  # rows per weekly batch; unset loads whole file
+app.config['SERVER_TIMING'] = os.environ.get('SERVER_TIMING', '').lower() in ('1', 'true', 'yes')  # per-stage Server-Timing header
+app.config['METRICS_DIR'] = os.environ.get('METRICS_DIR')  # shared by gunicorn workers so /metrics covers them all
+app.config['TRACE_MEMORY'] = os.environ.get('TRACE_MEMORY', '').lower() in ('1', 'true', 'yes')  # tracemalloc peaks per stage
+app.config['PARQUET_OUTPUT'] = importlib.util.find_spec('pyarrow') is not None  # offer Parquet only when it can be written
+app.config['WARM_UP'] = os.environ.get('WARM_UP', '').lower() in ('1', 'true', 'yes')  # process testdata/ at startup
 app.config['SESSION_COOKIE_HTTPONLY'] = True
 app.config['SESSION_COOKIE_SAMESITE'] = 'Lax'
 app.config['SESSION_COOKIE_SECURE'] = os.environ.get('FLASK_ENV') == 'production' or bool(os.environ.get('RENDER'))
@@ -28,156 +99,451 @@ logger = logging.getLogger(__name__)
 if app.secret_key == 'dev-secret-key-change-me':
     logger.warning('SECRET_KEY is using the fallback value. Set SECRET_KEY for production deployments.')
 
-REQUIRED_WEEKLY_COLUMNS = {'StudentName', 'TotalMin'}
-REQUIRED_ATTENDANCE_COLUMNS = {'Last Name', 'First Name', 'Lessons Complete', 'Difference', 'Hours Required', 'Total Hours'}
-NUMERIC_COLUMNS = ('Lessons Complete', 'Difference', 'Hours Required', 'Total Hours')
+if app.config['TRACE_MEMORY'] and not tracemalloc.is_tracing():
+    tracemalloc.start()
+
+stage_metrics = MetricsRegistry(app.config['METRICS_DIR'])
+startup = {'warm_up_seconds': None}
+
+WARM_UP_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'testdata')
+WARM_UP_FILES = ('Weekly Attendance Report (19).csv', 'Attendance Rep 02.17.24.xlsx - Attendance.csv')
+
 
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in app.config['ALLOWED_EXTENSIONS']
 
 
-def validate_required_columns(df, required_columns, source_label):
-    missing = [col for col in required_columns if col not in df.columns]
-    if missing:
-        raise ValueError(f"{source_label} missing required columns: {', '.join(missing)}")
+class ResultCache:
+    """
+    Merged report frames stored on disk under a content hash of the uploads
+    (and, in their own directory, report previews under a random id).
+
+    Entries older than ``ttl`` seconds are ignored and removed; once the
+    directory exceeds ``max_bytes`` the least recently used entries are
+    evicted. Writes are atomic, so gunicorn workers can share a directory.
+    """
+
+    VERSION = 2  # bump when the cached intermediate changes shape
+
+    def __init__(self, directory, max_bytes, ttl):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+
+    @property
+    def enabled(self):
+        return self.max_bytes > 0
 
+    @classmethod
+    def make_key(cls, *parts):
+        return hashlib.sha256(':'.join(str(part) for part in (cls.VERSION, *parts)).encode()).hexdigest()
 
-def load_report(path, is_weekly=False):
+    def _path(self, key):
+        return os.path.join(self.directory, f'{key}.pkl')
+
+    def get(self, key):
+        if not self.enabled:
+            return None
+        path = self._path(key)
+        try:
+            if time.time() - os.path.getmtime(path) > self.ttl:
+                os.remove(path)
+                return None
+            frame = pd.read_pickle(path)
+            os.utime(path)  # mark as recently used
+            return frame
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.warning(f'Discarding unreadable cache entry {key}: {e}')
+            self._remove(path)
+            return None
+
+    def put(self, key, frame):
+        if not self.enabled:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        os.close(fd)
+        try:
+            pd.to_pickle(frame, temp_path)
+            os.replace(temp_path, self._path(key))
+        finally:
+            self._remove(temp_path)
+        self.evict()
+
+    def evict(self):
+        now = time.time()
+        entries = []
+        for entry in os.scandir(self.directory):
+            if not entry.name.endswith('.pkl'):
+                continue
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            if now - stat.st_mtime > self.ttl:
+                self._remove(entry.path)
+            else:
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            self._remove(path)
+            total -= size
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+def cached_merge_reports(weekly_path, attendance_path, weekly_digest, attendance_digest, chunksize=None,
+                         matching='exact'):
     """
-    Load CSV or XLSX into a DataFrame. Weekly report keeps TotalMin as string so
-    we can safely normalize time values before computation.
+    merge_reports backed by the result cache, keyed by the upload digests,
+    matching mode and attendance duplicate policy. Chunked and whole-file
+    merges give the same result, so ``chunksize`` is not part of the key.
     """
-    _, ext = os.path.splitext(path.lower())
-    if ext == '.xlsx':
-        df = pd.read_excel(path, engine='openpyxl')
+    cache = ResultCache(
+        os.path.join(app.config['UPLOAD_FOLDER'], 'cache'),
+        app.config['RESULT_CACHE_MAX_BYTES'],
+        app.config['RESULT_CACHE_TTL']
+    )
+    duplicates = app.config['ATTENDANCE_DUPLICATES']
+    key = ResultCache.make_key(weekly_digest, attendance_digest, matching, duplicates)
+    with stage('cache'):
+        merged_data = cache.get(key)
+    if merged_data is None:
+        merged_data = merge_reports(weekly_path, attendance_path, chunksize, matching=matching, duplicates=duplicates)
+        with stage('cache'):
+            cache.put(key, merged_data)
     else:
-        df = pd.read_csv(path)
+        logger.info(f'Using cached merge for upload {key[:12]}')
+    return merged_data
+
+
+def upload_digest(file_storage):
+    """SHA-256 hex digest of an upload's stream, read in fixed-size chunks and then rewound."""
+    digest = hashlib.sha256()
+    stream = file_storage.stream
+    stream.seek(0)
+    chunk_size = app.config['UPLOAD_CHUNK_SIZE']
+    for chunk in iter(lambda: stream.read(chunk_size), b''):
+        digest.update(chunk)
+    stream.seek(0)
+    return digest.hexdigest()
+
+
+def save_upload(file_storage, path):
+    """Copy an uploaded file to ``path`` in fixed-size chunks; returns its SHA-256 hex digest."""
+    digest = hashlib.sha256()
+    chunk_size = app.config['UPLOAD_CHUNK_SIZE']
+    with open(path, 'wb') as out:
+        for chunk in iter(lambda: file_storage.stream.read(chunk_size), b''):
+            digest.update(chunk)
+            out.write(chunk)
+    return digest.hexdigest()
+
+
+class JobStore:
+    """
+    Background job records kept in SQLite, so every gunicorn worker (and the
+    job processes themselves) share one view of job state.
+    """
 
-    if is_weekly and 'TotalMin' in df.columns:
-        df['TotalMin'] = df['TotalMin'].astype(str)
-    return df
+    FIELDS = ('id', 'status', 'stage', 'progress', 'error', 'result_path', 'download_name', 'created', 'updated')
+
+    def __init__(self, path):
+        self.path = path
+        with self._connect() as conn:
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS jobs ('
+                'id TEXT PRIMARY KEY, status TEXT NOT NULL, stage TEXT, progress INTEGER NOT NULL DEFAULT 0, '
+                'error TEXT, result_path TEXT, download_name TEXT, created REAL NOT NULL, updated REAL NOT NULL)'
+            )
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=30)
+
+    def create(self, job_id, download_name):
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                'INSERT INTO jobs (id, status, stage, progress, download_name, created, updated) '
+                'VALUES (?, ?, ?, 0, ?, ?, ?)',
+                (job_id, 'queued', 'Queued', download_name, now, now)
+            )
+
+    def update(self, job_id, **fields):
+        assignments = ', '.join(f'{name} = ?' for name in fields)
+        with self._connect() as conn:
+            conn.execute(
+                f'UPDATE jobs SET {assignments}, updated = ? WHERE id = ?',
+                (*fields.values(), time.time(), job_id)
+            )
+
+    def get(self, job_id):
+        with self._connect() as conn:
+            row = conn.execute(f"SELECT {', '.join(self.FIELDS)} FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return dict(zip(self.FIELDS, row)) if row else None
+
+    def purge(self, older_than):
+        """
+        Delete jobs last updated before ``older_than``, whatever their status;
+        returns their IDs. Jobs whose process died mid-run stop updating, so
+        they are purged too.
+        """
+        with self._connect() as conn:
+            # Hold the write lock so no job is updated between the SELECT and the DELETE
+            conn.execute('BEGIN IMMEDIATE')
+            rows = conn.execute('SELECT id FROM jobs WHERE updated < ?', (older_than,)).fetchall()
+            conn.execute('DELETE FROM jobs WHERE updated < ?', (older_than,))
+        return [job_id for (job_id,) in rows]
+
+
+def run_job(store_path, job_id, job_dir, weekly_path, attendance_path, sort_option, selected_columns,
+            chunksize=None, csv_chunk_rows=5000, history=None, output_format='csv', matching='exact',
+            duplicates=None):
+    """
+    Process one queued upload in a worker process, recording progress in the
+    job store. ``history`` is an optional (ledger_path, week, rolling_weeks)
+    and ``duplicates`` the attendance duplicate policy.
+    The result is written in ``output_format`` (one of OUTPUT_FORMATS).
 
-def normalize_attendance_names(attendance_rep):
-    attendance_rep['Last Name'] = attendance_rep['Last Name'].str.strip().str.lower()
-    attendance_rep['First Name'] = attendance_rep['First Name'].str.strip().str.lower()
+    Returns (outcome, stage timings) so the submitting worker can record them
+    in its metrics.
+    """
+    store = JobStore(store_path)
+    timer = StageTimer()
 
+    def progress(stage_name, percent):
+        store.update(job_id, status='running', stage=stage_name, progress=percent)
 
-def normalize_weekly_names(weekly_report):
-    name_split = weekly_report['StudentName'].str.split(',', n=1, expand=True)
-    weekly_report['Last Name'] = name_split[0].str.strip().str.lower()
-    weekly_report['First Name'] = name_split[1].fillna('').str.strip().str.lower()
-    if weekly_report['First Name'].eq('').any():
-        raise ValueError("Weekly report names must use 'Last, First' format in the StudentName column.")
+    try:
+        with timer.activate():
+            merged_data = merge_reports(
+                weekly_path, attendance_path, chunksize, progress=progress, matching=matching, duplicates=duplicates
+            )
+            if history:
+                progress('Updating weekly history', 60)
+                with stage('history'):
+                    apply_history(merged_data, *history)
+            progress('Sorting report', 70)
+            report, boundaries = finalize_report(merged_data, sort_option, selected_columns)
+            progress('Writing report', 90)
+            result_path = os.path.join(job_dir, f'result.{OUTPUT_FORMATS[output_format][1]}')
+            write_report(report, boundaries, result_path, output_format, csv_chunk_rows)
+        store.update(job_id, status='done', stage='Done', progress=100, result_path=result_path)
+        return 'ok', timer.snapshot()
+    except Exception as e:
+        logger.error(f'Error processing job {job_id}: {e}')
+        store.update(job_id, status='failed', stage='Failed', error=str(e))
+        return 'error', timer.snapshot()
+    finally:
+        for path in (weekly_path, attendance_path):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+_job_executor = None
+
+
+def get_job_executor():
+    """Process pool for background jobs, created on first use in each gunicorn worker."""
+    global _job_executor
+    if _job_executor is None:
+        _job_executor = ProcessPoolExecutor(
+            max_workers=app.config['JOB_WORKERS'], mp_context=multiprocessing.get_context('spawn')
+        )
+    return _job_executor
 
 
-def convert_numeric_columns(df, columns, source_label):
-    for col in columns:
-        df[col] = pd.to_numeric(df[col], errors='coerce')
-    invalid_columns = [col for col in columns if df[col].isnull().any()]
-    if invalid_columns:
-        raise ValueError(f"{source_label} has non-numeric values in: {', '.join(invalid_columns)}")
+_job_slots = None
+_job_slots_ready = False
+_job_slots_lock = threading.Lock()
 
 
-def time_to_hours(time_val):
-    """Convert time values (e.g., '25:04:00', '8:32') to 'HH:MM' format."""
-    if pd.isnull(time_val) or str(time_val).strip() in ("---", "", "nan"):
-        return "00:00"
-    try:
-        # Convert to string and strip whitespace
-        time_str = str(time_val).strip()
-        # Split into parts (could be HH:MM:SS or H:MM)
-        parts = time_str.split(':')
-        # Extract hours and minutes (ignore seconds)
-        hours = int(parts[0]) if len(parts) >= 1 else 0
-        minutes = int(parts[1]) if len(parts) >= 2 else 0
-        # Calculate total minutes
-        total_minutes = (hours * 60) + minutes
-        # Convert back to HH:MM
-        formatted_hours = total_minutes // 60
-        formatted_minutes = total_minutes % 60
-        return f"{formatted_hours:02}:{formatted_minutes:02}"
-    except Exception as e:
-        logging.error(f"Failed to parse time: {time_val}. Error: {e}")
-        return "00:00"
+def get_job_slots():
+    """
+    Semaphore bounding the reports this worker processes at once, or None
+    when MAX_CONCURRENT_JOBS is 0. gunicorn_config's auto-tune mode sizes
+    it so each slot can hold a job in a process of its own; batch uploads
+    take one slot per process they start.
+    """
+    global _job_slots, _job_slots_ready
+    # Request threads of a fresh worker race to get here; exactly one may create it
+    with _job_slots_lock:
+        if not _job_slots_ready:
+            limit = app.config['MAX_CONCURRENT_JOBS']
+            _job_slots = threading.BoundedSemaphore(limit) if limit > 0 else None
+            _job_slots_ready = True
+    return _job_slots
 
-def format_hours_minutes(hours_minutes_str):
-    """Format hours and minutes to [h]:mm format."""
-    try:
-        hours, minutes = map(int, hours_minutes_str.split(':'))
-        return f"{hours}:{minutes:02}"
-    except Exception as e:
-        logging.error(f"Failed to format hours and minutes: {hours_minutes_str}. Error: {e}")
-        return "0:00"
 
-def process_files(weekly_path, attendance_path, sort_option, selected_columns):
+def reset_job_slots():
+    """Drop the semaphore so the next get_job_slots sizes it from MAX_CONCURRENT_JOBS again."""
+    global _job_slots, _job_slots_ready
+    with _job_slots_lock:
+        _job_slots, _job_slots_ready = None, False
+
+
+def acquire_job_slot():
+    """Wait up to JOB_SLOT_TIMEOUT for a processing slot; returns a release callable, or None when busy."""
+    slots = get_job_slots()
+    if slots is None:
+        return lambda: None
+    if not slots.acquire(timeout=app.config['JOB_SLOT_TIMEOUT']):
+        return None
+    return slots.release
+
+
+def acquire_extra_job_slots(count):
+    """Take up to ``count`` more slots without waiting; returns (slots taken, release callable)."""
+    slots = get_job_slots()
+    if slots is None:
+        return count, lambda: None
+    taken = 0
+    while taken < count and slots.acquire(blocking=False):
+        taken += 1
+
+    def release():
+        for _ in range(taken):
+            slots.release()
+
+    return taken, release
+
+
+def server_busy_response():
+    stage_metrics.record([], 'sync', 'busy')
+    return 'The server is busy processing other reports. Please try again in a moment.', 503, {'Retry-After': '5'}
+
+
+def ledger_path():
+    return app.config['LEDGER_PATH'] or os.path.join(app.config['UPLOAD_FOLDER'], 'ledger.sqlite3')
+
+
+def history_options(form):
+    """(ledger_path, week, rolling_weeks) when the form asks to record this week, else None."""
+    week_of = form.get('week_of', '').strip()
+    if not week_of:
+        return None
     try:
-        # Load files
-        attendance_rep = load_report(attendance_path)
-        weekly_report = load_report(weekly_path, is_weekly=True)  # Keep TotalMin as strings for consistent parsing
-
-        validate_required_columns(attendance_rep, REQUIRED_ATTENDANCE_COLUMNS, 'Attendance report')
-        validate_required_columns(weekly_report, REQUIRED_WEEKLY_COLUMNS, 'Weekly report')
-
-        # Standardize names
-        normalize_attendance_names(attendance_rep)
-        normalize_weekly_names(weekly_report)
-        convert_numeric_columns(attendance_rep, NUMERIC_COLUMNS, 'Attendance report')
-
-        # Process Weekly Hours (from "TotalMin" column)
-        weekly_report['Weekly Hours'] = weekly_report['TotalMin'].apply(time_to_hours)
-
-        # Merge datasets
-        merged_data = pd.merge(
-            attendance_rep[['Last Name', 'First Name', 'Lessons Complete', 'Difference', 'Hours Required', 'Total Hours']],
-            weekly_report[['Last Name', 'First Name', 'Weekly Hours']],
-            on=['Last Name', 'First Name'],
-            how='inner'
-        )
+        rolling_weeks = int(form.get('rolling_weeks') or app.config['ROLLING_WEEKS'])
+    except ValueError:
+        raise ValueError('Rolling weeks must be a whole number.') from None
+    if not 1 <= rolling_weeks <= 52:
+        raise ValueError('Rolling weeks must be between 1 and 52.')
+    return ledger_path(), week_start(week_of), rolling_weeks
 
-        # Calculate "Hours Ahead/Behind"
-        merged_data['Hours Ahead/Behind'] = merged_data['Total Hours'] - merged_data['Hours Required']
 
-        # Sort data
-        if sort_option not in ('last_first', 'hours_last_first'):
-            sort_option = 'hours_last_first'
-        if sort_option == 'last_first':
-            merged_data.sort_values(by=['Last Name', 'First Name'], inplace=True)
-        else:
-            merged_data.sort_values(by=['Hours Required', 'Last Name', 'First Name'], inplace=True)
-
-        # Round numeric columns
-        for col in ['Total Hours', 'Hours Ahead/Behind']:
-            merged_data[col] = merged_data[col].round(2)
-
-        # Rename columns
-        merged_data.rename(columns={
-            'Difference': 'Difference in Lessons',
-            'Total Hours': 'Total Cumulative Hours'
-        }, inplace=True)
-
-        # Format Weekly Hours to [h]:mm
-        merged_data['Weekly Hours'] = merged_data['Weekly Hours'].apply(format_hours_minutes)
-
-        # Select final columns
-        final_columns = ['Last Name', 'First Name'] + [col for col in selected_columns if col in merged_data.columns]
-        final_data = merged_data[final_columns]
-
-        # Insert blank lines if sorting by hours
-        output_data = []
-        if sort_option != 'last_first':
-            last_hours_required = None
-            for _, row in merged_data.iterrows():
-                if last_hours_required is not None and row['Hours Required'] != last_hours_required:
-                    output_data.append({col: '' for col in final_columns})
-                output_data.append(row[final_columns].to_dict())
-                last_hours_required = row['Hours Required']
-        else:
-            output_data = final_data.to_dict(orient='records')
+def get_job_store():
+    return JobStore(os.path.join(app.config['UPLOAD_FOLDER'], 'jobs.sqlite3'))
+
+
+def jobs_root():
+    return os.path.join(app.config['UPLOAD_FOLDER'], 'jobs')
+
+
+def enqueue_job(weekly_file, attendance_file, sort_option, selected_columns, download_name, history=None,
+                output_format='csv', matching='exact'):
+    store = get_job_store()
+    for job_id in store.purge(time.time() - app.config['JOB_TTL']):
+        shutil.rmtree(os.path.join(jobs_root(), job_id), ignore_errors=True)
+
+    job_id = uuid.uuid4().hex
+    job_dir = os.path.join(jobs_root(), job_id)
+    os.makedirs(job_dir)
+    weekly_path = os.path.join(job_dir, 'weekly_' + secure_filename(weekly_file.filename))
+    attendance_path = os.path.join(job_dir, 'attendance_' + secure_filename(attendance_file.filename))
+    save_upload(weekly_file, weekly_path)
+    save_upload(attendance_file, attendance_path)
+
+    store.create(job_id, download_name)
+    future = get_job_executor().submit(
+        run_job, store.path, job_id, job_dir, weekly_path, attendance_path, sort_option, selected_columns,
+        app.config['WEEKLY_CHUNKSIZE'], app.config['CSV_CHUNK_ROWS'], history, output_format, matching,
+        app.config['ATTENDANCE_DUPLICATES']
+    )
+    future.add_done_callback(record_job_metrics)
+    return job_id
+
+
+def record_job_metrics(future):
+    if future.cancelled() or future.exception() is not None:
+        return
+    outcome, stages = future.result()
+    stage_metrics.record(stages, 'job', outcome)
+
+
+def timed_chunks(timer, chunks):
+    """Iterate ``chunks`` with ``timer`` active only while each chunk is produced, not while it is sent."""
+    while True:
+        with timer.activate():
+            chunk = next(chunks, None)
+        if chunk is None:
+            return
+        yield chunk
+
+
+def job_status_payload(job):
+    payload = {key: job[key] for key in ('id', 'status', 'stage', 'progress', 'error')}
+    if job['status'] == 'done':
+        payload['result_url'] = url_for('job_result', job_id=job['id'])
+    return payload
+
+
+def validate_uploads(weekly_files, attendance_file):
+    """
+    validate_report issues for each upload, tagged with its 'file' name.
+    Only the header and a sample of rows are read, and streams are rewound.
+    """
+    uploads = [(upload, True, 'Weekly report') for upload in weekly_files]
+    if attendance_file is not None:
+        uploads.append((attendance_file, False, 'Attendance report'))
+    issues = []
+    for upload, is_weekly, source_label in uploads:
+        if not allowed_file(upload.filename):
+            issues.append({
+                'source': source_label, 'code': 'file_type', 'severity': 'error', 'file': upload.filename,
+                'message': f'{source_label} must be a CSV or Excel (.xlsx) file.'
+            })
+            continue
+        for issue in validate_report(upload.stream, is_weekly, source_label=source_label):
+            issues.append({**issue, 'file': upload.filename})
+    return issues
+
+
+def upload_errors(issues):
+    return [issue for issue in issues if issue['severity'] == 'error']
+
+
+@app.route('/validate', methods=['POST'])
+def validate():
+    """
+    Check uploads before they are submitted: header and a sample of rows
+    only. Accepts any of weekly_file (repeatable) and attendance_file; the
+    page sends just the first part of large CSV files.
+    """
+    weekly_files = [file for file in request.files.getlist('weekly_file') if file.filename != '']
+    attendance_file = request.files.get('attendance_file')
+    if attendance_file is not None and attendance_file.filename == '':
+        attendance_file = None
+    if not weekly_files and attendance_file is None:
+        return jsonify({'error': 'No files to validate'}), 400
+    timer = StageTimer()
+    with timer.activate(), stage('validate'):
+        issues = validate_uploads(weekly_files, attendance_file)
+    valid = not upload_errors(issues)
+    stage_metrics.record(timer, 'validate', 'ok' if valid else 'invalid')
+    return jsonify({'valid': valid, 'issues': issues})
 
-        return pd.DataFrame(output_data)
-    except Exception as e:
-        logger.error(f'Error processing files: {e}')
-        raise
 
 @app.route('/', methods=['GET', 'POST'])
 def index():
@@ -186,7 +552,8 @@ def index():
             flash('No file part')
             return redirect(request.url)
         
-        weekly_file = request.files['weekly_file']
+        weekly_files = [file for file in request.files.getlist('weekly_file') if file.filename != '']
+        weekly_file = weekly_files[0] if weekly_files else request.files['weekly_file']
         attendance_file = request.files['attendance_file']
         sort_option = request.form.get('sort_option', 'hours_last_first')
         selected_columns = request.form.getlist('columns')
@@ -196,42 +563,361 @@ def index():
         if weekly_file.filename == '' or attendance_file.filename == '':
             flash('No selected file')
             return redirect(request.url)
-        if not allowed_file(weekly_file.filename) or not allowed_file(attendance_file.filename):
+        if not all(allowed_file(file.filename) for file in weekly_files) or not allowed_file(attendance_file.filename):
             flash('Invalid file type. Only CSV and Excel files are allowed.')
             return redirect(request.url)
-        
-        temp_dir = tempfile.mkdtemp(dir=app.config['UPLOAD_FOLDER'])
-        weekly_filename = secure_filename(weekly_file.filename)
-        attendance_filename = secure_filename(attendance_file.filename)
-        weekly_path = os.path.join(temp_dir, weekly_filename)
-        attendance_path = os.path.join(temp_dir, attendance_filename)
-        
+        output_format = request.form.get('output_format', 'csv')
+        if output_format not in OUTPUT_FORMATS:
+            flash(f"Unknown output format. Choose one of: {', '.join(OUTPUT_FORMATS)}")
+            return redirect(request.url)
+        mimetype, extension = OUTPUT_FORMATS[output_format]
+        matching = 'fuzzy' if request.form.get('matching') == 'fuzzy' else 'exact'
         try:
-            with open(weekly_path, 'wb') as wf, open(attendance_path, 'wb') as af:
-                wf.write(weekly_file.read())
-                af.write(attendance_file.read())
-            
-            output_df = process_files(weekly_path, attendance_path, sort_option, selected_columns)
-            output = BytesIO()
-            output_df.to_csv(output, index=False)
-            output.seek(0)
-            output_filename = f"Processed_Attendance_Report_{datetime.now().strftime('%Y-%m-%d')}.csv"
-            return send_file(output, mimetype='text/csv', as_attachment=True, download_name=output_filename)
+            history = history_options(request.form)
+        except ValueError as e:
+            flash(str(e))
+            return redirect(request.url)
+        # Fail fast on the wrong file before parsing it in full or taking a job slot
+        errors = upload_errors(validate_uploads(weekly_files, attendance_file))
+        if errors:
+            if request.form.get('background') and len(weekly_files) == 1:
+                return jsonify({'error': errors[0]['message'], 'issues': errors}), 400
+            for issue in errors:
+                flash(f"{issue['file']}: {issue['message']}")
+            return redirect(request.url)
+        if len(weekly_files) > 1:
+            if history:
+                flash('Weekly history can only be recorded for one weekly report at a time.')
+                return redirect(request.url)
+            release_slot = acquire_job_slot()
+            if release_slot is None:
+                return server_busy_response()
+            return batch_response(
+                weekly_files, attendance_file, sort_option, selected_columns, output_format, matching, release_slot
+            )
+
+        output_filename = f"Processed_Attendance_Report_{datetime.now().strftime('%Y-%m-%d')}.{extension}"
+        if request.form.get('background'):
+            try:
+                job_id = enqueue_job(
+                    weekly_file, attendance_file, sort_option, selected_columns, output_filename, history,
+                    output_format, matching
+                )
+            except Exception as e:
+                logger.error(f'Error queuing job: {e}')
+                return jsonify({'error': str(e)}), 500
+            return jsonify(job_status_payload(get_job_store().get(job_id)) | {
+                'status_url': url_for('job_status', job_id=job_id)
+            }), 202
+
+        # Uploads are read straight from their request streams, which only
+        # spill to disk above UPLOAD_SPOOL_BYTES; formats are sniffed from content.
+        release_slot = acquire_job_slot()
+        if release_slot is None:
+            return server_busy_response()
+        temp_dir = None
+        timer = StageTimer()
+        try:
+            with timer.activate():
+                with stage('upload'):
+                    weekly_digest = upload_digest(weekly_file)
+                    attendance_digest = upload_digest(attendance_file)
+                merged_data = cached_merge_reports(
+                    weekly_file.stream, attendance_file.stream, weekly_digest, attendance_digest,
+                    app.config['WEEKLY_CHUNKSIZE'], matching
+                )
+                if history:
+                    with stage('history'):
+                        apply_history(merged_data, *history)
+                report, boundaries = finalize_report(merged_data, sort_option, selected_columns)
+                if output_format in ('xlsx', 'parquet'):
+                    # Binary formats are written to disk first, then sent as a file
+                    temp_dir = tempfile.mkdtemp(dir=app.config['UPLOAD_FOLDER'])
+                    output_path = os.path.join(temp_dir, output_filename)
+                    write_report(report, boundaries, output_path, output_format, app.config['CSV_CHUNK_ROWS'])
         except Exception as e:
+            logger.error(f'Error processing files: {e}')
+            if temp_dir:
+                shutil.rmtree(temp_dir, ignore_errors=True)
+            release_slot()
+            stage_metrics.record(timer, 'sync', 'error')
             flash(f'An error occurred: {e}')
             return redirect(request.url)
-        finally:
-            shutil.rmtree(temp_dir, ignore_errors=True)
-    return render_template('index.html')
+
+        if output_format in ('xlsx', 'parquet'):
+            response = send_file(output_path, mimetype=mimetype, as_attachment=True, download_name=output_filename)
+            # Passthrough responses skip call_on_close, which removes the file once sent
+            response.direct_passthrough = False
+        else:
+            iter_report = iter_csv if output_format == 'csv' else iter_ndjson
+            response = Response(
+                timed_chunks(timer, iter_report(report, boundaries, app.config['CSV_CHUNK_ROWS'])),
+                mimetype=mimetype,
+                headers={'Content-Disposition': f'attachment; filename={output_filename}'}
+            )
+        if app.config['SERVER_TIMING']:
+            # Streamed formats serialize after headers are sent, so their timing stops at formatting
+            response.headers['Server-Timing'] = timer.server_timing()
+
+        def finish():
+            # Output files are only removed, and the slot freed, once the response has been fully sent
+            if temp_dir:
+                shutil.rmtree(temp_dir, ignore_errors=True)
+            release_slot()
+            stage_metrics.record(timer, 'sync')
+
+        response.call_on_close(finish)
+        return response
+    return render_template('index.html', parquet_output=app.config['PARQUET_OUTPUT'])
+
+def batch_response(weekly_files, attendance_file, sort_option, selected_columns, output_format='csv',
+                   matching='exact', release_slot=None):
+    """
+    Process several weekly uploads against one attendance upload and return a
+    ZIP of reports. ``release_slot`` frees the one job slot the caller took;
+    the batch runs in that slot's process plus one per free slot it can take
+    now, up to BATCH_WORKERS. All are released once the ZIP has been sent.
+    """
+    extra_processes, release_extra = acquire_extra_job_slots(
+        min(app.config['BATCH_WORKERS'] or os.cpu_count() or 1, len(weekly_files)) - 1
+    )
+    release_caller_slot = release_slot or (lambda: None)
+
+    def release_slot():
+        release_extra()
+        release_caller_slot()
+
+    temp_dir = tempfile.mkdtemp(dir=app.config['UPLOAD_FOLDER'])
+    output_dir = os.path.join(temp_dir, 'output')
+    os.makedirs(output_dir)
+    date_stamp = datetime.now().strftime('%Y-%m-%d')
+    try:
+        attendance_path = os.path.join(temp_dir, 'attendance_' + secure_filename(attendance_file.filename))
+        save_upload(attendance_file, attendance_path)
+        weekly_paths = []
+        for position, weekly_file in enumerate(weekly_files):
+            weekly_path = os.path.join(temp_dir, f'{position}_' + secure_filename(weekly_file.filename))
+            save_upload(weekly_file, weekly_path)
+            weekly_paths.append(weekly_path)
+
+        output_paths = process_batch(
+            weekly_paths, attendance_path, output_dir, sort_option, selected_columns,
+            chunksize=app.config['WEEKLY_CHUNKSIZE'],
+            max_workers=1 + extra_processes,
+            csv_chunk_rows=app.config['CSV_CHUNK_ROWS'],
+            output_names=[secure_filename(weekly_file.filename) for weekly_file in weekly_files],
+            mp_context=multiprocessing.get_context('spawn'),
+            output_format=output_format,
+            matching=matching,
+            duplicates=app.config['ATTENDANCE_DUPLICATES']
+        )
+        zip_path = os.path.join(temp_dir, 'reports.zip')
+        with zipfile.ZipFile(zip_path, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+            for output_path in output_paths:
+                archive.write(output_path, os.path.basename(output_path))
+    except Exception as e:
+        logger.error(f'Error processing batch: {e}')
+        shutil.rmtree(temp_dir, ignore_errors=True)
+        release_slot()
+        flash(f'An error occurred: {e}')
+        return redirect(request.url)
+
+    response = send_file(
+        zip_path, mimetype='application/zip', as_attachment=True,
+        download_name=f'Processed_Attendance_Reports_{date_stamp}.zip'
+    )
+    response.direct_passthrough = False  # so call_on_close runs
+
+    def finish():
+        shutil.rmtree(temp_dir, ignore_errors=True)
+        release_slot()
+
+    response.call_on_close(finish)
+    return response
+
+
+@app.route('/jobs/<job_id>')
+def job_status(job_id):
+    job = get_job_store().get(job_id)
+    if job is None:
+        return jsonify({'error': 'Unknown job'}), 404
+    return jsonify(job_status_payload(job))
+
+
+@app.route('/jobs/<job_id>/result')
+def job_result(job_id):
+    job = get_job_store().get(job_id)
+    if job is None:
+        return jsonify({'error': 'Unknown job'}), 404
+    if job['status'] != 'done':
+        return jsonify(job_status_payload(job)), 409
+    extension = os.path.splitext(job['result_path'])[1].lstrip('.')
+    mimetype = next(mime for mime, ext in OUTPUT_FORMATS.values() if ext == extension)
+    return send_file(job['result_path'], mimetype=mimetype, as_attachment=True, download_name=job['download_name'])
+
+
+def get_preview_store():
+    return ResultCache(
+        os.path.join(app.config['UPLOAD_FOLDER'], 'previews'),
+        app.config['PREVIEW_MAX_BYTES'],
+        app.config['PREVIEW_TTL']
+    )
+
+
+def preview_urls(preview_id):
+    return {
+        'id': str(preview_id),
+        'sorts': list(PREVIEW_SORTS),
+        'page_url': url_for('preview_page', preview_id=preview_id),
+        'behind_url': url_for('preview_behind', preview_id=preview_id),
+    }
+
+
+def int_arg(args, name, default, label):
+    try:
+        return int(args.get(name, default))
+    except ValueError:
+        raise ValueError(f'{label} must be a whole number.') from None
+
+
+@app.route('/preview', methods=['POST'])
+def create_preview():
+    """
+    Process one weekly and one attendance upload and keep the report
+    server-side for PREVIEW_TTL, returning its first page as JSON. Later
+    pages, other sorts and the furthest-behind students are then read
+    from the stored preview without re-processing. Weekly history is only
+    recorded when the report is downloaded.
+    """
+    weekly_file = request.files.get('weekly_file')
+    attendance_file = request.files.get('attendance_file')
+    if not weekly_file or not attendance_file or weekly_file.filename == '' or attendance_file.filename == '':
+        return jsonify({'error': 'Select a weekly report and an attendance report to preview.'}), 400
+    selected_columns = request.form.getlist('columns')
+    if not selected_columns:
+        return jsonify({'error': 'Please select at least one column.'}), 400
+    matching = 'fuzzy' if request.form.get('matching') == 'fuzzy' else 'exact'
+    sort_option = request.form.get('sort_option', 'hours_last_first')
+    try:
+        per_page = int_arg(request.form, 'per_page', 50, 'Rows per page')
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    errors = upload_errors(validate_uploads([weekly_file], attendance_file))
+    if errors:
+        return jsonify({'error': errors[0]['message'], 'issues': errors}), 400
+
+    release_slot = acquire_job_slot()
+    if release_slot is None:
+        return server_busy_response()
+    timer = StageTimer()
+    try:
+        with timer.activate():
+            with stage('upload'):
+                weekly_digest = upload_digest(weekly_file)
+                attendance_digest = upload_digest(attendance_file)
+            merged_data = cached_merge_reports(
+                weekly_file.stream, attendance_file.stream, weekly_digest, attendance_digest,
+                app.config['WEEKLY_CHUNKSIZE'], matching
+            )
+            with stage('preview', rows_in=len(merged_data)):
+                preview = ReportPreview(merged_data, selected_columns)
+                first_page = preview.page(sort_option if sort_option in PREVIEW_SORTS else 'hours_last_first',
+                                          1, per_page)
+    except Exception as e:
+        logger.error(f'Error previewing files: {e}')
+        stage_metrics.record(timer, 'preview', 'error')
+        return jsonify({'error': str(e)}), 400
+    finally:
+        release_slot()
+
+    preview_id = uuid.uuid4()
+    get_preview_store().put(preview_id.hex, preview)
+    stage_metrics.record(timer, 'preview')
+    payload = preview_urls(preview_id) | first_page
+    payload['match_summary'] = preview.attrs.get('match_summary')
+    return jsonify(payload), 201
+
+
+def load_preview(preview_id):
+    return get_preview_store().get(preview_id.hex)
+
+
+def preview_expired_response():
+    return jsonify({'error': 'This preview has expired. Upload the reports again to preview them.'}), 404
+
+
+@app.route('/preview/<uuid:preview_id>')
+def preview_page(preview_id):
+    """A page of a stored preview: ?sort=<PREVIEW_SORTS>&page=1&per_page=50."""
+    preview = load_preview(preview_id)
+    if preview is None:
+        return preview_expired_response()
+    try:
+        page = preview.page(
+            request.args.get('sort', 'hours_last_first'),
+            int_arg(request.args, 'page', 1, 'Page'),
+            int_arg(request.args, 'per_page', 50, 'Rows per page')
+        )
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify(preview_urls(preview_id) | page)
+
+
+@app.route('/preview/<uuid:preview_id>/behind')
+def preview_behind(preview_id):
+    """The ?count=10 students furthest behind in a stored preview."""
+    preview = load_preview(preview_id)
+    if preview is None:
+        return preview_expired_response()
+    try:
+        result = preview.most_behind(int_arg(request.args, 'count', 10, 'Number of students'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify(preview_urls(preview_id) | result)
+
 
 @app.route('/instructions')
 def instructions():
     return render_template('instructions.html')
 
 
+@app.route('/metrics')
+def metrics():
+    return Response(stage_metrics.render(), mimetype='text/plain; version=0.0.4')
+
+
 @app.route('/healthz')
 def healthz():
-    return {'status': 'ok'}, 200
+    return {'status': 'ok', 'warm_up_seconds': startup['warm_up_seconds']}, 200
+
+
+def warm_up():
+    """
+    Process the bundled testdata/ reports, write and read back an XLSX copy
+    and render the upload page, so lazy imports (pyarrow's CSV reader,
+    openpyxl) and first-call setup are paid before the first request rather
+    than during it. Returns the seconds taken.
+    """
+    start = time.perf_counter()
+    weekly_path, attendance_path = (os.path.join(WARM_UP_DIR, name) for name in WARM_UP_FILES)
+    report, boundaries = build_report(weekly_path, attendance_path, 'hours_last_first', list(OUTPUT_COLUMNS))
+    with tempfile.TemporaryDirectory() as temp_dir:
+        xlsx_path = os.path.join(temp_dir, 'warm_up.xlsx')
+        write_report(report, boundaries, xlsx_path, 'xlsx', app.config['CSV_CHUNK_ROWS'])
+        load_report(xlsx_path)
+    with app.test_request_context():
+        render_template('index.html', parquet_output=app.config['PARQUET_OUTPUT'])
+    return time.perf_counter() - start
+
+
+# Spawned job and batch processes import this module too; only the server warms up.
+# Under gunicorn with preload_app this runs once in the master and workers inherit the result.
+if app.config['WARM_UP'] and multiprocessing.parent_process() is None:
+    try:
+        startup['warm_up_seconds'] = round(warm_up(), 3)
+        logger.info(f"Warm-up finished in {startup['warm_up_seconds']}s")
+    except Exception as e:
+        logger.error(f'Warm-up failed: {e}')
 
 
 if __name__ == '__main__':
@@ -0,0 +1,145 @@
+"""
+Process attendance reports from the command line, without Flask or PyQt5.
+
+    python -m attendance_cli "Attendance Rep.csv" "weekly/*.csv" -o processed/
+
+One weekly report produces one report file (``--output`` is the file path); several
+weekly reports are processed in parallel into the ``--output`` directory.
+pandas is only imported after the arguments are parsed, so ``--help`` and
+usage errors return immediately.
+"""
+import argparse
+import glob
+import logging
+import os
+import sys
+from datetime import datetime
+
+SORT_OPTIONS = ('hours_last_first', 'last_first')
+OUTPUT_FORMATS = ('csv', 'xlsx', 'parquet', 'ndjson')
+DUPLICATE_POLICIES = ('first', 'last', 'keep', 'error')
+MAX_ROLLING_WEEKS = 52  # the web form's bound
+CSV_CHUNK_ROWS = 5000
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog='python -m attendance_cli',
+        description='Merge weekly reports with an attendance report and write processed reports.'
+    )
+    parser.add_argument('attendance', help='Attendance report (.csv or .xlsx).')
+    parser.add_argument('weekly', nargs='+', help='Weekly report paths or glob patterns (.csv or .xlsx).')
+    parser.add_argument(
+        '-o', '--output',
+        help='Output file for a single weekly report, or output directory for several '
+             '(default: Processed_Attendance_Report_<date>.<format> or the current directory).'
+    )
+    parser.add_argument(
+        '--format', dest='output_format', choices=OUTPUT_FORMATS,
+        help='Output format (default: taken from the --output extension, else csv). Parquet needs pyarrow.'
+    )
+    parser.add_argument('--sort', dest='sort_option', choices=SORT_OPTIONS, default='hours_last_first')
+    parser.add_argument(
+        '--column', dest='columns', action='append',
+        help='Output column to include, in order (repeatable; default: all columns).'
+    )
+    parser.add_argument(
+        '--chunksize', type=int,
+        help='Stream weekly reports in batches of this many rows, summing minutes per student.'
+    )
+    parser.add_argument(
+        '--fuzzy', dest='matching', action='store_const', const='fuzzy', default='exact',
+        help='Retry names without an exact roster match with accent/suffix folding and fuzzy scoring.'
+    )
+    parser.add_argument(
+        '--duplicates', choices=DUPLICATE_POLICIES,
+        help='Attendance records sharing a name: keep the first or last, keep all, or fail '
+             '(default: ATTENDANCE_DUPLICATES, else first).'
+    )
+    parser.add_argument(
+        '--match-report', metavar='CSV',
+        help='With --fuzzy and a single weekly report, write the non-exact name matches to this CSV.'
+    )
+    parser.add_argument(
+        '--ledger',
+        help='SQLite weekly history to record this week in; adds Rolling/Average Weekly Hours columns.'
+    )
+    parser.add_argument('--week', help='Date in the week being recorded, YYYY-MM-DD (default: today).')
+    parser.add_argument('--rolling-weeks', type=int, default=4, help='Recorded weeks in the rolling window (default: 4).')
+    parser.add_argument('--workers', type=int, help='Parallel processes for several weekly reports (default: every core).')
+    parser.add_argument('-v', '--verbose', action='store_true', help='Log match and parsing summaries.')
+    return parser
+
+
+def expand_paths(patterns):
+    """Expand glob patterns (shells on Windows do not), keeping plain paths as given."""
+    paths = []
+    for pattern in patterns:
+        matches = sorted(glob.glob(pattern))
+        paths.extend(matches or [pattern])
+    return paths
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    weekly_paths = expand_paths(args.weekly)
+    for path in [args.attendance, *weekly_paths]:
+        if not os.path.isfile(path):
+            parser.error(f'file not found: {path}')
+    if args.ledger and len(weekly_paths) > 1:
+        parser.error('--ledger records one weekly report at a time')
+    if not 1 <= args.rolling_weeks <= MAX_ROLLING_WEEKS:
+        parser.error(f'--rolling-weeks must be between 1 and {MAX_ROLLING_WEEKS}')
+    if args.match_report and (args.matching != 'fuzzy' or len(weekly_paths) > 1):
+        parser.error('--match-report needs --fuzzy and a single weekly report')
+
+    if args.output_format is None:
+        extension = os.path.splitext(args.output or '')[1].lstrip('.').lower()
+        args.output_format = extension if extension in OUTPUT_FORMATS else 'csv'
+
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING, format='%(levelname)s: %(message)s')
+
+    import attendance_core
+    import attendance_ledger
+
+    columns = args.columns or list(attendance_core.OUTPUT_COLUMNS)
+    if args.ledger and not args.columns:
+        columns += attendance_core.HISTORY_COLUMNS
+    try:
+        if len(weekly_paths) == 1 and not (args.output and os.path.isdir(args.output)):
+            output_path = args.output or (
+                f"Processed_Attendance_Report_{datetime.now().strftime('%Y-%m-%d')}."
+                f"{attendance_core.OUTPUT_FORMATS[args.output_format][1]}"
+            )
+            merged_data = attendance_core.merge_reports(
+                weekly_paths[0], None, args.chunksize,
+                roster=attendance_core.load_roster(args.attendance, duplicates=args.duplicates),
+                matching=args.matching
+            )
+            if args.match_report:
+                attendance_core.write_name_matches(merged_data.attrs['name_matches'], args.match_report)
+            if args.ledger:
+                attendance_ledger.apply_history(merged_data, args.ledger, args.week, args.rolling_weeks)
+            report, boundaries = attendance_core.finalize_report(merged_data, args.sort_option, columns)
+            attendance_core.write_report(report, boundaries, output_path, args.output_format, CSV_CHUNK_ROWS)
+            output_paths = [output_path]
+        else:
+            output_dir = args.output or '.'
+            os.makedirs(output_dir, exist_ok=True)
+            output_paths = attendance_core.process_batch(
+                weekly_paths, args.attendance, output_dir, args.sort_option, columns,
+                chunksize=args.chunksize, max_workers=args.workers, csv_chunk_rows=CSV_CHUNK_ROWS,
+                output_format=args.output_format, matching=args.matching, duplicates=args.duplicates
+            )
+    except (OSError, ValueError) as e:
+        print(f'error: {e}', file=sys.stderr)
+        return 1
+
+    for output_path in output_paths:
+        print(output_path)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
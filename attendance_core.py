@@ -0,0 +1,1063 @@
+"""
+Attendance report processing shared by the web app, the desktop app and the
+command line. Only pandas, numpy and (for .xlsx files) openpyxl are needed.
+"""
+import importlib.util
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from attendance_metrics import stage
+
+logger = logging.getLogger(__name__)
+
+REQUIRED_WEEKLY_COLUMNS = {'StudentName', 'TotalMin'}
+REQUIRED_ATTENDANCE_COLUMNS = {'Last Name', 'First Name', 'Lessons Complete', 'Difference', 'Hours Required', 'Total Hours'}
+NUMERIC_COLUMNS = ('Lessons Complete', 'Difference', 'Hours Required', 'Total Hours')
+OUTPUT_COLUMNS = (
+    'Weekly Hours', 'Lessons Complete', 'Difference in Lessons', 'Total Cumulative Hours', 'Hours Required',
+    'Hours Ahead/Behind'
+)
+HISTORY_COLUMNS = ('Rolling Weekly Hours', 'Average Weekly Hours')
+MINUTES_COLUMNS = {
+    'Weekly Minutes': 'Weekly Hours',
+    'Rolling Minutes': 'Rolling Weekly Hours',
+    'Average Minutes': 'Average Weekly Hours',
+}
+TEXT_COLUMNS = ('Last Name', 'First Name', 'StudentName', 'TotalMin')
+CSV_ENGINE = os.environ.get('CSV_ENGINE') or ('pyarrow' if importlib.util.find_spec('pyarrow') else 'c')
+# Categorical names and narrow numeric dtypes in the roster and merged frame (see compact_columns)
+COMPACT_DTYPES = os.environ.get('COMPACT_DTYPES', '').lower() in ('1', 'true', 'yes')
+BLANK_TIME_VALUES = ('---', '', 'nan', 'None')
+MALFORMED_SAMPLE_LIMIT = 100
+UNMATCHED_SAMPLE_LIMIT = 100
+VALIDATION_SAMPLE_ROWS = 200  # data rows read by validate_report
+# Output format -> (mimetype, file extension)
+OUTPUT_FORMATS = {
+    'csv': ('text/csv', 'csv'),
+    'xlsx': ('application/vnd.openxmlformats-officedocument.spreadsheetml.sheet', 'xlsx'),
+    'parquet': ('application/vnd.apache.parquet', 'parquet'),
+    'ndjson': ('application/x-ndjson', 'ndjson'),
+}
+MATCHING_MODES = ('exact', 'fuzzy')
+DUPLICATE_POLICIES = ('first', 'last', 'keep', 'error')
+# Which record wins when the attendance report lists a student more than once
+ATTENDANCE_DUPLICATES = os.environ.get('ATTENDANCE_DUPLICATES', 'first').lower()
+MATCHING_PROGRESS = (30, 60)  # progress percentages spanned by the chunked weekly merge
+XLSX_SIGNATURE = b'PK\x03\x04'  # .xlsx files are ZIP archives
+TIME_PATTERN = r'^(?P<hours>\d+)(?::(?P<minutes>\d+))?(?::\d+)?$'
+
+
+def validate_required_columns(df, required_columns, source_label):
+    missing = [col for col in required_columns if col not in df.columns]
+    if missing:
+        raise ValueError(f"{source_label} missing required columns: {', '.join(missing)}")
+
+
+def is_path(source):
+    return isinstance(source, (str, os.PathLike))
+
+
+def report_format(source):
+    """
+    'xlsx' or 'csv' for ``source``: by extension for a path, by the first
+    bytes for a seekable binary file object (whose position is restored).
+    """
+    if is_path(source):
+        return 'xlsx' if os.fspath(source).lower().endswith('.xlsx') else 'csv'
+    position = source.tell()
+    signature = source.read(len(XLSX_SIGNATURE))
+    source.seek(position)
+    return 'xlsx' if signature == XLSX_SIGNATURE else 'csv'
+
+
+def load_report(source, is_weekly=False, columns=None, source_label='Report'):
+    """
+    Load CSV or XLSX into a DataFrame. Weekly report keeps TotalMin as string so
+    we can safely normalize time values before computation.
+
+    ``source`` is a path or a seekable binary file object (an upload stream,
+    say), read from its current position; see report_format.
+
+    When ``columns`` is given the header is validated against it before any
+    data is read, and only those columns are loaded.
+    """
+    return next(iter_report_chunks(source, None, is_weekly, columns, source_label))
+
+
+def estimate_report_rows(path):
+    """
+    Rough count of data rows in the report at ``path``, for progress bars:
+    CSV line breaks (quoted newlines count too) or the worksheet's recorded
+    dimensions. None when the workbook does not record them.
+    """
+    if report_format(path) == 'xlsx':
+        max_row = next(iter_xlsx_rows(path, dimension_only=True))
+        return None if max_row is None else max(max_row - 1, 0)
+    lines = 0
+    with open(path, 'rb') as report:
+        for block in iter(lambda: report.read(1024 * 1024), b''):
+            lines += block.count(b'\n')
+    return max(lines - 1, 0)
+
+
+def iter_report_chunks(source, chunksize, is_weekly=False, columns=None, source_label='Report'):
+    """
+    Yield a report as DataFrames of at most ``chunksize`` rows, or as a single
+    DataFrame when ``chunksize`` is None. See load_report for ``source`` and
+    ``columns``.
+    """
+    is_xlsx = report_format(source) == 'xlsx'
+    if is_xlsx:
+        chunks = iter_xlsx_chunks(source, chunksize, columns, source_label)
+    else:
+        chunks = iter_csv_chunks(source, chunksize, columns, source_label)
+
+    while True:
+        with stage('load') as timing:
+            chunk = next(chunks, None)
+            if chunk is None:
+                return
+            if is_xlsx and is_weekly and 'TotalMin' in chunk.columns:
+                chunk['TotalMin'] = chunk['TotalMin'].astype(str)
+            timing.rows_out = len(chunk)
+        yield chunk
+
+
+def iter_csv_chunks(source, chunksize, columns, source_label):
+    """
+    Read a CSV with declared dtypes (text for names and TotalMin, float for
+    NUMERIC_COLUMNS). With ``columns`` only the header is read first, then
+    just those columns are parsed. Whole-file reads use CSV_ENGINE, which is
+    pyarrow when it is installed.
+    """
+    start = None if is_path(source) else source.tell()
+
+    def rewind():
+        if start is not None:
+            source.seek(start)
+
+    text_dtypes = {col: str for col in TEXT_COLUMNS}
+    numeric_dtypes = {col: 'float64' for col in NUMERIC_COLUMNS}
+    options = {}
+    if columns is not None:
+        with stage('validate'):
+            header = pd.read_csv(source, nrows=0).columns
+            validate_required_columns(pd.DataFrame(columns=header), columns, source_label)
+        options['usecols'] = [col for col in header if col in columns]
+        rewind()
+
+    if chunksize is not None:
+        yield from pd.read_csv(source, chunksize=chunksize, dtype=text_dtypes, **options)
+        return
+    try:
+        yield pd.read_csv(source, engine=CSV_ENGINE, dtype={**text_dtypes, **numeric_dtypes}, **options)
+    except ValueError:
+        # Non-numeric values in a numeric column: read them as text so
+        # convert_numeric_columns can report which columns are invalid.
+        rewind()
+        yield pd.read_csv(source, engine=CSV_ENGINE, dtype=text_dtypes, **options)
+
+
+def iter_xlsx_rows(source, dimension_only=False):
+    """
+    Yield the values of the first worksheet's rows as tuples, with an empty
+    tuple for each row the sheet leaves out. With ``dimension_only`` yield
+    just the last row number the sheet declares (None when it declares none).
+
+    Rows come from iter_xlsx_rows_fast, which relies on openpyxl internals;
+    if those are missing (ImportError or AttributeError before the first
+    row), openpyxl's public read-only reader is used instead.
+    """
+    start = None if is_path(source) else source.tell()
+    rows = iter_xlsx_rows_fast(source, dimension_only)
+    try:
+        try:
+            first = [next(rows)]
+        except StopIteration:
+            first = []
+        except (ImportError, AttributeError) as e:
+            logger.warning(f"openpyxl's internal sheet reader is unavailable ({e}); using its public reader")
+            if start is not None:
+                source.seek(start)
+            rows = iter_xlsx_rows_public(source, dimension_only)
+            first = []
+        yield from first
+        yield from rows
+    finally:
+        rows.close()
+
+
+def iter_xlsx_rows_public(source, dimension_only=False):
+    """iter_xlsx_rows through load_workbook(read_only=True); it scans sheets without a <dimension> up front."""
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(source, read_only=True, data_only=True)
+    try:
+        if not workbook.worksheets:
+            raise ValueError('The workbook has no worksheets.')
+        sheet = workbook.worksheets[0]
+        if dimension_only:
+            yield sheet.max_row
+            return
+        for row in sheet.iter_rows(values_only=True):
+            yield tuple(row)
+    finally:
+        workbook.close()
+
+
+def iter_xlsx_rows_fast(source, dimension_only=False):
+    """
+    iter_xlsx_rows assembled from the parts of openpyxl's read-only reader:
+    its ReadOnlyWorksheet scans the whole sheet up front when the sheet has
+    no <dimension> element (openpyxl's own write-only files, for one), which
+    would make header checks as slow as a full read.
+
+    Written against openpyxl 3.1.5 (WorkSheetParser, ExcelReader.parser,
+    ExcelReader.valid_files and the workbook's _date_formats and
+    _timedelta_formats are private there).
+    """
+    from xml.etree.ElementTree import iterparse
+
+    from openpyxl.reader.excel import ExcelReader
+    from openpyxl.styles.stylesheet import apply_stylesheet
+    from openpyxl.worksheet._reader import WorkSheetParser
+    from openpyxl.xml.constants import SHEET_MAIN_NS
+
+    reader = ExcelReader(source, read_only=True, data_only=True)
+    try:
+        reader.read_manifest()
+        reader.read_strings()
+        reader.read_workbook()
+        apply_stylesheet(reader.archive, reader.wb)
+        sheet_path = next(
+            (rel.target for _, rel in reader.parser.find_sheets()
+             if rel.target in reader.valid_files and 'chartsheet' not in rel.Type),
+            None
+        )
+        if sheet_path is None:
+            raise ValueError('The workbook has no worksheets.')
+
+        with reader.archive.open(sheet_path) as sheet:
+            if dimension_only:
+                for _, element in iterparse(sheet, events=('start',)):
+                    if element.tag == f'{{{SHEET_MAIN_NS}}}dimension':
+                        last_cell = element.get('ref', '').split(':')[-1]
+                        digits = ''.join(char for char in last_cell if char.isdigit())
+                        yield int(digits) if digits else None
+                        return
+                    if element.tag == f'{{{SHEET_MAIN_NS}}}sheetData':
+                        break
+                yield None
+                return
+
+            parser = WorkSheetParser(
+                sheet, reader.shared_strings, data_only=True, epoch=reader.wb.epoch,
+                date_formats=reader.wb._date_formats, timedelta_formats=reader.wb._timedelta_formats
+            )
+            expected_row = 1
+            for row_number, cells in parser.parse():
+                for _ in range(expected_row, row_number):
+                    yield ()
+                expected_row = row_number + 1
+                values = [None] * (cells[-1]['column'] if cells else 0)
+                for cell in cells:
+                    values[cell['column'] - 1] = cell['value']
+                yield tuple(values)
+    finally:
+        reader.archive.close()
+
+
+def iter_xlsx_chunks(source, chunksize, columns, source_label):
+    """
+    Stream the first worksheet with openpyxl's read-only, values-only parser
+    (see iter_xlsx_rows). Only the header row is read before validation, and
+    only the requested columns are materialized; fully empty rows are skipped.
+    """
+    rows = iter_xlsx_rows(source)
+    try:
+        header = [
+            f'Unnamed: {position}' if name is None else name
+            for position, name in enumerate(next(rows, ()))
+        ]
+        if columns is not None:
+            with stage('validate'):
+                validate_required_columns(pd.DataFrame(columns=header), columns, source_label)
+            positions = [position for position, name in enumerate(header) if name in columns]
+        else:
+            positions = list(range(len(header)))
+        names = [header[position] for position in positions]
+        width = max(positions, default=-1) + 1
+
+        batch = []
+        for row in rows:
+            if len(row) < width:
+                row = row + (None,) * (width - len(row))
+            values = tuple(row[position] for position in positions)
+            if all(value is None for value in values):
+                continue
+            batch.append(values)
+            if chunksize is not None and len(batch) >= chunksize:
+                yield pd.DataFrame(batch, columns=names)
+                batch = []
+        if batch or chunksize is None:
+            yield pd.DataFrame(batch, columns=names)
+    finally:
+        rows.close()
+
+
+def normalize_attendance_names(attendance_rep):
+    attendance_rep['Last Name'] = attendance_rep['Last Name'].str.strip().str.lower()
+    attendance_rep['First Name'] = attendance_rep['First Name'].str.strip().str.lower()
+
+
+def normalize_weekly_names(weekly_report):
+    name_split = weekly_report['StudentName'].str.split(',', n=1, expand=True)
+    weekly_report['Last Name'] = name_split[0].str.strip().str.lower()
+    weekly_report['First Name'] = name_split[1].fillna('').str.strip().str.lower()
+    if weekly_report['First Name'].eq('').any():
+        raise ValueError("Weekly report names must use 'Last, First' format in the StudentName column.")
+
+
+def convert_numeric_columns(df, columns, source_label):
+    for col in columns:
+        df[col] = pd.to_numeric(df[col], errors='coerce')
+    invalid_columns = [col for col in columns if df[col].isnull().any()]
+    if invalid_columns:
+        raise ValueError(f"{source_label} has non-numeric values in: {', '.join(invalid_columns)}")
+    # Columns read as float that only hold whole numbers go back to integers
+    # so the report prints them as "12" rather than "12.0".
+    for col in columns:
+        if df[col].dtype.kind == 'f' and df[col].mod(1).eq(0).all():
+            df[col] = df[col].astype(np.int64)
+
+
+def compact_columns(df, numeric_columns, name_columns=('Last Name', 'First Name')):
+    """
+    Shrink ``df`` in place, after convert_numeric_columns: names become
+    categoricals, integer columns the smaller of int16/int32 that holds
+    them, and float columns float32 when every value survives the round trip.
+    """
+    for col in name_columns:
+        df[col] = df[col].astype('category')
+    for col in numeric_columns:
+        df[col] = narrow_numeric(df[col])
+
+
+def narrow_numeric(values):
+    if values.dtype.kind == 'i':
+        for dtype in (np.int16, np.int32):
+            limits = np.iinfo(dtype)
+            if values.empty or (values.min() >= limits.min and values.max() <= limits.max):
+                return values.astype(dtype)
+    elif values.dtype.kind == 'f':
+        narrowed = values.astype(np.float32)
+        if narrowed.astype(np.float64).equals(values):
+            return narrowed
+    return values
+
+
+def is_compact(df):
+    return isinstance(df['Last Name'].dtype, pd.CategoricalDtype)
+
+
+def parse_total_minutes(values):
+    """
+    Parse TotalMin values ('25:04:00', '8:32', '---', blank) into integer minutes.
+
+    Returns a tuple of (minutes, malformed): an int64 Series aligned with
+    ``values`` and a Series holding the raw values that could not be parsed.
+    Blank and '---' values count as zero minutes; malformed values also count
+    as zero but are reported so callers can summarize them once.
+    """
+    text = values.astype('string').str.strip()
+    blank = text.isna() | text.isin(BLANK_TIME_VALUES)
+    parts = text.str.extract(TIME_PATTERN)
+    parsed = parts['hours'].notna()
+
+    hours = pd.to_numeric(parts['hours']).fillna(0).to_numpy(dtype=np.int64)
+    minutes = pd.to_numeric(parts['minutes']).fillna(0).to_numpy(dtype=np.int64)
+    total = np.where(parsed.to_numpy(), hours * 60 + minutes, 0)
+
+    malformed = values[~(parsed | blank)]
+    return pd.Series(total, index=values.index, dtype=np.int64), malformed
+
+
+def format_minutes(minutes, categorical=False):
+    """
+    Format integer minutes as [h]:mm strings (e.g. 545 -> '9:05'). With
+    ``categorical`` each distinct value is formatted once and the result is
+    a categorical of those labels.
+    """
+    if categorical:
+        codes, distinct = pd.factorize(minutes)
+        labels = format_minutes(pd.Series(distinct))
+        return pd.Series(pd.Categorical.from_codes(codes, categories=labels), index=minutes.index)
+    minutes = minutes.astype(np.int64)
+    hours = (minutes // 60).astype(str)
+    remainder = (minutes % 60).astype(str).str.zfill(2)
+    return hours + ':' + remainder
+
+
+def log_malformed_times(malformed, source_label, count=None):
+    count = len(malformed) if count is None else count
+    if not count:
+        return
+    examples = ', '.join(repr(value) for value in malformed.drop_duplicates().head(5))
+    logger.warning(
+        f'{source_label} has {count} unparseable TotalMin values treated as 0:00 (e.g. {examples})'
+    )
+
+
+def validation_issue(source_label, code, message, severity='error', **details):
+    return {'source': source_label, 'code': code, 'severity': severity, 'message': message, **details}
+
+
+def row_examples(values, mask, limit=5):
+    """(1-based data row numbers, example values) for the first ``limit`` rows flagged in ``mask``."""
+    flagged = values[mask].head(limit)
+    return [int(position) + 1 for position in np.flatnonzero(mask)[:limit]], flagged.fillna('').astype(str).tolist()
+
+
+def validate_report(source, is_weekly=False, sample_rows=VALIDATION_SAMPLE_ROWS, source_label='Report'):
+    """
+    Check a report without parsing all of it: the format is sniffed, then
+    only the header and the first ``sample_rows`` data rows are read.
+
+    Returns a list of issues, each a dict with 'source', 'code', 'severity'
+    ('error' or 'warning') and a readable 'message', plus 'columns', 'rows'
+    (data row numbers, 1 = first row after the header) or 'examples' where
+    they apply. An empty list means the sample looks processable. A file
+    object is rewound to where it started.
+    """
+    start = None if is_path(source) else source.tell()
+    chunks = iter_report_chunks(source, sample_rows, is_weekly=is_weekly, source_label=source_label)
+    try:
+        sample = next(chunks)
+    except Exception as e:
+        return [validation_issue(source_label, 'unreadable', f'{source_label} could not be read as CSV or Excel: {e}')]
+    finally:
+        chunks.close()
+        if start is not None:
+            source.seek(start)
+
+    required = REQUIRED_WEEKLY_COLUMNS if is_weekly else REQUIRED_ATTENDANCE_COLUMNS
+    missing = sorted(col for col in required if col not in sample.columns)
+    if missing:
+        return [validation_issue(
+            source_label, 'missing_columns', f"{source_label} missing required columns: {', '.join(missing)}",
+            columns=missing
+        )]
+    try:
+        return sample_issues(sample, is_weekly, source_label)
+    except Exception as e:
+        # The wrong file can hold anything; report it rather than fail the upload
+        return [validation_issue(source_label, 'unreadable', f'{source_label} could not be checked: {e}')]
+
+
+def sample_issues(sample, is_weekly, source_label):
+    """Content issues in a ``sample`` that has every required column; see validate_report."""
+    issues = []
+    if is_weekly:
+        # Excel gives number columns (e.g. student IDs) a numeric dtype without .str
+        names = sample['StudentName'].astype('string')
+        first_names = names.str.split(',', n=1).str[1].fillna('').str.strip()
+        bad_names = (first_names == '').to_numpy()
+        if bad_names.any():
+            rows, examples = row_examples(names, bad_names)
+            issues.append(validation_issue(
+                source_label, 'name_format',
+                "Weekly report names must use 'Last, First' format in the StudentName column "
+                f"(row{'s' if len(rows) > 1 else ''} {', '.join(map(str, rows))})",
+                rows=rows, examples=examples
+            ))
+
+        minutes, malformed = parse_total_minutes(sample['TotalMin'])
+        if len(malformed):
+            bad_times = sample.index.isin(malformed.index)
+            rows, examples = row_examples(sample['TotalMin'], bad_times)
+            blank = sample['TotalMin'].fillna('').astype(str).str.strip().isin(BLANK_TIME_VALUES)
+            # A column of nothing but unparseable values is the wrong column, not a few typos
+            severity = 'error' if len(malformed) == np.count_nonzero(~blank) else 'warning'
+            issues.append(validation_issue(
+                source_label, 'time_format',
+                f"{source_label} has TotalMin values that are not H:MM or H:MM:SS times "
+                f"(e.g. {', '.join(repr(example) for example in examples)})",
+                severity=severity, rows=rows, examples=examples
+            ))
+    else:
+        invalid = [
+            col for col in NUMERIC_COLUMNS
+            if pd.to_numeric(sample[col], errors='coerce').isna().any()
+        ]
+        if invalid:
+            issues.append(validation_issue(
+                source_label, 'non_numeric', f"{source_label} has non-numeric values in: {', '.join(invalid)}",
+                columns=invalid
+            ))
+    return issues
+
+
+def group_boundaries(values):
+    """Mark rows whose value differs from the previous row (the first row is never marked)."""
+    values = pd.Series(values).reset_index(drop=True)
+    boundaries = values.ne(values.shift()).to_numpy()
+    boundaries[:1] = False
+    return boundaries
+
+
+def insert_group_separators(df, boundaries):
+    """Return ``df`` with a blank row inserted before every row flagged in ``boundaries``."""
+    with stage('group', rows_in=len(df)) as timing:
+        positions = np.flatnonzero(boundaries)
+        if positions.size == 0:
+            output_df = df.reset_index(drop=True)
+        else:
+            values = np.insert(df.to_numpy(dtype=object), positions, '', axis=0)
+            output_df = pd.DataFrame(values, columns=df.columns)
+        output_df.attrs.update(df.attrs)
+        timing.rows_out = len(output_df)
+    return output_df
+
+
+class RosterIndex:
+    """
+    Attendance records keyed by normalized (last, first) name.
+
+    Each distinct name is interned once as an integer key ID, so joining a
+    weekly report is an integer-array lookup rather than a string merge.
+    Build it once per attendance report and reuse it across weekly uploads.
+
+    Records sharing a name are handled by ``duplicates`` (DUPLICATE_POLICIES):
+    keep only the 'first' or 'last' of them, 'keep' them all (each joins to
+    the student's weekly minutes) or raise a ValueError ('error').
+    """
+
+    def __init__(self, attendance_rep, duplicates='keep'):
+        if duplicates not in DUPLICATE_POLICIES:
+            raise ValueError(
+                f"Unknown attendance duplicate policy '{duplicates}'. Choose one of: {', '.join(DUPLICATE_POLICIES)}"
+            )
+        self.records = attendance_rep.reset_index(drop=True)
+        self.compact = is_compact(self.records)
+        self.minutes_dtype = np.int32 if self.compact else np.int64
+        self._index_names()
+        self.duplicate_records = len(self.records) - len(self.keys)
+        self.collapsed_records = 0
+        if self.duplicate_records and duplicates != 'keep':
+            repeated = pd.Series(self.record_keys).duplicated(keep='first' if duplicates == 'error' else duplicates)
+            repeated = repeated.to_numpy()
+            if duplicates == 'error':
+                repeated_keys = np.unique(self.record_keys[repeated])
+                names = [f'{last}, {first}' for last, first in self.keys[repeated_keys[:5]]]
+                raise ValueError(
+                    f"Attendance report lists {len(repeated_keys)} student(s) more than once "
+                    f"(e.g. {'; '.join(names)}). Remove the duplicates or choose another duplicate policy."
+                )
+            # Key IDs must be record positions again, so index the remaining records afresh
+            self.records = self.records[~repeated].reset_index(drop=True)
+            self._index_names()
+            self.collapsed_records = self.duplicate_records
+        self._fuzzy_index = None
+
+    def _index_names(self):
+        self.record_keys, self.keys = pd.factorize(
+            pd.MultiIndex.from_frame(self.records[['Last Name', 'First Name']])
+        )
+        self.is_unique = len(self.keys) == len(self.records)
+
+    def __len__(self):
+        return len(self.keys)
+
+    def match(self, last_names, first_names):
+        """Return the key ID for each name pair, or -1 where the student is not on the roster."""
+        names = pd.MultiIndex.from_arrays([np.asarray(last_names, dtype=object), np.asarray(first_names, dtype=object)])
+        return self.keys.get_indexer(names)
+
+    def match_names(self, last_names, first_names, matching='exact'):
+        """
+        Key IDs for each name pair plus a report of non-exact matches. With
+        ``matching='fuzzy'`` names without an exact match are retried with
+        folded and fuzzy comparison (see attendance_matching).
+        """
+        key_ids = self.match(last_names, first_names)
+        if matching == 'exact':
+            return key_ids, []
+        if matching != 'fuzzy':
+            raise ValueError(f"Unknown matching mode '{matching}'. Choose one of: {', '.join(MATCHING_MODES)}")
+        if self._fuzzy_index is None:
+            from attendance_matching import FuzzyIndex
+
+            with stage('index', rows_in=len(self)):
+                self._fuzzy_index = FuzzyIndex(self.keys)
+        return self._fuzzy_index.match(last_names, first_names, key_ids)
+
+    def join(self, key_ids, weekly):
+        """Attach roster records to the rows of ``weekly`` with matching key IDs, dropping unmatched rows."""
+        matched = key_ids >= 0
+        weekly = weekly[matched].reset_index(drop=True)
+        key_ids = key_ids[matched]
+        if self.is_unique:
+            # Key IDs follow first appearance, so with unique names they are record positions
+            records = self.records.take(key_ids).reset_index(drop=True)
+            return pd.concat([records, weekly], axis=1)
+        return pd.merge(
+            self.records.assign(_key=self.record_keys),
+            weekly.assign(_key=key_ids),
+            on='_key'
+        ).drop(columns='_key')
+
+    def join_minutes(self, minutes_per_key, rows_per_key):
+        """Roster records of every key with weekly rows, joined to that key's summed Weekly Minutes."""
+        seen_keys = np.flatnonzero(rows_per_key)
+        weekly = pd.DataFrame({'Weekly Minutes': minutes_per_key[seen_keys].astype(self.minutes_dtype)})
+        return self.join(seen_keys, weekly)
+
+    def summarize(self, matched_keys, weekly_rows, unmatched_rows, unmatched_names):
+        """Build the match summary reported alongside a processed report."""
+        summary = {
+            'weekly_rows': int(weekly_rows),
+            'matched_rows': int(weekly_rows - unmatched_rows),
+            'unmatched_rows': int(unmatched_rows),
+            'roster_students': len(self),
+            'matched_students': int(np.count_nonzero(matched_keys)),
+            'unmatched_names': list(unmatched_names),
+            # Weekly rows summed into another row for the same student, and attendance records dropped
+            'collapsed_weekly_rows': int(weekly_rows - unmatched_rows - np.count_nonzero(matched_keys)),
+            'collapsed_attendance_records': self.collapsed_records,
+        }
+        logger.info(
+            f"Matched {summary['matched_rows']} of {summary['weekly_rows']} weekly rows to "
+            f"{summary['matched_students']} of {summary['roster_students']} roster students"
+        )
+        if summary['collapsed_weekly_rows'] or summary['collapsed_attendance_records']:
+            logger.info(
+                f"Collapsed {summary['collapsed_weekly_rows']} repeated weekly rows and "
+                f"{summary['collapsed_attendance_records']} duplicate attendance records"
+            )
+        if self.duplicate_records and not self.collapsed_records:
+            logger.warning(f'Attendance report has {self.duplicate_records} duplicate records; each gets its own row')
+        return summary
+
+
+def load_roster(attendance_path, compact=None, duplicates=None):
+    """
+    Load and index an attendance report; ``compact`` (default COMPACT_DTYPES)
+    applies compact_columns and ``duplicates`` (default ATTENDANCE_DUPLICATES)
+    is the RosterIndex duplicate policy.
+    """
+    attendance_rep = load_report(attendance_path, columns=REQUIRED_ATTENDANCE_COLUMNS, source_label='Attendance report')
+    with stage('normalize', rows_in=len(attendance_rep)):
+        normalize_attendance_names(attendance_rep)
+        convert_numeric_columns(attendance_rep, NUMERIC_COLUMNS, 'Attendance report')
+        if COMPACT_DTYPES if compact is None else compact:
+            compact_columns(attendance_rep, NUMERIC_COLUMNS)
+    with stage('index', rows_in=len(attendance_rep)) as timing:
+        roster = RosterIndex(
+            attendance_rep[['Last Name', 'First Name', 'Lessons Complete', 'Difference', 'Hours Required', 'Total Hours']],
+            ATTENDANCE_DUPLICATES if duplicates is None else duplicates
+        )
+        timing.rows_out = len(roster)
+    return roster
+
+
+def unmatched_name_sample(weekly_report, key_ids, limit):
+    unmatched = weekly_report.loc[key_ids < 0, ['Last Name', 'First Name']].head(limit)
+    return [f'{last}, {first}' for last, first in unmatched.itertuples(index=False)]
+
+
+def log_name_matches(name_matches):
+    if name_matches:
+        examples = ', '.join(
+            f"'{match['weekly_name']}' -> '{match['roster_name']}'" for match in name_matches[:5]
+        )
+        logger.info(f'Matched {len(name_matches)} weekly names without an exact match (e.g. {examples})')
+
+
+def write_name_matches(name_matches, path):
+    """Write a match report (weekly name, roster name, method, score per row) as CSV."""
+    pd.DataFrame(name_matches, columns=['weekly_name', 'roster_name', 'method', 'score']).to_csv(path, index=False)
+
+
+def sum_minutes_per_key(key_ids, minutes, key_count):
+    """Total minutes and row count per roster key ID in one vectorized pass; unmatched (-1) rows are ignored."""
+    matched = key_ids >= 0
+    minutes_per_key = np.bincount(
+        key_ids[matched], weights=np.asarray(minutes)[matched], minlength=key_count
+    ).astype(np.int64)
+    return minutes_per_key, np.bincount(key_ids[matched], minlength=key_count)
+
+
+def merge_weekly_minutes(weekly_path, roster, matching='exact'):
+    """
+    Join each matched student's total weekly minutes to their roster record.
+    Students on several weekly rows (sections or sessions) are summed first,
+    so each gets one report row; match details are stored in the result's attrs.
+    """
+    weekly_report = load_report(
+        weekly_path, is_weekly=True, columns=REQUIRED_WEEKLY_COLUMNS, source_label='Weekly report'
+    )  # Keep TotalMin as strings for consistent parsing
+    with stage('normalize', rows_in=len(weekly_report)):
+        normalize_weekly_names(weekly_report)
+
+    # Parse weekly time (from "TotalMin" column) into integer minutes
+    with stage('parse_times', rows_in=len(weekly_report)):
+        minutes, malformed_times = parse_total_minutes(weekly_report['TotalMin'])
+    log_malformed_times(malformed_times, 'Weekly report')
+
+    with stage('merge', rows_in=len(weekly_report)) as timing:
+        key_ids, name_matches = roster.match_names(weekly_report['Last Name'], weekly_report['First Name'], matching)
+        minutes_per_key, rows_per_key = sum_minutes_per_key(key_ids, minutes, len(roster))
+        merged_data = roster.join_minutes(minutes_per_key, rows_per_key)
+        timing.rows_out = len(merged_data)
+    log_name_matches(name_matches)
+    merged_data.attrs['malformed_times'] = malformed_times.tolist()
+    merged_data.attrs['name_matches'] = name_matches
+    merged_data.attrs['match_summary'] = roster.summarize(
+        rows_per_key,
+        len(key_ids),
+        np.count_nonzero(key_ids < 0),
+        unmatched_name_sample(weekly_report, key_ids, UNMATCHED_SAMPLE_LIMIT)
+    )
+    return merged_data
+
+
+def merge_weekly_minutes_chunked(weekly_path, roster, chunksize, matching='exact', progress=None):
+    """
+    Stream the weekly report in ``chunksize`` batches and sum each matched
+    student's minutes per roster key, so memory depends on the roster rather
+    than on the weekly file.
+
+    ``progress`` is called after every batch with the rows read so far,
+    between the MATCHING_PROGRESS percentages when the weekly report is a
+    path whose size can be estimated.
+    """
+    total_rows = estimate_report_rows(weekly_path) if progress is not None and is_path(weekly_path) else None
+    minutes_per_key = np.zeros(len(roster), dtype=np.int64)
+    rows_per_key = np.zeros(len(roster), dtype=np.int64)
+    weekly_rows = 0
+    unmatched_rows = 0
+    unmatched_names = []
+    malformed_count = 0
+    malformed_samples = []
+    name_matches = {}
+    for chunk in iter_report_chunks(
+        weekly_path, chunksize, is_weekly=True, columns=REQUIRED_WEEKLY_COLUMNS, source_label='Weekly report'
+    ):
+        with stage('normalize', rows_in=len(chunk)):
+            normalize_weekly_names(chunk)
+        with stage('parse_times', rows_in=len(chunk)):
+            minutes, malformed = parse_total_minutes(chunk['TotalMin'])
+        malformed_count += len(malformed)
+        if len(malformed_samples) < MALFORMED_SAMPLE_LIMIT:
+            malformed_samples.extend(malformed.head(MALFORMED_SAMPLE_LIMIT - len(malformed_samples)).tolist())
+
+        with stage('merge', rows_in=len(chunk)):
+            key_ids, chunk_matches = roster.match_names(chunk['Last Name'], chunk['First Name'], matching)
+            chunk_minutes, chunk_rows = sum_minutes_per_key(key_ids, minutes, len(roster))
+            minutes_per_key += chunk_minutes
+            rows_per_key += chunk_rows
+        name_matches.update((match['weekly_name'], match) for match in chunk_matches)
+        weekly_rows += len(key_ids)
+        unmatched_rows += np.count_nonzero(key_ids < 0)
+        if len(unmatched_names) < UNMATCHED_SAMPLE_LIMIT:
+            unmatched_names.extend(unmatched_name_sample(chunk, key_ids, UNMATCHED_SAMPLE_LIMIT - len(unmatched_names)))
+        if progress is not None:
+            start, end = MATCHING_PROGRESS
+            percent = start + (end - start) * min(weekly_rows / total_rows, 1) if total_rows else start
+            progress(f'Matching weekly report ({weekly_rows:,} rows)', int(percent))
+
+    malformed_times = pd.Series(malformed_samples, dtype=object)
+    log_malformed_times(malformed_times, 'Weekly report', count=malformed_count)
+
+    with stage('merge') as timing:
+        merged_data = roster.join_minutes(minutes_per_key, rows_per_key)
+        timing.rows_out = len(merged_data)
+    name_matches = list(name_matches.values())
+    log_name_matches(name_matches)
+    merged_data.attrs['malformed_times'] = malformed_times.tolist()
+    merged_data.attrs['name_matches'] = name_matches
+    merged_data.attrs['match_summary'] = roster.summarize(rows_per_key, weekly_rows, unmatched_rows, unmatched_names)
+    return merged_data
+
+
+def finalize_report(merged_data, sort_option, selected_columns):
+    """
+    Calculate, sort and format merged data.
+
+    Returns (report, boundaries): the final columns in output order and a
+    boolean array flagging rows that start a new Hours Required group, so
+    callers can render group separators however their output needs.
+    """
+    with stage('sort', rows_in=len(merged_data)):
+        # Calculate "Hours Ahead/Behind" at full width, so compact columns cannot overflow
+        total, required = merged_data['Total Hours'], merged_data['Hours Required']
+        ahead = pd.Series(
+            np.subtract(total, required, dtype=np.result_type(total.dtype, required.dtype, np.int64)),
+            index=merged_data.index
+        )
+        compact = is_compact(merged_data)
+        merged_data['Hours Ahead/Behind'] = narrow_numeric(ahead) if compact else ahead
+
+        # Sort data
+        if sort_option not in ('last_first', 'hours_last_first'):
+            sort_option = 'hours_last_first'
+        if sort_option == 'last_first':
+            merged_data.sort_values(by=['Last Name', 'First Name'], inplace=True)
+        else:
+            merged_data.sort_values(by=['Hours Required', 'Last Name', 'First Name'], inplace=True)
+
+    with stage('format', rows_in=len(merged_data)):
+        # Round numeric columns
+        for col in ['Total Hours', 'Hours Ahead/Behind']:
+            merged_data[col] = merged_data[col].round(2)
+
+        # Rename columns
+        merged_data.rename(columns={
+            'Difference': 'Difference in Lessons',
+            'Total Hours': 'Total Cumulative Hours'
+        }, inplace=True)
+
+        # Format Weekly Hours (and any ledger history) to [h]:mm
+        for minutes_col, hours_col in MINUTES_COLUMNS.items():
+            if minutes_col in merged_data.columns:
+                merged_data[hours_col] = format_minutes(merged_data[minutes_col], categorical=compact)
+
+    # Group boundaries for blank separator lines when sorting by hours
+    with stage('group', rows_in=len(merged_data)):
+        if sort_option == 'last_first':
+            boundaries = np.zeros(len(merged_data), dtype=bool)
+        else:
+            boundaries = group_boundaries(merged_data['Hours Required'])
+
+    # Select final columns
+    with stage('format') as timing:
+        final_columns = ['Last Name', 'First Name'] + [col for col in selected_columns if col in merged_data.columns]
+        report = merged_data[final_columns].reset_index(drop=True)
+        report.attrs.update(merged_data.attrs)
+        timing.rows_out = len(report)
+    return report, boundaries
+
+
+def report_progress(progress, stage, percent):
+    if progress is not None:
+        progress(stage, percent)
+
+
+def merge_reports(weekly_path, attendance_path, chunksize=None, roster=None, progress=None, matching='exact',
+                  duplicates=None):
+    """
+    Load both reports and join weekly minutes onto the roster.
+
+    Each student's weekly rows are summed into one report row; with
+    ``chunksize`` set the weekly report is streamed in batches of that many
+    rows, so memory depends on the roster. Pass a prebuilt ``roster`` to
+    reuse one attendance report across weekly reports; ``attendance_path``
+    and ``duplicates`` are then ignored. ``progress`` is called with
+    (stage, percent) as the work advances, after every batch when chunked.
+    ``matching`` is one of MATCHING_MODES; non-exact matches are listed in
+    attrs['name_matches'].
+    """
+    if roster is None:
+        report_progress(progress, 'Loading attendance report', 10)
+        roster = load_roster(attendance_path, duplicates=duplicates)
+    report_progress(progress, 'Matching weekly report', MATCHING_PROGRESS[0])
+    if chunksize:
+        return merge_weekly_minutes_chunked(weekly_path, roster, chunksize, matching, progress)
+    return merge_weekly_minutes(weekly_path, roster, matching)
+
+
+def build_report(weekly_path, attendance_path, sort_option, selected_columns, chunksize=None, roster=None,
+                 progress=None, matching='exact'):
+    """Load, merge and sort both reports; see merge_reports and finalize_report."""
+    merged_data = merge_reports(weekly_path, attendance_path, chunksize, roster, progress, matching)
+    report_progress(progress, 'Sorting report', 70)
+    return finalize_report(merged_data, sort_option, selected_columns)
+
+
+def iter_csv(report, boundaries, chunk_rows):
+    """
+    Yield ``report`` as CSV text in blocks of ``chunk_rows`` rows, with a
+    blank separator line before every row flagged in ``boundaries``.
+    """
+    yield report.iloc[:0].to_csv(index=False)
+    for start in range(0, len(report), chunk_rows):
+        with stage('serialize', rows_in=min(chunk_rows, len(report) - start)):
+            block = report.iloc[start:start + chunk_rows]
+            block = insert_group_separators(block, boundaries[start:start + chunk_rows])
+            text = block.to_csv(index=False, header=False)
+        yield text
+
+
+def write_csv(report, boundaries, path, chunk_rows):
+    with open(path, 'w', newline='') as out:
+        for block in iter_csv(report, boundaries, chunk_rows):
+            out.write(block)
+
+
+def group_ids(boundaries):
+    """Number the Hours Required groups flagged by ``boundaries`` 0, 1, 2, ... per row."""
+    return np.cumsum(boundaries, dtype=np.int64)
+
+
+def iter_ndjson(report, boundaries, chunk_rows):
+    """
+    Yield ``report`` as newline-delimited JSON in blocks of ``chunk_rows``
+    rows. Each record carries a 'Group' number instead of separator rows.
+    """
+    groups = group_ids(boundaries)
+    for start in range(0, len(report), chunk_rows):
+        with stage('serialize', rows_in=min(chunk_rows, len(report) - start)):
+            block = report.iloc[start:start + chunk_rows].assign(Group=groups[start:start + chunk_rows])
+            text = block.to_json(orient='records', lines=True)
+        yield text
+
+
+def write_parquet(report, boundaries, path):
+    """Write ``report`` with its column types intact and a 'Group' column instead of separator rows."""
+    if importlib.util.find_spec('pyarrow') is None:
+        raise ValueError('Parquet output requires pyarrow. Install it or choose another output format.')
+    with stage('serialize', rows_in=len(report)):
+        table = report.assign(Group=group_ids(boundaries))
+        table.attrs = {}
+        table.to_parquet(path, index=False)
+
+
+def write_xlsx(report, boundaries, path, chunk_rows):
+    """
+    Write ``report`` with openpyxl's write-only (constant memory) workbook.
+    When the report has more than one Hours Required group, each group gets
+    a label row and its rows are outlined so Excel can collapse them.
+    """
+    from openpyxl import Workbook
+
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet('Report')
+    sheet.sheet_properties.outlinePr.summaryBelow = False
+    sheet.append(list(report.columns))
+    outlined = bool(np.any(boundaries))
+    group_labels = report['Hours Required'] if 'Hours Required' in report.columns else None
+    row_number = 1
+    for start in range(0, len(report), chunk_rows):
+        with stage('serialize', rows_in=min(chunk_rows, len(report) - start)):
+            block = report.iloc[start:start + chunk_rows].astype(object)
+            block = block.where(block.notna(), None)
+            for offset, values in enumerate(block.itertuples(index=False, name=None)):
+                position = start + offset
+                if outlined and (position == 0 or boundaries[position]):
+                    label = '' if group_labels is None else f'Hours Required: {group_labels.iat[position]}'
+                    sheet.append([label])
+                    row_number += 1
+                row_number += 1
+                if outlined:
+                    sheet.row_dimensions[row_number].outlineLevel = 1
+                sheet.append(list(values))
+                if outlined:
+                    # Rows are written as they are appended; drop their settings to keep memory flat
+                    del sheet.row_dimensions[row_number]
+    workbook.save(path)
+
+
+def write_report(report, boundaries, path, output_format='csv', chunk_rows=5000):
+    """Write ``report`` to ``path`` in one of OUTPUT_FORMATS."""
+    if output_format == 'csv':
+        write_csv(report, boundaries, path, chunk_rows)
+    elif output_format == 'ndjson':
+        with open(path, 'w') as out:
+            for block in iter_ndjson(report, boundaries, chunk_rows):
+                out.write(block)
+    elif output_format == 'xlsx':
+        write_xlsx(report, boundaries, path, chunk_rows)
+    elif output_format == 'parquet':
+        write_parquet(report, boundaries, path)
+    else:
+        raise ValueError(f"Unknown output format '{output_format}'. Choose one of: {', '.join(OUTPUT_FORMATS)}")
+
+
+_batch_roster = None
+
+
+def _init_batch_worker(roster):
+    global _batch_roster
+    _batch_roster = roster
+
+
+def _process_batch_file(weekly_path, output_path, sort_option, selected_columns, chunksize, csv_chunk_rows,
+                        output_format='csv', matching='exact'):
+    try:
+        report, boundaries = build_report(
+            weekly_path, None, sort_option, selected_columns, chunksize, roster=_batch_roster, matching=matching
+        )
+    except Exception as e:
+        raise ValueError(f'{os.path.basename(weekly_path)}: {e}') from e
+    write_report(report, boundaries, output_path, output_format, csv_chunk_rows)
+    return report.attrs.get('match_summary')
+
+
+def batch_output_name(weekly_name, used_names, extension='csv'):
+    stem = os.path.splitext(os.path.basename(weekly_name))[0] or 'weekly'
+    name = f'{stem}_Processed.{extension}'
+    suffix = 2
+    while name in used_names:
+        name = f'{stem}_{suffix}_Processed.{extension}'
+        suffix += 1
+    used_names.add(name)
+    return name
+
+
+def process_batch(weekly_paths, attendance_path, output_dir, sort_option, selected_columns, chunksize=None,
+                  max_workers=None, csv_chunk_rows=5000, output_names=None, mp_context=None, output_format='csv',
+                  matching='exact', duplicates=None):
+    """
+    Process many weekly reports against one attendance report.
+
+    The attendance report is loaded and indexed once, then shipped to each
+    pool process a single time; weekly files are processed in parallel and
+    written to ``output_dir`` in ``output_format``. Returns the output paths
+    in input order. ``duplicates`` is the attendance duplicate policy (see
+    load_roster).
+    """
+    if output_format not in OUTPUT_FORMATS:
+        raise ValueError(f"Unknown output format '{output_format}'. Choose one of: {', '.join(OUTPUT_FORMATS)}")
+    roster = load_roster(attendance_path, duplicates=duplicates)
+    used_names = set()
+    extension = OUTPUT_FORMATS[output_format][1]
+    output_paths = [
+        os.path.join(output_dir, batch_output_name(name, used_names, extension))
+        for name in (output_names or weekly_paths)
+    ]
+    max_workers = min(max_workers or os.cpu_count() or 1, len(weekly_paths)) or 1
+    with ProcessPoolExecutor(
+        max_workers=max_workers, mp_context=mp_context, initializer=_init_batch_worker, initargs=(roster,)
+    ) as pool:
+        futures = [
+            pool.submit(
+                _process_batch_file, weekly_path, output_path, sort_option, selected_columns, chunksize,
+                csv_chunk_rows, output_format, matching
+            )
+            for weekly_path, output_path in zip(weekly_paths, output_paths)
+        ]
+        for output_path, future in zip(output_paths, futures):
+            summary = future.result()
+            if summary:
+                logger.info(
+                    f"{os.path.basename(output_path)}: matched {summary['matched_rows']} of "
+                    f"{summary['weekly_rows']} weekly rows"
+                )
+    return output_paths
+
+
+def process_files(weekly_path, attendance_path, sort_option, selected_columns, chunksize=None, roster=None,
+                  matching='exact'):
+    try:
+        report, boundaries = build_report(
+            weekly_path, attendance_path, sort_option, selected_columns, chunksize, roster, matching=matching
+        )
+        # Insert blank lines between Hours Required groups
+        return insert_group_separators(report, boundaries)
+    except Exception as e:
+        logger.error(f'Error processing files: {e}')
+        raise
@@ -0,0 +1,110 @@
+"""
+Multi-week history of weekly minutes per student, kept in SQLite.
+
+Each processed week is recorded under the ISO date of its Monday, keyed by
+normalized (last, first) name, so rolling totals and averages can be added
+to a report without re-parsing earlier weekly exports.
+"""
+import sqlite3
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+
+NAME_COLUMNS = ['Last Name', 'First Name']
+
+
+def week_start(value=None):
+    """Return the ISO date of the Monday of the week containing ``value`` (a date or 'YYYY-MM-DD'; default today)."""
+    if value is None:
+        day = date.today()
+    elif isinstance(value, str):
+        try:
+            day = date.fromisoformat(value.strip())
+        except ValueError:
+            raise ValueError(f"Week must be a date in YYYY-MM-DD format, got '{value}'.") from None
+    else:
+        day = value
+    return (day - timedelta(days=day.weekday())).isoformat()
+
+
+class WeeklyLedger:
+    """Per-student weekly minutes stored in one SQLite table."""
+
+    def __init__(self, path):
+        self.path = path
+        with self._connect() as conn:
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS weekly_minutes ('
+                'week TEXT NOT NULL, last_name TEXT NOT NULL, first_name TEXT NOT NULL, minutes INTEGER NOT NULL, '
+                'PRIMARY KEY (week, last_name, first_name))'
+            )
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=30)
+
+    def record_week(self, week, merged_data):
+        """
+        Store each student's Weekly Minutes for ``week``. Recording the
+        same week again replaces the whole week, so students missing from the
+        new upload no longer count towards it.
+        """
+        # merge_reports already summed each student's weekly rows; a roster
+        # kept with duplicates repeats that total on every duplicate record
+        totals = merged_data.groupby(NAME_COLUMNS, sort=False, observed=True)['Weekly Minutes'].first()
+        rows = [(week, last, first, int(minutes)) for (last, first), minutes in totals.items()]
+        # One transaction: readers never see the week half replaced
+        with self._connect() as conn:
+            conn.execute('DELETE FROM weekly_minutes WHERE week = ?', (week,))
+            conn.executemany('INSERT INTO weekly_minutes VALUES (?, ?, ?, ?)', rows)
+        return len(rows)
+
+    def recent_weeks(self, through_week, count):
+        """The ``count`` most recent recorded weeks up to and including ``through_week``, newest first."""
+        with self._connect() as conn:
+            rows = conn.execute(
+                'SELECT DISTINCT week FROM weekly_minutes WHERE week <= ? ORDER BY week DESC LIMIT ?',
+                (through_week, count)
+            ).fetchall()
+        return [week for (week,) in rows]
+
+    def rolling_minutes(self, through_week, count):
+        """
+        Total and average minutes per student over the most recent ``count``
+        recorded weeks. Students missing from a recorded week count as zero
+        for that week. Returns (frame, weeks).
+        """
+        weeks = self.recent_weeks(through_week, count)
+        columns = [*NAME_COLUMNS, 'Rolling Minutes', 'Average Minutes']
+        if not weeks:
+            return pd.DataFrame(columns=columns), weeks
+        placeholders = ', '.join('?' for _ in weeks)
+        with self._connect() as conn:
+            rolling = pd.read_sql_query(
+                f'SELECT last_name, first_name, SUM(minutes) AS total FROM weekly_minutes '
+                f'WHERE week IN ({placeholders}) GROUP BY last_name, first_name',
+                conn,
+                params=weeks
+            )
+        rolling.columns = [*NAME_COLUMNS, 'Rolling Minutes']
+        rolling['Average Minutes'] = (rolling['Rolling Minutes'] / len(weeks)).round().astype(np.int64)
+        return rolling[columns], weeks
+
+
+def apply_history(merged_data, ledger_path, week, rolling_weeks):
+    """
+    Record this week's minutes in the ledger at ``ledger_path`` and add
+    'Rolling Minutes' / 'Average Minutes' columns over the last
+    ``rolling_weeks`` recorded weeks (including this one) to ``merged_data``.
+    """
+    ledger = WeeklyLedger(ledger_path)
+    week = week_start(week)
+    ledger.record_week(week, merged_data)
+    rolling, weeks = ledger.rolling_minutes(week, rolling_weeks)
+
+    keys = pd.MultiIndex.from_frame(merged_data[NAME_COLUMNS])
+    rolling = rolling.set_index(NAME_COLUMNS)
+    for col in ('Rolling Minutes', 'Average Minutes'):
+        merged_data[col] = rolling[col].reindex(keys).fillna(0).to_numpy(dtype=np.int64)
+    merged_data.attrs['history_weeks'] = weeks
+    return merged_data
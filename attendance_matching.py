@@ -0,0 +1,168 @@
+"""
+Fuzzy student name matching for weekly rows that have no exact roster match.
+
+Names are folded (accents removed, punctuation and generational suffixes
+dropped, whitespace collapsed) and then matched in three passes:
+
+1. folded last and first name are equal ('folded')
+2. folded last name and the first word of the first name are equal, which
+   covers middle names and initials ('first_word')
+3. difflib similarity against roster names in the same blocks, where a block
+   holds every roster name sharing the Soundex code of one of its last-name
+   words ('fuzzy')
+
+Only names that failed the exact join are looked at, and each one is scored
+against its blocks rather than the whole roster, so the cost stays close to
+linear in the number of weekly rows.
+"""
+import difflib
+
+import numpy as np
+import pandas as pd
+
+SUFFIX_PATTERN = r'\b(?:jr|sr|ii|iii|iv)\b'
+SOUNDEX_CODES = {
+    **dict.fromkeys('bfpv', '1'), **dict.fromkeys('cgjkqsxz', '2'), **dict.fromkeys('dt', '3'),
+    'l': '4', **dict.fromkeys('mn', '5'), 'r': '6',
+}
+MIN_SCORE = 0.88
+MIN_MARGIN = 0.03  # best score must beat the runner-up by this much
+
+
+def fold_names(values):
+    """Fold names for comparison: 'José O'Neil-Smith Jr.' -> 'jose oneil smith'."""
+    return (
+        pd.Series(values, dtype=object).fillna('').astype(str)
+        .str.normalize('NFKD').str.encode('ascii', 'ignore').str.decode('ascii')
+        .str.lower()
+        .str.replace(r"[.'`]", '', regex=True)
+        .str.replace(r'[^a-z0-9]+', ' ', regex=True)
+        .str.replace(SUFFIX_PATTERN, ' ', regex=True)
+        .str.split().str.join(' ')
+    )
+
+
+def soundex(word):
+    """American Soundex code of ``word`` (e.g. 'robert' -> 'R163'), or '' for an empty word."""
+    letters = [letter for letter in word.lower() if letter.isalpha()]
+    if not letters:
+        return ''
+    code = letters[0].upper()
+    previous = SOUNDEX_CODES.get(letters[0], '')
+    for letter in letters[1:]:
+        digit = SOUNDEX_CODES.get(letter, '')
+        if digit and digit != previous:
+            code += digit
+            if len(code) == 4:
+                break
+        if letter not in 'hw':
+            previous = digit
+    return code.ljust(4, '0')
+
+
+def block_keys(last_name):
+    return {soundex(word) for word in last_name.split()} - {''}
+
+
+def _unique_lookup(keys):
+    """Map each key to its position, or to -1 when several positions share it."""
+    lookup = {}
+    for position, key in enumerate(keys):
+        lookup[key] = -1 if key in lookup else position
+    return lookup
+
+
+def _ratio(matcher, candidate, floor):
+    """Similarity of ``candidate`` to the matcher's query; 0.0 when its cheap upper bound is below ``floor``."""
+    matcher.set_seq1(candidate)
+    if matcher.real_quick_ratio() < floor or matcher.quick_ratio() < floor:
+        return 0.0
+    return matcher.ratio()
+
+
+class FuzzyIndex:
+    """
+    Folded and blocked view of a roster's distinct names. ``names`` is the
+    roster's MultiIndex of (last, first) names; positions are its key IDs.
+    """
+
+    def __init__(self, names, min_score=MIN_SCORE, min_margin=MIN_MARGIN):
+        self.min_score = min_score
+        self.min_margin = min_margin
+        self.names = names
+        self.last = fold_names(names.get_level_values(0)).tolist()
+        self.first = fold_names(names.get_level_values(1)).tolist()
+        self.first_word = [first.split(' ', 1)[0] for first in self.first]
+        self.full = [f'{last} {first}' for last, first in zip(self.last, self.first)]
+        self.short = [f'{last} {first_word}' for last, first_word in zip(self.last, self.first_word)]
+        self.by_name = _unique_lookup(zip(self.last, self.first))
+        self.by_first_word = _unique_lookup(zip(self.last, self.first_word))
+        self.blocks = {}
+        for position, last in enumerate(self.last):
+            for key in block_keys(last):
+                self.blocks.setdefault(key, []).append(position)
+
+    def match_one(self, last, first):
+        """Return (key_id, method, score) for folded names, with key_id -1 when nothing is close enough."""
+        key_id = self.by_name.get((last, first), -1)
+        if key_id >= 0:
+            return key_id, 'folded', 1.0
+        first_word = first.split(' ', 1)[0]
+        key_id = self.by_first_word.get((last, first_word), -1)
+        if key_id >= 0:
+            return key_id, 'first_word', 1.0
+
+        candidates = {position for key in block_keys(last) for position in self.blocks.get(key, ())}
+        # SequenceMatcher caches its analysis of the second sequence, so the query goes there
+        full_matcher = difflib.SequenceMatcher(None, b=f'{last} {first}', autojunk=False)
+        short_matcher = difflib.SequenceMatcher(None, b=f'{last} {first_word}', autojunk=False)
+        floor = self.min_score - self.min_margin
+        scores = []
+        for position in candidates:
+            score = max(
+                _ratio(full_matcher, self.full[position], floor),
+                _ratio(short_matcher, self.short[position], floor)
+            )
+            scores.append((score, position))
+        if not scores:
+            return -1, None, 0.0
+        scores.sort(reverse=True)
+        best_score, best_position = scores[0]
+        runner_up = scores[1][0] if len(scores) > 1 else 0.0
+        if best_score < self.min_score or best_score - runner_up < self.min_margin:
+            return -1, None, best_score
+        return best_position, 'fuzzy', best_score
+
+    def match(self, last_names, first_names, key_ids):
+        """
+        Fill in key IDs for rows where ``key_ids`` is -1. Returns the new key
+        IDs and a match report: one dict per distinct weekly name matched here.
+        """
+        key_ids = np.array(key_ids, copy=True)
+        unmatched = np.flatnonzero(key_ids < 0)
+        if unmatched.size == 0:
+            return key_ids, []
+        pairs = pd.DataFrame({
+            'last': np.asarray(last_names, dtype=object)[unmatched],
+            'first': np.asarray(first_names, dtype=object)[unmatched],
+        })
+        codes, distinct = pd.factorize(pd.MultiIndex.from_frame(pairs))
+        folded_last = fold_names(distinct.get_level_values(0)).tolist()
+        folded_first = fold_names(distinct.get_level_values(1)).tolist()
+
+        distinct_ids = np.full(len(distinct), -1, dtype=key_ids.dtype)
+        report = []
+        for position, (last, first) in enumerate(zip(folded_last, folded_first)):
+            key_id, method, score = self.match_one(last, first)
+            if key_id < 0:
+                continue
+            distinct_ids[position] = key_id
+            weekly_last, weekly_first = distinct[position]
+            report.append({
+                'weekly_name': f'{weekly_last}, {weekly_first}',
+                'roster_name': ', '.join(self.names[key_id]),
+                'method': method,
+                'score': round(score, 3),
+            })
+        key_ids[unmatched] = distinct_ids[codes]
+        return key_ids, report
@@ -0,0 +1,323 @@
+"""
+Per-stage timing and memory instrumentation for report processing.
+
+Processing code wraps each stage in ``stage(name)``; this is a no-op unless
+a StageTimer has been activated for the current thread, so the desktop app
+and the CLI pay nothing for it. Timers are folded into a MetricsRegistry,
+which renders Prometheus text-format histograms. Only the standard library
+is used.
+"""
+import glob
+import json
+import os
+import sys
+import threading
+import time
+import tracemalloc
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+_current_timer = ContextVar('attendance_stage_timer', default=None)
+
+SECONDS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+BYTES_BUCKETS = tuple(2 ** power for power in range(20, 32))  # 1 MiB .. 2 GiB
+
+
+def peak_rss_bytes():
+    """Peak resident set size of this process, or None where the platform does not report it."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024  # kilobytes on Linux
+
+
+class StageRecord:
+    """One pass through a stage. Callers may set ``rows_out`` before it ends."""
+
+    __slots__ = ('name', 'rows_in', 'rows_out', 'seconds', 'child_seconds', 'traced_peak')
+
+    def __init__(self, name, rows_in=None):
+        self.name = name
+        self.rows_in = rows_in
+        self.rows_out = None
+        self.seconds = 0.0
+        self.child_seconds = 0.0
+        self.traced_peak = None
+
+
+class StageTimer:
+    """
+    Collects stage timings for one run. A stage that runs several times (one
+    per weekly chunk, say) is summed under its name. Time spent in a nested
+    stage is only counted for the inner stage, so stage times add up to the
+    instrumented total.
+
+    When tracemalloc is tracing, each stage also records the peak traced
+    memory while it ran. tracemalloc's peak is process-wide, so concurrent
+    runs in other threads show up in each other's peaks.
+    """
+
+    def __init__(self):
+        self.stages = {}
+        self._stack = []
+
+    @contextmanager
+    def activate(self):
+        """Make this the timer that ``stage()`` records into for the current context."""
+        token = _current_timer.set(self)
+        try:
+            yield self
+        finally:
+            _current_timer.reset(token)
+
+    @contextmanager
+    def stage(self, name, rows_in=None):
+        record = StageRecord(name, rows_in)
+        parent = self._stack[-1] if self._stack else None
+        tracing = tracemalloc.is_tracing()
+        if tracing:
+            if parent is not None:
+                parent.traced_peak = max(parent.traced_peak or 0, tracemalloc.get_traced_memory()[1])
+            tracemalloc.reset_peak()
+        self._stack.append(record)
+        start = time.perf_counter()
+        try:
+            yield record
+        finally:
+            elapsed = time.perf_counter() - start
+            self._stack.pop()
+            record.seconds = elapsed - record.child_seconds
+            if tracing:
+                record.traced_peak = max(record.traced_peak or 0, tracemalloc.get_traced_memory()[1])
+            if parent is not None:
+                parent.child_seconds += elapsed
+                if record.traced_peak is not None:
+                    parent.traced_peak = max(parent.traced_peak or 0, record.traced_peak)
+            self._add(record)
+
+    def _add(self, record):
+        totals = self.stages.setdefault(record.name, {
+            'stage': record.name, 'calls': 0, 'seconds': 0.0, 'rows_in': None, 'rows_out': None,
+            'traced_peak_bytes': None, 'peak_rss_bytes': None
+        })
+        totals['calls'] += 1
+        totals['seconds'] += record.seconds
+        for key, value in (('rows_in', record.rows_in), ('rows_out', record.rows_out)):
+            if value is not None:
+                totals[key] = (totals[key] or 0) + value
+        if record.traced_peak is not None:
+            totals['traced_peak_bytes'] = max(totals['traced_peak_bytes'] or 0, record.traced_peak)
+        totals['peak_rss_bytes'] = peak_rss_bytes()
+
+    @property
+    def total_seconds(self):
+        return sum(totals['seconds'] for totals in self.stages.values())
+
+    def snapshot(self):
+        """Stage totals as plain dicts, in the order stages first finished (safe to pickle across processes)."""
+        return [dict(totals) for totals in self.stages.values()]
+
+    def server_timing(self):
+        """A Server-Timing header value, e.g. 'load;dur=12.5, merge;dur=3.1, total;dur=15.6'."""
+        entries = [f"{name};dur={totals['seconds'] * 1000:.1f}" for name, totals in self.stages.items()]
+        entries.append(f'total;dur={self.total_seconds * 1000:.1f}')
+        return ', '.join(entries)
+
+
+@contextmanager
+def stage(name, rows_in=None):
+    """Time a stage in the active StageTimer; yields a StageRecord either way."""
+    timer = _current_timer.get()
+    if timer is None:
+        yield StageRecord(name, rows_in)
+        return
+    with timer.stage(name, rows_in) as record:
+        yield record
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        for position, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[position] += 1
+        self.count += 1
+        self.sum += value
+
+    def state(self):
+        return {'counts': list(self.counts), 'count': self.count, 'sum': self.sum}
+
+    def merge(self, state):
+        self.counts = [mine + theirs for mine, theirs in zip(self.counts, state['counts'])]
+        self.count += state['count']
+        self.sum += state['sum']
+
+
+class MetricsRegistry:
+    """
+    Stage histograms and row counters for one process, rendered in the
+    Prometheus text format.
+
+    Each gunicorn worker keeps its own registry. With a ``directory`` shared
+    by the workers, every registry also writes its state to a file of its
+    own there after each run, and render() merges all of those files, so a
+    scrape sees the same totals whichever worker answers it (the approach of
+    prometheus_client's multiprocess mode). Files of workers that have
+    exited are kept, so their counts never drop out of the totals; the
+    directory is emptied when gunicorn starts (see gunicorn_config).
+    """
+
+    def __init__(self, directory=None):
+        self._lock = threading.Lock()
+        self.directory = directory
+        self._reset()
+
+    def _reset(self):
+        self._pid = os.getpid()
+        # Unique per process, so a worker that reuses an exited worker's PID
+        # does not overwrite its counts
+        self._state_path = None
+        if self.directory:
+            self._state_path = os.path.join(self.directory, f'{self._pid}-{uuid.uuid4().hex[:8]}.json')
+        self.runs = {}
+        self.stage_seconds = {}
+        self.stage_traced_bytes = {}
+        self.rows_in = {}
+        self.rows_out = {}
+
+    def _check_fork(self):
+        # A worker forked from a preloaded master inherits the master's registry
+        if self._pid != os.getpid():
+            self._reset()
+
+    def record(self, stages, kind, outcome='ok'):
+        """Fold one run's ``stages`` (a StageTimer or its snapshot) into the metrics."""
+        if isinstance(stages, StageTimer):
+            stages = stages.snapshot()
+        with self._lock:
+            self._check_fork()
+            self.runs[(kind, outcome)] = self.runs.get((kind, outcome), 0) + 1
+            for totals in stages:
+                name = totals['stage']
+                self.stage_seconds.setdefault(name, Histogram(SECONDS_BUCKETS)).observe(totals['seconds'])
+                if totals['traced_peak_bytes'] is not None:
+                    self.stage_traced_bytes.setdefault(name, Histogram(BYTES_BUCKETS)).observe(
+                        totals['traced_peak_bytes']
+                    )
+                for counter, key in ((self.rows_in, 'rows_in'), (self.rows_out, 'rows_out')):
+                    if totals[key] is not None:
+                        counter[name] = counter.get(name, 0) + totals[key]
+            if self._state_path:
+                self._write_state()
+
+    def state(self):
+        """This registry's counts as JSON-ready data, for merge()."""
+        return {
+            'runs': [[kind, outcome, count] for (kind, outcome), count in self.runs.items()],
+            'stage_seconds': {name: histogram.state() for name, histogram in self.stage_seconds.items()},
+            'stage_traced_bytes': {name: histogram.state() for name, histogram in self.stage_traced_bytes.items()},
+            'rows_in': dict(self.rows_in),
+            'rows_out': dict(self.rows_out),
+            'peak_rss_bytes': peak_rss_bytes(),
+        }
+
+    def merge(self, state):
+        """Add another registry's state() to this one's counts."""
+        for kind, outcome, count in state['runs']:
+            self.runs[(kind, outcome)] = self.runs.get((kind, outcome), 0) + count
+        for histograms, key, buckets in (
+            (self.stage_seconds, 'stage_seconds', SECONDS_BUCKETS),
+            (self.stage_traced_bytes, 'stage_traced_bytes', BYTES_BUCKETS),
+        ):
+            for name, histogram in state[key].items():
+                histograms.setdefault(name, Histogram(buckets)).merge(histogram)
+        for counter, key in ((self.rows_in, 'rows_in'), (self.rows_out, 'rows_out')):
+            for name, count in state[key].items():
+                counter[name] = counter.get(name, 0) + count
+
+    def _write_state(self):
+        os.makedirs(self.directory, exist_ok=True)
+        temp_path = f'{self._state_path}.tmp'
+        with open(temp_path, 'w') as state_file:
+            json.dump(self.state(), state_file)
+        # A scrape reading the file sees the previous state or this one, never half of it
+        os.replace(temp_path, self._state_path)
+
+    def _other_states(self):
+        states = []
+        for path in glob.glob(os.path.join(self.directory, '*.json')):
+            if path == self._state_path:
+                continue
+            try:
+                with open(path) as state_file:
+                    states.append(json.load(state_file))
+            except (OSError, ValueError):
+                continue  # removed or emptied since the glob
+        return states
+
+    def render(self):
+        """The metrics in Prometheus text format, merged across the directory's registries when it is set."""
+        with self._lock:
+            self._check_fork()
+            states = [self.state()]
+        if self.directory:
+            states += self._other_states()
+        merged = MetricsRegistry()
+        for state in states:
+            merged.merge(state)
+        peak_rss = [state['peak_rss_bytes'] for state in states if state['peak_rss_bytes'] is not None]
+        return merged._render(max(peak_rss) if peak_rss else None)
+
+    def _render(self, peak_rss):
+        lines = []
+        with self._lock:
+            lines += _header('attendance_runs_total', 'counter', 'Report processing runs by kind and outcome.')
+            for (kind, outcome), count in sorted(self.runs.items()):
+                lines.append(f'attendance_runs_total{{kind="{kind}",outcome="{outcome}"}} {count}')
+            lines += _histogram_lines(
+                'attendance_stage_seconds', 'Wall time spent in each processing stage per run.', self.stage_seconds
+            )
+            lines += _histogram_lines(
+                'attendance_stage_traced_peak_bytes',
+                'Peak tracemalloc-traced memory during each stage (only when TRACE_MEMORY is set).',
+                self.stage_traced_bytes
+            )
+            for name, counter, help_text in (
+                ('attendance_stage_rows_in_total', self.rows_in, 'Rows entering each stage.'),
+                ('attendance_stage_rows_out_total', self.rows_out, 'Rows leaving each stage.'),
+            ):
+                lines += _header(name, 'counter', help_text)
+                lines += [f'{name}{{stage="{stage_name}"}} {count}' for stage_name, count in sorted(counter.items())]
+        if peak_rss is not None:
+            lines += _header(
+                'attendance_process_peak_rss_bytes', 'gauge', 'Largest peak resident set size of any worker process.'
+            )
+            lines.append(f'attendance_process_peak_rss_bytes {peak_rss}')
+        return '\n'.join(lines) + '\n'
+
+
+def _header(name, metric_type, help_text):
+    return [f'# HELP {name} {help_text}', f'# TYPE {name} {metric_type}']
+
+
+def _histogram_lines(name, help_text, histograms):
+    lines = _header(name, 'histogram', help_text)
+    for stage_name, histogram in sorted(histograms.items()):
+        for bound, count in zip(histogram.buckets, histogram.counts):
+            le = bound if isinstance(bound, int) else f'{bound:g}'
+            lines.append(f'{name}_bucket{{stage="{stage_name}",le="{le}"}} {count}')
+        lines.append(f'{name}_bucket{{stage="{stage_name}",le="+Inf"}} {histogram.count}')
+        lines.append(f'{name}_sum{{stage="{stage_name}"}} {histogram.sum}')
+        lines.append(f'{name}_count{{stage="{stage_name}"}} {histogram.count}')
+    return lines
@@ -0,0 +1,95 @@
+"""
+Sortable previews of a processed report.
+
+A preview keeps the formatted report rows once, in name order, together with
+the row permutation for every preview sort, so showing another page or
+another ordering is a slice of arrays rather than another run of the
+pipeline.
+"""
+import numpy as np
+
+from attendance_core import finalize_report
+
+PREVIEW_SORTS = ('hours_last_first', 'last_first', 'behind')
+MAX_PAGE_ROWS = 500
+
+
+class ReportPreview:
+    """
+    A finalized report with one precomputed permutation per sort in
+    PREVIEW_SORTS. 'behind' orders by Hours Ahead/Behind, furthest behind
+    first; every sort breaks ties by last and then first name.
+    """
+
+    def __init__(self, merged_data, selected_columns):
+        report, _ = finalize_report(merged_data, 'last_first', selected_columns)
+        # finalize_report sorted merged_data by name in place, so its rows line
+        # up with the report's even when the sort columns were not selected
+        self.report = report
+        self.ahead = merged_data['Hours Ahead/Behind'].to_numpy(dtype=np.float64)
+        by_name = np.arange(len(report))
+        # lexsort sorts by its last key first; name position breaks the ties
+        self.orders = {
+            'last_first': by_name,
+            'hours_last_first': np.lexsort((by_name, merged_data['Hours Required'].to_numpy())),
+            'behind': np.lexsort((by_name, self.ahead)),
+        }
+
+    def __len__(self):
+        return len(self.report)
+
+    @property
+    def columns(self):
+        return list(self.report.columns)
+
+    @property
+    def attrs(self):
+        return self.report.attrs
+
+    def rows(self, positions):
+        """Report rows at ``positions`` as JSON-ready lists, with missing values as None."""
+        frame = self.report.iloc[positions]
+        return frame.astype(object).where(frame.notna(), None).to_numpy().tolist()
+
+    def page(self, sort_option='hours_last_first', page=1, per_page=50):
+        """One page of the report in ``sort_option`` order."""
+        if sort_option not in self.orders:
+            raise ValueError(f"Unknown preview sort '{sort_option}'. Choose one of: {', '.join(PREVIEW_SORTS)}.")
+        if not 1 <= per_page <= MAX_PAGE_ROWS:
+            raise ValueError(f'Rows per page must be between 1 and {MAX_PAGE_ROWS}.')
+        if page < 1:
+            raise ValueError('Page must be 1 or greater.')
+        start = (page - 1) * per_page
+        return {
+            'sort': sort_option,
+            'page': page,
+            'per_page': per_page,
+            'pages': max(1, -(-len(self) // per_page)),
+            'total_rows': len(self),
+            'columns': self.columns,
+            'rows': self.rows(self.orders[sort_option][start:start + per_page]),
+        }
+
+    def most_behind(self, count=10):
+        """
+        The ``count`` students furthest behind, in 'behind' order. Found with a
+        partial sort that is linear in the report size, so it does not
+        depend on the full 'behind' permutation.
+        """
+        if not 1 <= count <= MAX_PAGE_ROWS:
+            raise ValueError(f'Number of students must be between 1 and {MAX_PAGE_ROWS}.')
+        count = min(count, len(self))
+        positions = np.arange(0)
+        if count:
+            threshold = self.ahead[np.argpartition(self.ahead, count - 1)[count - 1]]
+            # Students tied at the cut-off are taken in name order, as in the full sort
+            below = np.flatnonzero(self.ahead < threshold)
+            tied = np.flatnonzero(self.ahead == threshold)[:count - len(below)]
+            positions = np.concatenate([below, tied])
+            positions = positions[np.lexsort((positions, self.ahead[positions]))]
+        return {
+            'count': len(positions),
+            'total_rows': len(self),
+            'columns': self.columns,
+            'rows': self.rows(positions),
+        }
@@ -1,105 +1,115 @@
 import sys
 import os
-import pandas as pd
-from PyQt5.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout, 
-                             QHBoxLayout, QLabel, QPushButton, QFileDialog, 
-                             QMessageBox, QProgressBar)
+from PyQt5.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout,
+                             QHBoxLayout, QLabel, QPushButton, QFileDialog,
+                             QMessageBox, QProgressBar, QListWidget)
 from PyQt5.QtCore import Qt, QThread, pyqtSignal
 from PyQt5.QtGui import QFont
 
+from attendance_core import batch_output_name, build_report, iter_csv, load_roster
+
+CSV_CHUNK_ROWS = 5000
+WEEKLY_CHUNK_ROWS = 50000  # weekly rows per batch; cancellation is checked between batches
+WRITE_PROGRESS = 70  # per-file percentage at which writing the output starts
+
+class ProcessingCancelled(Exception):
+    pass
+
 class FileProcessor(QThread):
     processing_complete = pyqtSignal(str)
     error_occurred = pyqtSignal(str)
     progress_updated = pyqtSignal(int)
+    status_updated = pyqtSignal(str)
+    file_completed = pyqtSignal(int, str)
+    processing_cancelled = pyqtSignal(str)
+
+    OUTPUT_COLUMNS = ['Lessons Complete', 'Difference in Lessons', 'Weekly Hours', 'Total Cumulative Hours', 'Hours Required']
 
-    def __init__(self, weekly_path, attendance_path):
+    def __init__(self, weekly_paths, attendance_path, output_paths):
         super().__init__()
-        self.weekly_path = weekly_path
+        self.weekly_paths = weekly_paths
         self.attendance_path = attendance_path
-
-    def time_to_hours(self, time_str):
-        """Convert time strings like '90:42' to decimal hours."""
-        if pd.isnull(time_str) or time_str == "---":
-            return 0
+        self.output_paths = output_paths
+        self.file_index = 0
+        self.completed = []
+
+    def check_cancelled(self):
+        if self.isInterruptionRequested():
+            raise ProcessingCancelled()
+
+    def report_progress(self, stage, percent):
+        """Progress callback for the pipeline; also where a pending cancel takes effect."""
+        self.check_cancelled()
+        total = len(self.weekly_paths)
+        self.progress_updated.emit(int((self.file_index * 100 + percent) / total))
+        name = os.path.basename(self.weekly_paths[self.file_index])
+        prefix = f"File {self.file_index + 1} of {total} ({name})" if total > 1 else name
+        self.status_updated.emit(f"{prefix}: {stage}")
+
+    def write_output(self, report, boundaries, output_path):
+        # Write block by block to a temporary file so a cancelled or failed
+        # run never leaves a truncated report behind
+        partial_path = output_path + '.partial'
         try:
-            hours, minutes = map(int, time_str.split(':'))
-            return round(hours + minutes / 60, 2)
-        except ValueError:
-            return 0
+            with open(partial_path, 'w', newline='') as out:
+                for position, block in enumerate(iter_csv(report, boundaries, CSV_CHUNK_ROWS)):
+                    rows_written = min(position * CSV_CHUNK_ROWS, len(report))
+                    self.report_progress(
+                        f"Writing report ({rows_written:,} of {len(report):,} rows)",
+                        WRITE_PROGRESS + (100 - WRITE_PROGRESS) * rows_written / max(len(report), 1)
+                    )
+                    out.write(block)
+            os.replace(partial_path, output_path)
+        finally:
+            if os.path.exists(partial_path):
+                os.remove(partial_path)
 
     def run(self):
         try:
-            # Load the files
-            self.progress_updated.emit(10)
-            attendance_rep = pd.read_csv(self.attendance_path)
-            weekly_attendance_report = pd.read_csv(self.weekly_path)
-            self.progress_updated.emit(30)
-
-            # Standardize name formatting
-            attendance_rep['Last Name'] = attendance_rep['Last Name'].str.strip().str.lower()
-            attendance_rep['First Name'] = attendance_rep['First Name'].str.strip().str.lower()
-
-            weekly_attendance_report['Last Name'] = weekly_attendance_report['StudentName'].str.split(',').str[0].str.strip().str.lower()
-            weekly_attendance_report['First Name'] = weekly_attendance_report['StudentName'].str.split(',').str[1].str.strip().str.lower()
-            self.progress_updated.emit(50)
-
-            # Process Weekly Attendance Report data
-            weekly_attendance_report['Total Hours'] = weekly_attendance_report['TotalMin'].apply(self.time_to_hours)
-
-            # Merge datasets
-            merged_data = pd.merge(
-                attendance_rep[['Last Name', 'First Name', 'Lessons Complete', 'Difference', 'Hours Required', 'Total Hours']],
-                weekly_attendance_report[['Last Name', 'First Name', 'Total Hours']],
-                on=['Last Name', 'First Name'],
-                how='inner',
-                suffixes=('_Cumulative', '_Weekly')
-            )
-            self.progress_updated.emit(70)
-
-            # Sort by Hours Required, then by Last Name and First Name
-            merged_data.sort_values(by=['Hours Required', 'Last Name', 'First Name'], inplace=True)
-
-            # Limit floats to 2 decimal places
-            merged_data['Total Hours_Weekly'] = merged_data['Total Hours_Weekly'].round(2)
-
-            # Rename columns
-            merged_data.rename(columns={
-                'Difference': 'Difference in Lessons',
-                'Total Hours_Weekly': 'Weekly Hours',
-                'Total Hours_Cumulative': 'Total Cumulative Hours'
-            }, inplace=True)
-
-            # Select the required columns with swapped positions
-            final_data = merged_data[['Last Name', 'First Name', 'Lessons Complete', 'Difference in Lessons', 'Weekly Hours', 'Total Cumulative Hours', 'Hours Required']]
-
-            # Insert blank lines between different values for Hours Required
-            output_data = []
-            last_hours_required = None
-            for _, row in final_data.iterrows():
-                if last_hours_required is not None and row['Hours Required'] != last_hours_required:
-                    output_data.append({col: '' for col in final_data.columns})
-                output_data.append(row.to_dict())
-                last_hours_required = row['Hours Required']
-
-            output_df = pd.DataFrame(output_data)
-
-            # Save the result to a CSV file in the Downloads folder
-            downloads_folder = os.path.join(os.path.expanduser("~"), "Downloads")
-            output_path = os.path.join(downloads_folder, "Sorted_Attendance_Report.csv")
-            output_df.to_csv(output_path, index=False)
+            # Load and index the attendance report once for every queued weekly file
+            self.report_progress('Loading attendance report', 5)
+            roster = load_roster(self.attendance_path)
+
+            for self.file_index, (weekly_path, output_path) in enumerate(zip(self.weekly_paths, self.output_paths)):
+                # Merge, sort and group with the same pipeline as the web app,
+                # streaming the weekly file in batches for row-level progress
+                report, boundaries = build_report(
+                    weekly_path,
+                    None,
+                    'hours_last_first',
+                    self.OUTPUT_COLUMNS,
+                    chunksize=WEEKLY_CHUNK_ROWS,
+                    roster=roster,
+                    progress=self.report_progress
+                )
+                self.write_output(report, boundaries, output_path)
+                self.completed.append(output_path)
+                self.file_completed.emit(self.file_index, output_path)
             self.progress_updated.emit(100)
 
-            self.processing_complete.emit(f"Output file saved to {output_path}")
-
+            if len(self.completed) == 1:
+                self.processing_complete.emit(f"Output file saved to {self.completed[0]}")
+            else:
+                folder = os.path.dirname(self.completed[0])
+                self.processing_complete.emit(f"{len(self.completed)} output files saved to {folder}")
+
+        except ProcessingCancelled:
+            message = "Processing cancelled."
+            if self.completed:
+                message += f" {len(self.completed)} finished file(s) were kept."
+            self.processing_cancelled.emit(message)
         except Exception as e:
-            self.error_occurred.emit(str(e))
+            if len(self.weekly_paths) > 1:
+                self.error_occurred.emit(f"{os.path.basename(self.weekly_paths[self.file_index])}: {e}")
+            else:
+                self.error_occurred.emit(str(e))
 
 class AttendanceProcessorApp(QMainWindow):
     def __init__(self):
         super().__init__()
         self.setWindowTitle('Attendance Report Processor')
         self.setGeometry(100, 100, 500, 400)
-        
+
         # Central Widget
         central_widget = QWidget()
         self.setCentralWidget(central_widget)
@@ -110,15 +120,19 @@ class AttendanceProcessorApp(QMainWindow):
         weekly_layout = QHBoxLayout()
         attendance_layout = QHBoxLayout()
         main_layout.addLayout(weekly_layout)
-        main_layout.addLayout(attendance_layout)
 
-        # Weekly Attendance Report
-        self.weekly_label = QLabel('Weekly Attendance Report: Not Selected')
-        self.weekly_button = QPushButton('Select File')
-        self.weekly_button.clicked.connect(self.select_weekly_file)
+        # Weekly Attendance Reports (several can be queued)
+        self.weekly_label = QLabel('Weekly Attendance Reports: Not Selected')
+        self.weekly_button = QPushButton('Select Files')
+        self.weekly_button.clicked.connect(self.select_weekly_files)
         weekly_layout.addWidget(self.weekly_label)
         weekly_layout.addWidget(self.weekly_button)
 
+        # Queue of weekly files and their status
+        self.queue_list = QListWidget()
+        main_layout.addWidget(self.queue_list)
+        main_layout.addLayout(attendance_layout)
+
         # Attendance Report
         self.attendance_label = QLabel('Attendance Report: Not Selected')
         self.attendance_button = QPushButton('Select File')
@@ -126,11 +140,17 @@ class AttendanceProcessorApp(QMainWindow):
         attendance_layout.addWidget(self.attendance_label)
         attendance_layout.addWidget(self.attendance_button)
 
-        # Process Button
+        # Process and Cancel Buttons
+        button_layout = QHBoxLayout()
+        main_layout.addLayout(button_layout)
         self.process_button = QPushButton('Process Files')
         self.process_button.clicked.connect(self.process_files)
         self.process_button.setEnabled(False)
-        main_layout.addWidget(self.process_button)
+        button_layout.addWidget(self.process_button)
+        self.cancel_button = QPushButton('Cancel')
+        self.cancel_button.clicked.connect(self.cancel_processing)
+        self.cancel_button.setEnabled(False)
+        button_layout.addWidget(self.cancel_button)
 
         # Progress Bar
         self.progress_bar = QProgressBar()
@@ -142,14 +162,20 @@ class AttendanceProcessorApp(QMainWindow):
         main_layout.addWidget(self.status_label)
 
         # Instance variables for file paths
-        self.weekly_file_path = None
+        self.weekly_file_paths = []
         self.attendance_file_path = None
-
-    def select_weekly_file(self):
-        file_path, _ = QFileDialog.getOpenFileName(self, "Select Weekly Attendance Report", "", "CSV Files (*.csv);;Excel Files (*.xlsx)")
-        if file_path:
-            self.weekly_file_path = file_path
-            self.weekly_label.setText(f'Weekly File: {os.path.basename(file_path)}')
+        self.processor_thread = None
+
+    def select_weekly_files(self):
+        file_paths, _ = QFileDialog.getOpenFileNames(self, "Select Weekly Attendance Reports", "", "CSV Files (*.csv);;Excel Files (*.xlsx)")
+        if file_paths:
+            self.weekly_file_paths = file_paths
+            if len(file_paths) == 1:
+                self.weekly_label.setText(f'Weekly File: {os.path.basename(file_paths[0])}')
+            else:
+                self.weekly_label.setText(f'Weekly Files: {len(file_paths)} selected')
+            self.queue_list.clear()
+            self.queue_list.addItems([os.path.basename(path) for path in file_paths])
             self.check_files_selected()
 
     def select_attendance_file(self):
@@ -160,53 +186,110 @@ class AttendanceProcessorApp(QMainWindow):
             self.check_files_selected()
 
     def check_files_selected(self):
-        if self.weekly_file_path and self.attendance_file_path:
+        if self.weekly_file_paths and self.attendance_file_path:
             self.process_button.setEnabled(True)
 
+    def choose_output_paths(self):
+        downloads = os.path.join(os.path.expanduser("~"), "Downloads")
+        if len(self.weekly_file_paths) == 1:
+            default_output = os.path.join(downloads, "Sorted_Attendance_Report.csv")
+            output_path, _ = QFileDialog.getSaveFileName(self, "Save Processed Report", default_output, "CSV Files (*.csv)")
+            return [output_path] if output_path else None
+
+        # One <weekly name>_Processed.csv per queued file, as in the web batch upload
+        output_dir = QFileDialog.getExistingDirectory(self, "Save Processed Reports To", downloads)
+        if not output_dir:
+            return None
+        used_names = set()
+        return [os.path.join(output_dir, batch_output_name(path, used_names)) for path in self.weekly_file_paths]
+
     def process_files(self):
+        output_paths = self.choose_output_paths()
+        if not output_paths:
+            return
+
         # Disable buttons during processing
         self.weekly_button.setEnabled(False)
         self.attendance_button.setEnabled(False)
         self.process_button.setEnabled(False)
-        
+        self.cancel_button.setEnabled(True)
+
         # Reset progress and status
         self.progress_bar.setValue(0)
         self.status_label.setText('')
+        self.queue_list.clear()
+        self.queue_list.addItems([os.path.basename(path) for path in self.weekly_file_paths])
 
         # Create and start processing thread
-        self.processor_thread = FileProcessor(self.weekly_file_path, self.attendance_file_path)
+        self.processor_thread = FileProcessor(self.weekly_file_paths, self.attendance_file_path, output_paths)
         self.processor_thread.processing_complete.connect(self.on_processing_complete)
         self.processor_thread.error_occurred.connect(self.on_processing_error)
+        self.processor_thread.processing_cancelled.connect(self.on_processing_cancelled)
         self.processor_thread.progress_updated.connect(self.update_progress)
+        self.processor_thread.status_updated.connect(self.status_label.setText)
+        self.processor_thread.file_completed.connect(self.on_file_completed)
         self.processor_thread.start()
 
+    def cancel_processing(self):
+        # The worker stops at its next batch or block boundary
+        if self.processor_thread is not None:
+            self.processor_thread.requestInterruption()
+        self.cancel_button.setEnabled(False)
+        self.status_label.setText('Cancelling...')
+
     def update_progress(self, value):
         self.progress_bar.setValue(value)
 
-    def on_processing_complete(self, message):
-        QMessageBox.information(self, "Processing Complete", message)
-        self.status_label.setText("Processing Complete!")
-        
+    def on_file_completed(self, index, output_path):
+        item = self.queue_list.item(index)
+        if item is not None:
+            item.setText(f'{os.path.basename(self.weekly_file_paths[index])} -> {os.path.basename(output_path)}')
+
+    def reset_selection(self):
         # Re-enable buttons
         self.weekly_button.setEnabled(True)
         self.attendance_button.setEnabled(True)
-        self.weekly_file_path = None
+        self.cancel_button.setEnabled(False)
+        self.weekly_file_paths = []
         self.attendance_file_path = None
 
         # Reset labels
-        self.weekly_label.setText('Weekly Attendance Report: Not Selected')
+        self.weekly_label.setText('Weekly Attendance Reports: Not Selected')
         self.attendance_label.setText('Attendance Report: Not Selected')
         self.process_button.setEnabled(False)
 
+    def on_processing_complete(self, message):
+        QMessageBox.information(self, "Processing Complete", message)
+        self.status_label.setText("Processing Complete!")
+        self.reset_selection()
+
+    def on_processing_cancelled(self, message):
+        self.status_label.setText(message)
+        self.progress_bar.setValue(0)
+
+        # Keep the selected files so the run can be restarted
+        self.weekly_button.setEnabled(True)
+        self.attendance_button.setEnabled(True)
+        self.cancel_button.setEnabled(False)
+        self.check_files_selected()
+
     def on_processing_error(self, error):
         QMessageBox.critical(self, "Processing Error", str(error))
         self.status_label.setText("Processing Failed!")
-        
+
         # Re-enable buttons
         self.weekly_button.setEnabled(True)
         self.attendance_button.setEnabled(True)
+        self.cancel_button.setEnabled(False)
         self.process_button.setEnabled(False)
 
+    def closeEvent(self, event):
+        # Stop a running worker before the window goes away
+        if self.processor_thread is not None and self.processor_thread.isRunning():
+            self.processor_thread.requestInterruption()
+            self.processor_thread.wait()
+        super().closeEvent(event)
+
 def main():
     app = QApplication(sys.argv)
     main_window = AttendanceProcessorApp()
@@ -214,4 +297,4 @@ def main():
     sys.exit(app.exec_())
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    main()
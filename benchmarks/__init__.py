@@ -0,0 +1 @@
+"""Benchmarks for report processing; run with ``python -m benchmarks.run``."""
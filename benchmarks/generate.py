@@ -0,0 +1,144 @@
+"""
+Synthetic weekly and attendance reports shaped like the real exports.
+
+Every roster student appears in the weekly report at least once; some appear
+several times, a few roster names are duplicated, and some weekly names are
+not on the roster at all. TotalMin mixes 'H:MM', 'H:MM:SS', '---', blanks
+and a small share of malformed values, and some weekly names differ from the
+roster only in case and spacing.
+"""
+import os
+
+import numpy as np
+import pandas as pd
+
+ATTENDANCE_COLUMNS = [
+    'Student', 'Lessons Complete', 'Target Lessons', 'Difference', 'VLA Hours', 'Outside of Class Hours',
+    'Total Hours', 'Total Minutes', 'Average Hours Per Day', 'Average Minutes Per Day', 'ID', 'Hours Required',
+    'First Name', 'Last Name', 'Birthdate', 'Grade Level', 'Academic Coach'
+]
+WEEKLY_COLUMNS = [
+    *(f'Textbox{number}' for number in (4, 6, 8, 20, 18, 16, 14, 39, 40, 41, 42, 43, 44, 45)),
+    'StudentName', 'DistrictStudentId', *(f'Minutes{day}' for day in range(1, 8)), 'TotalMin', 'Goal', 'Diff'
+]
+FIRST_NAMES = np.array([
+    'Ava', 'Liam', 'Noah', 'Emma', 'Olivia', 'Mateo', 'Sofia', 'Elijah', 'Amara', 'Lucas', 'Mia', 'Ethan',
+    'Chloe', 'Jose', 'Zoe', 'Aiden', 'Grace', 'Omar', 'Nora', 'Isaac'
+])
+DAY_LABELS = ['Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun', '2/10', '2/11', '2/12', '2/13', '2/14', '2/15', '2/16']
+# Share of weekly rows per TotalMin style: H:MM, H:MM:SS, '---', blank, malformed
+TIME_STYLE_WEIGHTS = (0.60, 0.25, 0.10, 0.04, 0.01)
+
+
+def hours_minutes(hours, minutes):
+    return pd.Series(hours).astype(str) + ':' + pd.Series(minutes).astype(str).str.zfill(2)
+
+
+def make_attendance(students, rng, duplicate_rate=0.001):
+    """Roster of ``students`` names plus ``duplicate_rate`` repeated names with their own numbers."""
+    last = 'Last' + pd.Series(np.arange(students)).astype(str).str.zfill(7)
+    first = pd.Series(rng.choice(FIRST_NAMES, students))
+    duplicates = rng.choice(students, int(students * duplicate_rate), replace=False)
+    last = pd.concat([last, last.iloc[duplicates]], ignore_index=True)
+    first = pd.concat([first, first.iloc[duplicates]], ignore_index=True)
+    rows = len(last)
+
+    lessons = rng.integers(0, 200, rows)
+    target = rng.integers(0, 200, rows)
+    total_hours = rng.integers(0, 700, rows)
+    return pd.DataFrame({
+        'Student': last + ', ' + first,
+        'Lessons Complete': lessons,
+        'Target Lessons': target,
+        'Difference': lessons - target,
+        'VLA Hours': hours_minutes(rng.integers(0, 600, rows), rng.integers(0, 60, rows)),
+        'Outside of Class Hours': hours_minutes(rng.integers(0, 200, rows), rng.integers(0, 60, rows)),
+        'Total Hours': total_hours,
+        'Total Minutes': rng.integers(0, 60, rows),
+        'Average Hours Per Day': rng.integers(0, 8, rows),
+        'Average Minutes Per Day': rng.integers(0, 60, rows),
+        'ID': np.arange(rows) + 9000,
+        'Hours Required': rng.integers(0, 140, rows) * 5,
+        'First Name': first,
+        'Last Name': last,
+        'Birthdate': '1/1/2008',
+        'Grade Level': rng.integers(6, 13, rows),
+        'Academic Coach': pd.Series(rng.integers(0, 40, rows)).map('Coach{}'.format),
+    }, columns=ATTENDANCE_COLUMNS)
+
+
+def make_weekly(attendance, rng, repeat_rate=0.2, unmatched_rate=0.05, variant_rate=0.1):
+    """
+    Weekly rows for every roster student, ``repeat_rate`` extra rows for
+    repeated students and ``unmatched_rate`` rows for students not on the roster.
+    """
+    students = len(attendance)
+    picks = np.concatenate([np.arange(students), rng.choice(students, int(students * repeat_rate))])
+    last = attendance['Last Name'].to_numpy()[picks]
+    first = attendance['First Name'].to_numpy()[picks]
+    names = pd.Series(last) + ', ' + pd.Series(first)
+
+    variants = rng.random(len(names)) < variant_rate
+    names[variants] = '  ' + names[variants].str.upper() + ' '
+    unmatched = int(students * unmatched_rate)
+    missing = (
+        'Missing' + pd.Series(np.arange(unmatched)).astype(str) + ', ' + pd.Series(rng.choice(FIRST_NAMES, unmatched))
+    )
+    names = pd.concat([names, missing], ignore_index=True)
+    rows = len(names)
+
+    hours = rng.integers(0, 40, rows)
+    minutes = rng.integers(0, 60, rows)
+    style = rng.choice(len(TIME_STYLE_WEIGHTS), rows, p=TIME_STYLE_WEIGHTS)
+    total = hours_minutes(hours, minutes)
+    total = total.where(style != 1, total + ':00')
+    total = total.where(style != 2, '---')
+    total = total.where(style != 3, '')
+    total = total.where(style != 4, 'n/a')
+
+    weekly = pd.DataFrame(index=range(rows))
+    for column, label in zip(WEEKLY_COLUMNS, DAY_LABELS):
+        weekly[column] = label
+    weekly['StudentName'] = names
+    weekly['DistrictStudentId'] = np.arange(rows) + 9000
+    for day in range(1, 8):
+        weekly[f'Minutes{day}'] = '---'
+    weekly['TotalMin'] = total
+    weekly['Goal'] = '25:00'
+    weekly['Diff'] = '---'
+    return weekly.sample(frac=1, random_state=rng.integers(2 ** 31)).reset_index(drop=True)
+
+
+def write_report(df, path, file_format):
+    """Write ``df`` via a temporary file so an interrupted run never leaves a partial report behind."""
+    temp_path = path + '.partial'
+    if file_format == 'xlsx':
+        from openpyxl import Workbook
+
+        workbook = Workbook(write_only=True)
+        sheet = workbook.create_sheet()
+        sheet.append(list(df.columns))
+        for row in df.itertuples(index=False):
+            sheet.append(list(row))
+        workbook.save(temp_path)
+    else:
+        df.to_csv(temp_path, index=False)
+    os.replace(temp_path, path)
+
+
+def generate_reports(out_dir, students, file_format='csv', seed=0):
+    """
+    Write a weekly and an attendance report for ``students`` roster students
+    to ``out_dir`` and return (weekly_path, attendance_path). Files that
+    already exist are reused, since the same seed always produces the same data.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    weekly_path = os.path.join(out_dir, f'weekly_{students}_{seed}.{file_format}')
+    attendance_path = os.path.join(out_dir, f'attendance_{students}_{seed}.{file_format}')
+    if not (os.path.exists(weekly_path) and os.path.exists(attendance_path)):
+        rng = np.random.default_rng(seed)
+        attendance = make_attendance(students, rng)
+        weekly = make_weekly(attendance, rng)
+        write_report(attendance, attendance_path, file_format)
+        write_report(weekly, weekly_path, file_format)
+    return weekly_path, attendance_path
@@ -0,0 +1,264 @@
+"""
+Load-test the upload route under gunicorn and compare concurrency settings.
+
+Each configuration starts a local gunicorn with gunicorn_config.py, waits for
+/healthz, then posts the same synthetic upload from ``--concurrency`` client
+threads and reports throughput and p50/p99 latency:
+
+    python -m benchmarks.loadtest                                # 2x1 sync, 1x4 gthread, 2x4 gthread
+    python -m benchmarks.loadtest --configs 4x1:sync,2x2:gthread --concurrency 1,8 --requests 40
+    python -m benchmarks.loadtest --url http://localhost:10000   # an already running server
+    python -m benchmarks.loadtest --measure-memory               # WORKER_MEMORY_MB / JOB_MEMORY_MB for auto-tune
+
+Configurations are WORKERSxTHREADS[:CLASS]; the class defaults to sync for
+one thread and gthread otherwise. Requests answered with 503 (no free job
+slot) are counted as rejected, not as latencies. The time from starting
+gunicorn to its first healthy /healthz is reported as the startup time, so
+GUNICORN_PRELOAD and WARM_UP can be compared by setting them for a run.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from attendance_core import OUTPUT_COLUMNS
+from attendance_metrics import peak_rss_bytes
+from benchmarks.generate import generate_reports
+from benchmarks.run import DATA_DIR, SIZES
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_CONFIGS = '2x1:sync,1x4:gthread,2x4:gthread'
+READY_TIMEOUT = 60  # seconds to wait for gunicorn's /healthz
+
+
+def encode_multipart(fields, files):
+    """Encode form ``fields`` (name -> str or list) and ``files`` (name -> (filename, bytes)) as multipart/form-data."""
+    boundary = uuid.uuid4().hex
+    parts = []
+    for name, values in fields.items():
+        for value in values if isinstance(values, list) else [values]:
+            parts.append(f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode())
+    for name, (filename, content) in files.items():
+        parts.append(
+            f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"; filename="{filename}"\r\n'
+            'Content-Type: application/octet-stream\r\n\r\n'.encode() + content + b'\r\n'
+        )
+    parts.append(f'--{boundary}--\r\n'.encode())
+    return b''.join(parts), f'multipart/form-data; boundary={boundary}'
+
+
+def upload_body(weekly_path, attendance_path):
+    with open(weekly_path, 'rb') as weekly, open(attendance_path, 'rb') as attendance:
+        files = {
+            'weekly_file': (os.path.basename(weekly_path), weekly.read()),
+            'attendance_file': (os.path.basename(attendance_path), attendance.read()),
+        }
+    return encode_multipart({'sort_option': 'hours_last_first', 'columns': list(OUTPUT_COLUMNS)}, files)
+
+
+def post_upload(url, body, content_type, timeout):
+    """POST one upload and read the whole response; returns (status, seconds)."""
+    request = urllib.request.Request(url, data=body, headers={'Content-Type': content_type}, method='POST')
+    start = time.perf_counter()
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            response.read()
+            status = response.status
+    except urllib.error.HTTPError as e:
+        status = e.code
+    except OSError:
+        status = None
+    return status, time.perf_counter() - start
+
+
+def percentile(values, q):
+    """Nearest-rank percentile ``q`` (0-100) of ``values``, or None when empty."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[max(0, min(len(ordered) - 1, int(round(q / 100 * len(ordered))) - 1))]
+
+
+def run_load(url, body, content_type, concurrency, requests, timeout=300):
+    """Send ``requests`` uploads from ``concurrency`` threads and summarize throughput and latency."""
+    results = []
+    lock = threading.Lock()
+
+    def send(_):
+        outcome = post_upload(url, body, content_type, timeout)
+        with lock:
+            results.append(outcome)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(send, range(requests)))
+    elapsed = time.perf_counter() - start
+
+    latencies = [seconds for status, seconds in results if status == 200]
+    return {
+        'concurrency': concurrency,
+        'requests': requests,
+        'ok': len(latencies),
+        'rejected': sum(status == 503 for status, _ in results),
+        'errors': sum(status not in (200, 503) for status, _ in results),
+        'seconds': round(elapsed, 3),
+        'throughput': round(len(latencies) / elapsed, 3) if elapsed else None,
+        'p50': percentile(latencies, 50),
+        'p99': percentile(latencies, 99),
+    }
+
+
+def parse_configs(spec):
+    """'2x1:sync,2x4' -> [(2, 1, 'sync'), (2, 4, 'gthread')]."""
+    configs = []
+    for item in filter(None, (part.strip() for part in spec.split(','))):
+        shape, _, worker_class = item.partition(':')
+        workers, _, threads = shape.lower().partition('x')
+        if not (workers.isdigit() and threads.isdigit()):
+            raise ValueError(f"Invalid configuration '{item}'. Use WORKERSxTHREADS[:CLASS], e.g. 2x4:gthread.")
+        threads = int(threads)
+        configs.append((int(workers), threads, worker_class or ('sync' if threads == 1 else 'gthread')))
+    return configs
+
+
+def start_gunicorn(workers, threads, worker_class, port, upload_dir, max_content_length, extra_env=None):
+    env = dict(
+        os.environ,
+        PORT=str(port),
+        GUNICORN_WORKERS=str(workers),
+        GUNICORN_THREADS=str(threads),
+        GUNICORN_WORKER_CLASS=worker_class,
+        UPLOAD_FOLDER=upload_dir,
+        RESULT_CACHE_MAX_BYTES='0',  # every request does the full work
+        MAX_CONTENT_LENGTH=str(max_content_length),
+        LOG_LEVEL='WARNING',
+        **(extra_env or {})
+    )
+    return subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn_config.py', 'app:app'], cwd=ROOT, env=env
+    )
+
+
+def wait_ready(base_url, server, timeout=READY_TIMEOUT):
+    """Poll /healthz until it answers; returns the seconds since the call."""
+    start = time.monotonic()
+    deadline = start + timeout
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError(f'gunicorn exited with status {server.returncode}')
+        try:
+            with urllib.request.urlopen(f'{base_url}/healthz', timeout=2) as response:
+                if response.status == 200:
+                    return time.monotonic() - start
+        except OSError:
+            time.sleep(0.05)
+    raise RuntimeError(f'gunicorn was not ready within {timeout} seconds')
+
+
+def _job_memory(weekly_path, attendance_path):
+    """Run in a fresh process: (RSS after importing the app, peak RSS after processing one report)."""
+    import app  # noqa: F401 - what every gunicorn worker holds before its first request
+    from attendance_core import process_files
+
+    base = peak_rss_bytes()
+    process_files(weekly_path, attendance_path, 'hours_last_first', list(OUTPUT_COLUMNS))
+    return base, peak_rss_bytes()
+
+
+def measure_memory(weekly_path, attendance_path):
+    """WORKER_MEMORY_MB and JOB_MEMORY_MB for gunicorn_config's auto-tune mode, measured in a clean process."""
+    with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('spawn')) as pool:
+        base, peak = pool.submit(_job_memory, weekly_path, attendance_path).result()
+    if base is None:
+        raise RuntimeError('Peak RSS is not available on this platform')
+    return {'WORKER_MEMORY_MB': -(-base // 2 ** 20), 'JOB_MEMORY_MB': max(1, -(-(peak - base) // 2 ** 20))}
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.loadtest', description=__doc__.split('\n\n')[0])
+    parser.add_argument('--configs', default=DEFAULT_CONFIGS, help=f'WORKERSxTHREADS[:CLASS] list (default: {DEFAULT_CONFIGS}).')
+    parser.add_argument('--url', help='Load-test this running server instead of starting gunicorn.')
+    parser.add_argument('--size', default='1k', choices=list(SIZES), help='Synthetic report size (default: 1k).')
+    parser.add_argument('--format', default='csv', choices=['csv', 'xlsx'], help='Upload format (default: csv).')
+    parser.add_argument('--concurrency', default='1,4,8', help='Comma-separated client thread counts (default: 1,4,8).')
+    parser.add_argument('--requests', type=int, default=24, help='Requests per concurrency level (default: 24).')
+    parser.add_argument('--port', type=int, default=18000, help='Port for the gunicorn under test (default: 18000).')
+    parser.add_argument('--max-concurrent-jobs', type=int, default=0, help='MAX_CONCURRENT_JOBS for the server (default: 0).')
+    parser.add_argument('--data-dir', default=DATA_DIR, help='Where generated reports are kept between runs.')
+    parser.add_argument('--output', help='Write the results JSON here.')
+    parser.add_argument('--measure-memory', action='store_true', help='Print measured worker and per-job memory, then exit.')
+    args = parser.parse_args(argv)
+    try:
+        args.configs = parse_configs(args.configs)
+        args.concurrency = [int(level) for level in args.concurrency.split(',') if level.strip()]
+    except ValueError as e:
+        parser.error(str(e))
+    return args
+
+
+def print_result(label, result):
+    latency = ' '.join(
+        f"{name}={result[name] * 1000:.0f}ms" if result[name] is not None else f'{name}=-' for name in ('p50', 'p99')
+    )
+    print(
+        f"{label:18} c={result['concurrency']:<3} {result['throughput']:8.2f} req/s {latency}"
+        f" ok={result['ok']} rejected={result['rejected']} errors={result['errors']}"
+    )
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    weekly_path, attendance_path = generate_reports(args.data_dir, SIZES[args.size], args.format)
+    if args.measure_memory:
+        for name, value in measure_memory(weekly_path, attendance_path).items():
+            print(f'{name}={value}')
+        return 0
+
+    body, content_type = upload_body(weekly_path, attendance_path)
+    results = []
+    if args.url:
+        targets = [(args.url.rstrip('/'), None)]
+    else:
+        targets = [(f'http://127.0.0.1:{args.port}', config) for config in args.configs]
+    for base_url, config in targets:
+        label = 'external' if config is None else f'{config[0]}x{config[1]}:{config[2]}'
+        server = None
+        startup_seconds = None
+        with tempfile.TemporaryDirectory() as upload_dir:
+            try:
+                if config is not None:
+                    server = start_gunicorn(
+                        *config, args.port, upload_dir, len(body) + 1024 * 1024,
+                        {'MAX_CONCURRENT_JOBS': str(args.max_concurrent_jobs)}
+                    )
+                    startup_seconds = round(wait_ready(base_url, server), 3)
+                    print(f'{label:18} started in {startup_seconds:.2f}s')
+                for concurrency in args.concurrency:
+                    result = run_load(f'{base_url}/', body, content_type, concurrency, args.requests)
+                    result['config'] = label
+                    result['startup_seconds'] = startup_seconds
+                    results.append(result)
+                    print_result(label, result)
+            finally:
+                if server is not None:
+                    server.terminate()
+                    server.wait()
+
+    if args.output:
+        with open(args.output, 'w') as out:
+            json.dump({'size': args.size, 'format': args.format, 'results': results}, out, indent=2)
+            out.write('\n')
+    return 1 if any(result['errors'] for result in results) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,213 @@
+"""
+Time report loading, end-to-end processing and the upload route on synthetic
+reports, and compare the results with a saved JSON baseline.
+
+    python -m benchmarks.run                          # 1k and 100k students, CSV and XLSX
+    python -m benchmarks.run --sizes 1m --formats csv # opt in to the 1M student run
+    python -m benchmarks.run --save-baseline benchmarks/baseline.json
+    python -m benchmarks.run --baseline benchmarks/baseline.json
+
+A comparison run exits with status 1 when any case is slower, or peaks
+higher in memory, than the baseline by more than ``--tolerance``.
+Baselines are machine specific; record one on the machine that compares.
+"""
+import argparse
+import io
+import json
+import logging
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import pandas as pd
+
+from attendance_core import (
+    OUTPUT_COLUMNS,
+    REQUIRED_ATTENDANCE_COLUMNS,
+    REQUIRED_WEEKLY_COLUMNS,
+    load_report,
+    load_roster,
+    merge_reports,
+    process_files,
+)
+from attendance_metrics import StageTimer, peak_rss_bytes
+from benchmarks.generate import generate_reports
+
+SIZES = {'1k': 1_000, '100k': 100_000, '1m': 1_000_000}
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+# Differences below these are treated as noise, whatever the tolerance
+MIN_SECONDS_DELTA = 0.02
+MIN_BYTES_DELTA = 4 * 1024 * 1024
+
+
+def measure(func, repeat):
+    """Best wall time of ``repeat`` untraced calls, then the tracemalloc peak of one more call."""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    tracemalloc.start()
+    try:
+        func()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return {'seconds': round(best, 6), 'peak_bytes': peak}
+
+
+def route_client(upload_dir):
+    """A Flask test client with the result cache off and no upload size limit."""
+    from app import app
+
+    app.config.update(
+        TESTING=True, UPLOAD_FOLDER=upload_dir, RESULT_CACHE_MAX_BYTES=0, MAX_CONTENT_LENGTH=None
+    )
+    return app.test_client()
+
+
+def post_report(client, weekly_path, attendance_path):
+    with open(weekly_path, 'rb') as weekly, open(attendance_path, 'rb') as attendance:
+        data = {
+            'weekly_file': (io.BytesIO(weekly.read()), os.path.basename(weekly_path)),
+            'attendance_file': (io.BytesIO(attendance.read()), os.path.basename(attendance_path)),
+            'sort_option': 'hours_last_first',
+            'columns': list(OUTPUT_COLUMNS),
+        }
+    response = client.post('/', data=data, content_type='multipart/form-data')
+    try:
+        if response.status_code != 200:
+            raise RuntimeError(f'/ returned {response.status_code} for {os.path.basename(weekly_path)}')
+        return response.get_data()
+    finally:
+        response.close()
+
+
+def merged_frame_bytes(weekly_path, attendance_path, compact):
+    """Deep memory usage of the merged frame that finalize_report works on."""
+    merged_data = merge_reports(weekly_path, None, roster=load_roster(attendance_path, compact=compact))
+    return int(merged_data.memory_usage(deep=True).sum())
+
+
+def stage_breakdown(weekly_path, attendance_path):
+    timer = StageTimer()
+    with timer.activate():
+        process_files(weekly_path, attendance_path, 'hours_last_first', list(OUTPUT_COLUMNS))
+    return {totals['stage']: round(totals['seconds'], 6) for totals in timer.snapshot()}
+
+
+def run_benchmarks(sizes, formats, repeat, data_dir, client):
+    results = {}
+    for size in sizes:
+        for file_format in formats:
+            weekly_path, attendance_path = generate_reports(data_dir, SIZES[size], file_format)
+            cases = {
+                'load_report.weekly': lambda: load_report(
+                    weekly_path, is_weekly=True, columns=REQUIRED_WEEKLY_COLUMNS, source_label='Weekly report'
+                ),
+                'load_report.attendance': lambda: load_report(
+                    attendance_path, columns=REQUIRED_ATTENDANCE_COLUMNS, source_label='Attendance report'
+                ),
+                'process_files': lambda: process_files(
+                    weekly_path, None, 'hours_last_first', list(OUTPUT_COLUMNS),
+                    roster=load_roster(attendance_path, compact=False)
+                ),
+                'process_files.compact': lambda: process_files(
+                    weekly_path, None, 'hours_last_first', list(OUTPUT_COLUMNS),
+                    roster=load_roster(attendance_path, compact=True)
+                ),
+                'route': lambda: post_report(client, weekly_path, attendance_path),
+            }
+            for case, func in cases.items():
+                key = f'{size}/{file_format}/{case}'
+                results[key] = measure(func, repeat)
+                print(f"{key:40} {results[key]['seconds']:10.4f} s {results[key]['peak_bytes'] / 2 ** 20:10.1f} MiB")
+            results[f'{size}/{file_format}/process_files']['stages'] = stage_breakdown(weekly_path, attendance_path)
+            for case, compact in (('process_files', False), ('process_files.compact', True)):
+                results[f'{size}/{file_format}/{case}']['merged_bytes'] = merged_frame_bytes(
+                    weekly_path, attendance_path, compact
+                )
+            full, compact = (
+                results[f'{size}/{file_format}/{case}'] for case in ('process_files', 'process_files.compact')
+            )
+            print(
+                f"{f'{size}/{file_format}/compact':40} merged frame {full['merged_bytes'] / 2 ** 20:.1f} -> "
+                f"{compact['merged_bytes'] / 2 ** 20:.1f} MiB, peak {full['peak_bytes'] / 2 ** 20:.1f} -> "
+                f"{compact['peak_bytes'] / 2 ** 20:.1f} MiB"
+            )
+    return results
+
+
+def compare(results, baseline, tolerance):
+    """Return a message for every case that regressed against ``baseline`` beyond ``tolerance``."""
+    regressions = []
+    for key, current in results.items():
+        previous = baseline.get(key)
+        if previous is None:
+            continue
+        for metric, min_delta, unit in (('seconds', MIN_SECONDS_DELTA, 's'), ('peak_bytes', MIN_BYTES_DELTA, 'B')):
+            before, after = previous[metric], current[metric]
+            if after > before * (1 + tolerance) and after - before > min_delta:
+                regressions.append(f'{key} {metric}: {before:g}{unit} -> {after:g}{unit} (+{after / before - 1:.0%})')
+    return regressions
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.run', description=__doc__.split('\n\n')[0])
+    parser.add_argument('--sizes', default='1k,100k', help=f"Comma-separated sizes from {', '.join(SIZES)} (default: 1k,100k).")
+    parser.add_argument('--formats', default='csv,xlsx', help='Comma-separated input formats (default: csv,xlsx).')
+    parser.add_argument('--repeat', type=int, default=3, help='Timed runs per case; the fastest is kept (default: 3).')
+    parser.add_argument('--data-dir', default=DATA_DIR, help='Where generated reports are kept between runs.')
+    parser.add_argument('--output', help='Write the results JSON here.')
+    parser.add_argument('--save-baseline', metavar='PATH', help='Write the results as a new baseline.')
+    parser.add_argument('--baseline', metavar='PATH', help='Compare against this baseline and fail on regressions.')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='Allowed slowdown ratio (default: 0.25).')
+    args = parser.parse_args(argv)
+    args.sizes = [size.strip().lower() for size in args.sizes.split(',') if size.strip()]
+    args.formats = [file_format.strip().lower() for file_format in args.formats.split(',') if file_format.strip()]
+    unknown = [size for size in args.sizes if size not in SIZES] + [
+        file_format for file_format in args.formats if file_format not in ('csv', 'xlsx')
+    ]
+    if unknown:
+        parser.error(f"unknown size or format: {', '.join(unknown)}")
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    # Malformed TotalMin values are generated on purpose; keep their warnings out of the timings
+    logging.getLogger('attendance_core').setLevel(logging.ERROR)
+
+    with tempfile.TemporaryDirectory() as upload_dir:
+        results = run_benchmarks(args.sizes, args.formats, args.repeat, args.data_dir, route_client(upload_dir))
+    report = {
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'machine': platform.platform(),
+        'peak_rss_bytes': peak_rss_bytes(),
+        'results': results,
+    }
+    for path in (args.output, args.save_baseline):
+        if path:
+            with open(path, 'w') as out:
+                json.dump(report, out, indent=2, sort_keys=True)
+                out.write('\n')
+
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            baseline = json.load(baseline_file)['results']
+        regressions = compare(results, baseline, args.tolerance)
+        for message in regressions:
+            print(f'REGRESSION {message}', file=sys.stderr)
+        if regressions:
+            return 1
+        print(f'No regressions against {args.baseline}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
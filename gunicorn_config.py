@@ -1,12 +1,128 @@
 """Gunicorn configuration tuned for Render deployment."""
 
+import logging
 import multiprocessing
 import os
+import shutil
+import time
+
+STARTED = time.monotonic()  # gunicorn reads this file before loading the app
+MIB = 1024 * 1024
+logger = logging.getLogger("gunicorn.error")
 
 port = os.environ.get("PORT", "10000")
 bind = f"0.0.0.0:{port}"
 
-# Keep worker count conservative for free/small plans to avoid OOM.
-workers = int(os.environ.get("GUNICORN_WORKERS", max(2, multiprocessing.cpu_count() // 2)))
-threads = int(os.environ.get("GUNICORN_THREADS", 4))
+# Memory model for GUNICORN_AUTO_TUNE; measure both with
+# `python -m benchmarks.loadtest --measure-memory` on the target machine.
+WORKER_MEMORY_MB = int(os.environ.get("WORKER_MEMORY_MB", 150))  # idle worker with the app imported
+JOB_MEMORY_MB = int(os.environ.get("JOB_MEMORY_MB", 400))  # extra peak per report processed at once
+MEMORY_HEADROOM = 0.8  # share of the memory limit that workers may plan to use
+JOB_WORKERS = int(os.environ.get("JOB_WORKERS", 1))  # background job processes per worker, as in app.py
+
+
+def memory_limit_bytes():
+    """MEMORY_LIMIT_MB, else the cgroup (container) limit, else total RAM; None if unknown."""
+    if os.environ.get("MEMORY_LIMIT_MB"):
+        return int(os.environ["MEMORY_LIMIT_MB"]) * MIB
+    for path in ("/sys/fs/cgroup/memory.max", "/sys/fs/cgroup/memory/memory.limit_in_bytes"):
+        try:
+            with open(path) as limit_file:
+                value = limit_file.read().strip()
+        except OSError:
+            continue
+        # Unlimited cgroups report 'max' (v2) or a huge page-aligned number (v1)
+        if value.isdigit() and int(value) < 2 ** 60:
+            return int(value)
+    try:
+        with open("/proc/meminfo") as meminfo:
+            for line in meminfo:
+                if line.startswith("MemTotal:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
+
+
+def plan_concurrency(memory_bytes, cpus, worker_bytes, job_bytes, headroom=MEMORY_HEADROOM, job_processes=JOB_WORKERS):
+    """
+    Return (workers, threads, jobs_per_worker) that fit ``memory_bytes``.
+
+    Report processing is CPU-bound and mostly holds the GIL, so parallelism
+    comes from worker processes (at most one per CPU, and only as many as
+    can each run a job); each worker then runs as many concurrent jobs as
+    the remaining memory and its share of the CPUs allow. Two threads beyond
+    the job slots keep /healthz, /metrics and job status responsive.
+
+    Every worker also keeps ``job_processes`` background job processes
+    alive, each an interpreter of its own that can hold a job. A job slot is
+    budgeted the same way, for a job in a process of its own, so a batch
+    upload can take one slot per child process it starts.
+    """
+    usable = memory_bytes * headroom
+    slot_bytes = worker_bytes + job_bytes
+    reserved = worker_bytes + job_processes * slot_bytes  # the worker and its background job pool
+    workers = max(1, min(cpus, int(usable // (reserved + slot_bytes))))
+    jobs = int((usable - workers * reserved) // (workers * slot_bytes))
+    jobs = max(1, min(jobs, max(1, cpus // workers)))
+    return workers, jobs + 2, jobs
+
+
+def auto_tune(memory_bytes, cpus):
+    """
+    plan_concurrency with the configured memory estimates. plan_concurrency
+    never plans less than one worker with one job slot, so this warns when
+    even that plan needs more than the usable share of ``memory_bytes``.
+    """
+    worker_bytes, job_bytes = WORKER_MEMORY_MB * MIB, JOB_MEMORY_MB * MIB
+    plan = plan_concurrency(memory_bytes, cpus, worker_bytes, job_bytes)
+    workers, _, jobs = plan
+    needed = workers * (worker_bytes + (JOB_WORKERS + jobs) * (worker_bytes + job_bytes))
+    usable = memory_bytes * MEMORY_HEADROOM
+    if needed > usable:
+        logger.warning(
+            f"GUNICORN_AUTO_TUNE: {workers} worker(s) with {jobs} job slot(s) need about {needed // MIB} MiB, "
+            f"but only {usable / MIB:.0f} MiB of the {memory_bytes // MIB} MiB limit is usable. Expect "
+            f"out-of-memory restarts; lower JOB_WORKERS or JOB_MEMORY_MB, or use a larger instance."
+        )
+    return plan
+
+
+if os.environ.get("GUNICORN_AUTO_TUNE", "").lower() in ("1", "true", "yes") and memory_limit_bytes():
+    _workers, _threads, _jobs = auto_tune(memory_limit_bytes(), multiprocessing.cpu_count())
+    # Workers fork from this process, so the app sees the semaphore size
+    os.environ.setdefault("MAX_CONCURRENT_JOBS", str(_jobs))
+else:
+    # Keep worker count conservative for free/small plans to avoid OOM.
+    _workers, _threads = max(2, multiprocessing.cpu_count() // 2), 4
+
+workers = int(os.environ.get("GUNICORN_WORKERS", _workers))
+threads = int(os.environ.get("GUNICORN_THREADS", _threads))
+worker_class = os.environ.get("GUNICORN_WORKER_CLASS", "gthread" if threads > 1 else "sync")
 timeout = int(os.environ.get("GUNICORN_TIMEOUT", 120))
+
+# Import the app (and, with WARM_UP=1, run its warm-up) once in the master;
+# forked workers then share that memory copy-on-write and boot without
+# paying the pandas/Flask imports again. Code changes need a full restart.
+preload_app = os.environ.get("GUNICORN_PRELOAD", "").lower() in ("1", "true", "yes")
+
+
+def on_starting(server):
+    # Metrics files of the previous run's workers would be merged into this run's /metrics
+    if os.environ.get("METRICS_DIR"):
+        shutil.rmtree(os.environ["METRICS_DIR"], ignore_errors=True)
+
+
+def when_ready(server):
+    server.log.info(f"Master ready in {time.monotonic() - STARTED:.2f}s (preload_app={preload_app})")
+
+
+def pre_fork(server, worker):
+    worker.forked_at = time.monotonic()
+
+
+def post_worker_init(worker):
+    worker.log.info(
+        f"Worker {worker.pid} ready in {time.monotonic() - worker.forked_at:.2f}s, "
+        f"{time.monotonic() - STARTED:.2f}s after gunicorn started"
+    )
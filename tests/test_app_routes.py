@@ -0,0 +1,327 @@
+import io
+import os
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from app import app, get_job_slots, process_files, reset_job_slots, warm_up
+from attendance_core import VALIDATION_SAMPLE_ROWS, build_report
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+WEEKLY_PATH = os.path.join(ROOT, "testdata", "Weekly Attendance Report (19).csv")
+ATTENDANCE_PATH = os.path.join(ROOT, "testdata", "Attendance Rep 02.17.24.xlsx - Attendance.csv")
+COLUMNS = [
+    "Weekly Hours",
+    "Lessons Complete",
+    "Difference in Lessons",
+    "Total Cumulative Hours",
+    "Hours Required",
+    "Hours Ahead/Behind",
+]
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    monkeypatch.setitem(app.config, "UPLOAD_FOLDER", str(tmp_path))
+    app.config["TESTING"] = True
+    with app.test_client() as client:
+        yield client
+
+
+def upload_form(**extra):
+    with open(WEEKLY_PATH, "rb") as wf, open(ATTENDANCE_PATH, "rb") as af:
+        data = {
+            "weekly_file": (io.BytesIO(wf.read()), "weekly.csv"),
+            "attendance_file": (io.BytesIO(af.read()), "attendance.csv"),
+            "sort_option": "hours_last_first",
+            "columns": COLUMNS,
+        }
+    data.update(extra)
+    return data
+
+
+def test_index_streams_csv_matching_process_files(client, tmp_path, monkeypatch):
+    monkeypatch.setitem(app.config, "CSV_CHUNK_ROWS", 7)
+
+    response = client.post("/", data=upload_form(), content_type="multipart/form-data")
+
+    assert response.status_code == 200
+    assert response.mimetype == "text/csv"
+    assert response.headers["Content-Disposition"].startswith("attachment; filename=Processed_Attendance_Report_")
+    expected = process_files(WEEKLY_PATH, ATTENDANCE_PATH, "hours_last_first", COLUMNS).to_csv(index=False)
+    assert response.get_data(as_text=True) == expected
+    response.close()
+    assert os.listdir(tmp_path) == ["cache"]
+
+
+def test_index_redirects_on_processing_error(client, tmp_path):
+    data = upload_form()
+    data["weekly_file"] = (io.BytesIO(b"StudentName\ndoe, john\n"), "weekly.csv")
+
+    response = client.post("/", data=data, content_type="multipart/form-data")
+
+    assert response.status_code == 302
+    assert os.listdir(tmp_path) == []
+
+
+def test_index_reuses_cached_merge_for_repeated_uploads(client, monkeypatch):
+    import app as app_module
+
+    calls = []
+    original_merge = app_module.merge_reports
+
+    def counting_merge(*args, **kwargs):
+        calls.append(args)
+        return original_merge(*args, **kwargs)
+
+    monkeypatch.setattr(app_module, "merge_reports", counting_merge)
+
+    first = client.post("/", data=upload_form(), content_type="multipart/form-data")
+    second = client.post(
+        "/", data=upload_form(sort_option="last_first"), content_type="multipart/form-data"
+    )
+
+    assert len(calls) == 1
+    expected = process_files(WEEKLY_PATH, ATTENDANCE_PATH, "last_first", COLUMNS).to_csv(index=False)
+    assert second.get_data(as_text=True) == expected
+    first.close()
+    second.close()
+
+
+def test_cached_merge_is_keyed_by_attendance_duplicate_policy(client, monkeypatch):
+    with open(ATTENDANCE_PATH, "rb") as af:
+        attendance = af.read()
+    first_row = attendance.splitlines()[1]
+    duplicated = attendance.rstrip(b"\r\n") + b"\n" + first_row + b"\n"
+
+    def post():
+        data = upload_form()
+        data["attendance_file"] = (io.BytesIO(duplicated), "attendance.csv")
+        response = client.post("/", data=data, content_type="multipart/form-data")
+        response.get_data()
+        response.close()
+        return response
+
+    monkeypatch.setitem(app.config, "ATTENDANCE_DUPLICATES", "first")
+    assert post().status_code == 200
+    monkeypatch.setitem(app.config, "ATTENDANCE_DUPLICATES", "error")
+    # A cached "first" merge must not hide the duplicate from the stricter policy
+    assert post().status_code == 302
+
+
+@pytest.mark.parametrize("spool_bytes", [1024, 8 * 1024 * 1024])
+def test_index_processes_uploads_without_saving_them(client, tmp_path, monkeypatch, spool_bytes):
+    import app as app_module
+
+    def fail_save(*args):
+        raise AssertionError("synchronous uploads should not be saved to UPLOAD_FOLDER")
+
+    monkeypatch.setattr(app_module, "save_upload", fail_save)
+    monkeypatch.setitem(app.config, "UPLOAD_SPOOL_BYTES", spool_bytes)
+
+    response = client.post("/", data=upload_form(), content_type="multipart/form-data")
+
+    expected = process_files(WEEKLY_PATH, ATTENDANCE_PATH, "hours_last_first", COLUMNS).to_csv(index=False)
+    assert response.get_data(as_text=True) == expected
+    response.close()
+    assert os.listdir(tmp_path) == ["cache"]
+
+
+def wait_for_job(client, status_url, timeout=60):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        status = client.get(status_url).get_json()
+        if status["status"] in ("done", "failed"):
+            return status
+        time.sleep(0.1)
+    raise AssertionError(f"job did not finish: {status}")
+
+
+def test_index_limits_concurrent_reports_per_worker(client, monkeypatch, request):
+    monkeypatch.setitem(app.config, "MAX_CONCURRENT_JOBS", 1)
+    monkeypatch.setitem(app.config, "JOB_SLOT_TIMEOUT", 0)
+    reset_job_slots()
+    request.addfinalizer(reset_job_slots)
+    slots = get_job_slots()
+
+    assert slots.acquire(blocking=False)
+    try:
+        busy = client.post("/", data=upload_form(), content_type="multipart/form-data")
+    finally:
+        slots.release()
+    response = client.post("/", data=upload_form(), content_type="multipart/form-data")
+    response.get_data()
+    response.close()
+
+    assert busy.status_code == 503
+    assert busy.headers["Retry-After"] == "5"
+    assert response.status_code == 200
+    # The slot is free again once the streamed response has been closed
+    assert slots.acquire(blocking=False)
+    slots.release()
+
+
+def test_job_slots_are_created_once_under_concurrent_first_use(monkeypatch, request):
+    monkeypatch.setitem(app.config, "MAX_CONCURRENT_JOBS", 2)
+    reset_job_slots()
+    request.addfinalizer(reset_job_slots)
+    start = threading.Barrier(8)
+
+    def first_use():
+        start.wait()
+        return get_job_slots()
+
+    with ThreadPoolExecutor(8) as pool:
+        created = list(pool.map(lambda _: first_use(), range(8)))
+
+    assert len({id(slots) for slots in created}) == 1
+
+
+def test_background_job_reports_status_and_serves_result(client):
+    response = client.post(
+        "/", data=upload_form(background="1"), content_type="multipart/form-data"
+    )
+
+    assert response.status_code == 202
+    job = response.get_json()
+    assert job["status"] == "queued"
+
+    status = wait_for_job(client, job["status_url"])
+    assert status["status"] == "done"
+    assert status["progress"] == 100
+
+    result = client.get(status["result_url"])
+    expected = process_files(WEEKLY_PATH, ATTENDANCE_PATH, "hours_last_first", COLUMNS).to_csv(index=False)
+    assert result.get_data(as_text=True) == expected
+    result.close()
+
+
+def test_background_job_records_failure(client):
+    # The bad name sits past the rows /validate samples, so only the job finds it
+    weekly = b"StudentName,TotalMin\n" + b'"doe, john",1:00\n' * VALIDATION_SAMPLE_ROWS + b"John Doe,1:00\n"
+    data = upload_form(background="1")
+    data["weekly_file"] = (io.BytesIO(weekly), "weekly.csv")
+
+    job = client.post("/", data=data, content_type="multipart/form-data").get_json()
+    status = wait_for_job(client, job["status_url"])
+
+    assert status["status"] == "failed"
+    assert "'Last, First' format" in status["error"]
+    assert client.get(f"/jobs/{job['id']}/result").status_code == 409
+
+
+def test_background_upload_is_rejected_before_queueing_when_columns_are_missing(client, tmp_path):
+    data = upload_form(background="1")
+    data["weekly_file"] = (io.BytesIO(b"StudentName\ndoe, john\n"), "weekly.csv")
+
+    response = client.post("/", data=data, content_type="multipart/form-data")
+
+    assert response.status_code == 400
+    assert response.get_json()["issues"][0]["code"] == "missing_columns"
+    assert os.listdir(tmp_path) == []
+
+
+def test_validate_reports_structured_issues_from_a_sample(client):
+    weekly = b'StudentName,TotalMin\n"doe, john",1:30\nJohn Doe,2:00\n"roe, jane",abc\n'
+    data = {
+        "weekly_file": (io.BytesIO(weekly), "weekly.csv"),
+        "attendance_file": (io.BytesIO(b"Last Name,First Name\ndoe,john\n"), "attendance.csv"),
+    }
+
+    payload = client.post("/validate", data=data, content_type="multipart/form-data").get_json()
+
+    assert payload["valid"] is False
+    issues = {issue["code"]: issue for issue in payload["issues"]}
+    assert issues["name_format"]["rows"] == [2]
+    assert issues["name_format"]["file"] == "weekly.csv"
+    assert issues["time_format"]["severity"] == "warning"
+    assert issues["time_format"]["examples"] == ["abc"]
+    assert issues["missing_columns"]["columns"] == ["Difference", "Hours Required", "Lessons Complete", "Total Hours"]
+    assert client.post("/validate", data=upload_form(), content_type="multipart/form-data").get_json() == {
+        "valid": True, "issues": []
+    }
+
+
+def test_queueing_a_job_purges_expired_jobs_whatever_their_status(client, tmp_path, monkeypatch):
+    import app as app_module
+
+    monkeypatch.setitem(app.config, "JOB_TTL", 60)
+    store = app_module.get_job_store()
+    for job_id, status in (("failed0", "failed"), ("running0", "running"), ("done0", "done")):
+        os.makedirs(tmp_path / "jobs" / job_id)
+        store.create(job_id, "report.csv")
+        store.update(job_id, status=status)
+    with store._connect() as conn:
+        conn.execute("UPDATE jobs SET updated = ?", (time.time() - 120,))
+
+    job = client.post("/", data=upload_form(background="1"), content_type="multipart/form-data").get_json()
+    wait_for_job(client, job["status_url"])
+
+    assert os.listdir(tmp_path / "jobs") == [job["id"]]
+    assert store.get("failed0") is None
+
+
+def test_unknown_job_returns_404(client):
+    assert client.get("/jobs/does-not-exist").status_code == 404
+
+
+@pytest.mark.parametrize("available", [True, False])
+def test_parquet_output_is_offered_only_when_pyarrow_is_installed(client, monkeypatch, available):
+    monkeypatch.setitem(app.config, "PARQUET_OUTPUT", available)
+
+    page = client.get("/").get_data(as_text=True)
+
+    assert ('<option value="parquet">' in page) is available
+
+
+def json_rows(report):
+    return report.astype(object).where(report.notna(), None).to_numpy().tolist()
+
+
+def test_preview_pages_and_resorts_a_stored_report(client):
+    created = client.post("/preview", data=upload_form(per_page="5"), content_type="multipart/form-data")
+
+    assert created.status_code == 201
+    preview = created.get_json()
+    by_hours, _ = build_report(WEEKLY_PATH, ATTENDANCE_PATH, "hours_last_first", COLUMNS)
+    assert preview["columns"] == list(by_hours.columns)
+    assert preview["rows"] == json_rows(by_hours.head(5))
+    assert preview["total_rows"] == len(by_hours)
+
+    page = client.get(f"{preview['page_url']}?sort=last_first&page=2&per_page=5").get_json()
+    by_name = process_files(WEEKLY_PATH, ATTENDANCE_PATH, "last_first", COLUMNS)
+    assert page["rows"] == json_rows(by_name.iloc[5:10])
+
+    behind = client.get(f"{preview['behind_url']}?count=3").get_json()
+    ahead = [row[preview["columns"].index("Hours Ahead/Behind")] for row in behind["rows"]]
+    assert behind["count"] == 3
+    assert ahead == sorted(by_name["Hours Ahead/Behind"])[:3]
+
+    assert client.get(f"{preview['page_url']}?sort=nope").status_code == 400
+    assert client.get("/preview/00000000-0000-0000-0000-000000000000").status_code == 404
+
+
+def test_importing_the_app_leaves_openpyxl_for_the_xlsx_path():
+    code = "import sys, app; print('openpyxl' in sys.modules)"
+    env = dict(os.environ, WARM_UP="0")
+    result = subprocess.run([sys.executable, "-c", code], cwd=ROOT, env=env, capture_output=True, text=True, check=True)
+
+    assert result.stdout.strip() == "False"
+
+
+def test_warm_up_processes_testdata_and_healthz_reports_it(client, monkeypatch):
+    import app as app_module
+
+    monkeypatch.setitem(app_module.startup, "warm_up_seconds", None)
+    assert client.get("/healthz").get_json() == {"status": "ok", "warm_up_seconds": None}
+
+    seconds = warm_up()
+    monkeypatch.setitem(app_module.startup, "warm_up_seconds", seconds)
+
+    assert seconds > 0
+    assert "openpyxl" in sys.modules
+    assert client.get("/healthz").get_json()["warm_up_seconds"] == seconds
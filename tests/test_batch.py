@@ -0,0 +1,161 @@
+import io
+import os
+import subprocess
+import sys
+import zipfile
+
+import pandas as pd
+import pytest
+
+import attendance_cli
+from app import app, get_job_slots, reset_job_slots
+from attendance_core import process_batch, process_files
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+WEEKLY_PATH = os.path.join(ROOT, "testdata", "Weekly Attendance Report (19).csv")
+ATTENDANCE_PATH = os.path.join(ROOT, "testdata", "Attendance Rep 02.17.24.xlsx - Attendance.csv")
+COLUMNS = ["Weekly Hours", "Hours Required", "Hours Ahead/Behind"]
+
+
+@pytest.fixture
+def weekly_sections(tmp_path):
+    weekly = pd.read_csv(WEEKLY_PATH)
+    paths = []
+    for position, section in enumerate((weekly.iloc[:60], weekly.iloc[60:])):
+        path = tmp_path / f"section{position}.csv"
+        section.to_csv(path, index=False)
+        paths.append(str(path))
+    return paths
+
+
+def test_process_batch_writes_one_report_per_weekly_file(tmp_path, weekly_sections):
+    output_dir = tmp_path / "out"
+    output_dir.mkdir()
+
+    output_paths = process_batch(
+        weekly_sections, ATTENDANCE_PATH, str(output_dir), "hours_last_first", COLUMNS, max_workers=2
+    )
+
+    assert [os.path.basename(path) for path in output_paths] == [
+        "section0_Processed.csv",
+        "section1_Processed.csv",
+    ]
+    for weekly_path, output_path in zip(weekly_sections, output_paths):
+        expected = process_files(weekly_path, ATTENDANCE_PATH, "hours_last_first", COLUMNS).to_csv(index=False)
+        with open(output_path, newline="") as output:
+            assert output.read() == expected
+
+
+def test_index_returns_zip_for_multiple_weekly_files(tmp_path, weekly_sections, monkeypatch):
+    monkeypatch.setitem(app.config, "UPLOAD_FOLDER", str(tmp_path))
+    monkeypatch.setitem(app.config, "BATCH_WORKERS", 2)
+    weekly_files = []
+    for path in weekly_sections:
+        with open(path, "rb") as weekly:
+            weekly_files.append((io.BytesIO(weekly.read()), os.path.basename(path)))
+    with open(ATTENDANCE_PATH, "rb") as attendance:
+        data = {
+            "weekly_file": weekly_files,
+            "attendance_file": (io.BytesIO(attendance.read()), "attendance.csv"),
+            "sort_option": "last_first",
+            "columns": COLUMNS,
+        }
+
+    with app.test_client() as client:
+        response = client.post("/", data=data, content_type="multipart/form-data")
+        assert response.status_code == 200
+        assert response.mimetype == "application/zip"
+        archive = zipfile.ZipFile(io.BytesIO(response.get_data()))
+        response.close()
+
+    assert archive.namelist() == ["section0_Processed.csv", "section1_Processed.csv"]
+    assert sorted(os.listdir(tmp_path)) == ["section0.csv", "section1.csv"]
+
+
+def test_batch_takes_one_job_slot_per_process(tmp_path, weekly_sections, monkeypatch, request):
+    import app as app_module
+
+    monkeypatch.setitem(app.config, "UPLOAD_FOLDER", str(tmp_path))
+    monkeypatch.setitem(app.config, "BATCH_WORKERS", 4)
+    monkeypatch.setitem(app.config, "MAX_CONCURRENT_JOBS", 3)
+    reset_job_slots()
+    request.addfinalizer(reset_job_slots)
+    slots = get_job_slots()
+    process_counts = []
+
+    def recording_batch(*args, **kwargs):
+        process_counts.append(kwargs["max_workers"])
+        return process_batch(*args, **kwargs)
+
+    monkeypatch.setattr(app_module, "process_batch", recording_batch)
+    weekly_files = []
+    for path in weekly_sections:
+        with open(path, "rb") as weekly:
+            weekly_files.append((io.BytesIO(weekly.read()), os.path.basename(path)))
+    with open(ATTENDANCE_PATH, "rb") as attendance:
+        data = {
+            "weekly_file": weekly_files,
+            "attendance_file": (io.BytesIO(attendance.read()), "attendance.csv"),
+            "sort_option": "last_first",
+            "columns": COLUMNS,
+        }
+
+    assert slots.acquire(blocking=False)  # another report holds one of the three slots
+    try:
+        with app.test_client() as client:
+            response = client.post("/", data=data, content_type="multipart/form-data")
+            response.get_data()
+            response.close()
+    finally:
+        slots.release()
+
+    assert response.status_code == 200
+    # Two weekly files and two free slots: one process each, both freed once sent
+    assert process_counts == [2]
+    assert all(slots.acquire(blocking=False) for _ in range(3))
+    for _ in range(3):
+        slots.release()
+
+
+def test_cli_processes_weekly_glob_into_directory(tmp_path, weekly_sections, capsys):
+    output_dir = tmp_path / "cli"
+
+    exit_code = attendance_cli.main(
+        [ATTENDANCE_PATH, str(tmp_path / "section*.csv"), "-o", str(output_dir), "--workers", "1"]
+    )
+
+    assert exit_code == 0
+    assert sorted(os.listdir(output_dir)) == ["section0_Processed.csv", "section1_Processed.csv"]
+    assert capsys.readouterr().out.splitlines() == [
+        str(output_dir / "section0_Processed.csv"),
+        str(output_dir / "section1_Processed.csv"),
+    ]
+
+
+def test_cli_writes_single_report_to_output_file(tmp_path):
+    output_path = tmp_path / "report.csv"
+
+    exit_code = attendance_cli.main(
+        [ATTENDANCE_PATH, WEEKLY_PATH, "-o", str(output_path), "--sort", "last_first", "--column", "Weekly Hours"]
+    )
+
+    assert exit_code == 0
+    expected = process_files(WEEKLY_PATH, ATTENDANCE_PATH, "last_first", ["Weekly Hours"]).to_csv(index=False)
+    assert output_path.read_text() == expected
+
+
+def test_cli_reports_processing_errors(tmp_path, capsys):
+    weekly_path = tmp_path / "weekly.csv"
+    weekly_path.write_text("StudentName\ndoe, john\n")
+
+    exit_code = attendance_cli.main([ATTENDANCE_PATH, str(weekly_path), "-o", str(tmp_path / "out.csv")])
+
+    assert exit_code == 1
+    assert "missing required columns: TotalMin" in capsys.readouterr().err
+
+
+def test_cli_import_does_not_load_pandas():
+    code = "import sys, attendance_cli; print('pandas' in sys.modules or 'flask' in sys.modules)"
+    output = subprocess.run([sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True, check=True)
+
+    assert output.stdout.strip() == "False"
@@ -0,0 +1,103 @@
+import threading
+
+import pandas as pd
+from werkzeug.serving import make_server
+
+from app import app
+from attendance_core import OUTPUT_COLUMNS, process_files
+from benchmarks.generate import generate_reports
+from benchmarks.loadtest import parse_configs, percentile, run_load, upload_body
+from benchmarks.run import compare
+from gunicorn_config import auto_tune, plan_concurrency
+
+
+def test_generated_reports_exercise_duplicates_unmatched_and_time_formats(tmp_path):
+    weekly_path, attendance_path = generate_reports(str(tmp_path), 500)
+
+    weekly = pd.read_csv(weekly_path, dtype=str, keep_default_na=False)
+    assert weekly["TotalMin"].str.count(":").eq(2).any()
+    assert weekly["TotalMin"].isin(["---", ""]).any()
+    report = process_files(weekly_path, attendance_path, "hours_last_first", list(OUTPUT_COLUMNS))
+    summary = report.attrs["match_summary"]
+    assert summary["matched_students"] == summary["roster_students"] == 500
+    assert summary["unmatched_rows"] == 25
+    assert summary["weekly_rows"] > summary["matched_rows"] > 500
+
+
+def test_generated_reports_are_reproducible(tmp_path):
+    first = generate_reports(str(tmp_path / "a"), 100, "xlsx")
+    second = generate_reports(str(tmp_path / "b"), 100, "xlsx")
+
+    for left, right in zip(first, second):
+        assert pd.read_excel(left).equals(pd.read_excel(right))
+
+
+def test_compare_flags_only_meaningful_regressions():
+    baseline = {
+        "1k/csv/route": {"seconds": 1.0, "peak_bytes": 100 * 2 ** 20},
+        "1k/csv/process_files": {"seconds": 0.01, "peak_bytes": 2 ** 20},
+    }
+    results = {
+        "1k/csv/route": {"seconds": 1.5, "peak_bytes": 101 * 2 ** 20},
+        "1k/csv/process_files": {"seconds": 0.02, "peak_bytes": 2 ** 20},
+        "100k/csv/route": {"seconds": 9.0, "peak_bytes": 2 ** 30},
+    }
+
+    regressions = compare(results, baseline, tolerance=0.25)
+
+    assert len(regressions) == 1
+    assert regressions[0].startswith("1k/csv/route seconds: 1s -> 1.5s")
+
+
+def test_run_load_reports_throughput_and_latency(tmp_path, monkeypatch):
+    monkeypatch.setitem(app.config, "UPLOAD_FOLDER", str(tmp_path))
+    monkeypatch.setitem(app.config, "RESULT_CACHE_MAX_BYTES", 0)
+    body, content_type = upload_body(*generate_reports(str(tmp_path / "data"), 50))
+    server = make_server("127.0.0.1", 0, app, threaded=True)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.start()
+    try:
+        result = run_load(f"http://127.0.0.1:{server.server_port}/", body, content_type, concurrency=2, requests=4)
+    finally:
+        server.shutdown()
+        thread.join()
+
+    assert (result["ok"], result["rejected"], result["errors"]) == (4, 0, 0)
+    assert 0 < result["p50"] <= result["p99"]
+    assert result["throughput"] > 0
+
+
+def test_parse_configs_and_percentile():
+    assert parse_configs("2x1, 1x4:gthread,3x2:sync") == [(2, 1, "sync"), (1, 4, "gthread"), (3, 2, "sync")]
+    assert percentile([0.3, 0.1, 0.2, 0.4], 50) == 0.2
+    assert percentile([0.3, 0.1, 0.2, 0.4], 99) == 0.4
+    assert percentile([], 50) is None
+
+
+def test_plan_concurrency_fits_memory_and_cpus():
+    mib = 2 ** 20
+    # Memory bound: each worker needs itself, a 550 MiB background job process and
+    # a 550 MiB job slot, so 80% of 2 GiB fits one worker with one slot
+    assert plan_concurrency(2048 * mib, 8, 150 * mib, 400 * mib) == (1, 3, 1)
+    assert plan_concurrency(4096 * mib, 8, 150 * mib, 400 * mib) == (2, 3, 1)
+    # Without background job processes the same 2 GiB fits a second worker
+    assert plan_concurrency(2048 * mib, 8, 150 * mib, 400 * mib, job_processes=0) == (2, 3, 1)
+    # CPU bound: plenty of memory, one job per CPU spread over the workers
+    assert plan_concurrency(64 * 1024 * mib, 4, 150 * mib, 400 * mib) == (4, 3, 1)
+    # Never less than one worker with one job slot, even when that does not fit
+    assert plan_concurrency(256 * mib, 4, 150 * mib, 400 * mib) == (1, 3, 1)
+
+
+def test_auto_tune_warns_when_the_smallest_plan_does_not_fit(monkeypatch, caplog):
+    mib = 2 ** 20
+    monkeypatch.setattr("gunicorn_config.WORKER_MEMORY_MB", 150)
+    monkeypatch.setattr("gunicorn_config.JOB_MEMORY_MB", 400)
+    monkeypatch.setattr("gunicorn_config.JOB_WORKERS", 1)
+
+    assert auto_tune(2048 * mib, 8) == (1, 3, 1)
+    assert caplog.records == []
+
+    # A worker, its background job process and one job slot need 1250 MiB of 410 usable
+    assert auto_tune(512 * mib, 1) == (1, 3, 1)
+    assert [record.levelname for record in caplog.records] == ["WARNING"]
+    assert "need about 1250 MiB, but only 410 MiB of the 512 MiB limit" in caplog.text
@@ -0,0 +1,128 @@
+import io
+import os
+
+import pandas as pd
+import pytest
+
+from app import app
+from attendance_cli import main
+from attendance_ledger import WeeklyLedger, apply_history, week_start
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+WEEKLY_PATH = os.path.join(ROOT, "testdata", "Weekly Attendance Report (19).csv")
+ATTENDANCE_PATH = os.path.join(ROOT, "testdata", "Attendance Rep 02.17.24.xlsx - Attendance.csv")
+
+
+def week_frame(rows):
+    return pd.DataFrame(rows, columns=["Last Name", "First Name", "Weekly Minutes"])
+
+
+def test_week_start_returns_monday():
+    assert week_start("2024-02-15") == "2024-02-12"
+    assert week_start("2024-02-12") == "2024-02-12"
+    with pytest.raises(ValueError, match="YYYY-MM-DD"):
+        week_start("02/15/2024")
+
+
+def test_recording_a_week_again_replaces_it(tmp_path):
+    ledger = WeeklyLedger(str(tmp_path / "ledger.sqlite3"))
+    ledger.record_week("2024-02-12", week_frame([("doe", "john", 60), ("roe", "jane", 600)]))
+    ledger.record_week("2024-02-12", week_frame([("doe", "john", 45)]))
+
+    rolling, weeks = ledger.rolling_minutes("2024-02-12", 4)
+
+    assert weeks == ["2024-02-12"]
+    assert rolling.to_dict("records") == [
+        {"Last Name": "doe", "First Name": "john", "Rolling Minutes": 45, "Average Minutes": 45}
+    ]
+
+
+def test_duplicate_roster_records_count_a_students_minutes_once(tmp_path):
+    # With duplicates='keep' every record of a student carries their weekly total
+    merged = week_frame([("doe", "john", 90), ("roe", "jane", 30), ("doe", "john", 90)])
+
+    merged = apply_history(merged, str(tmp_path / "ledger.sqlite3"), "2024-02-12", 4)
+
+    assert merged["Rolling Minutes"].tolist() == [90, 30, 90]
+    assert merged["Average Minutes"].tolist() == [90, 30, 90]
+
+
+def test_apply_history_rolls_over_recent_weeks(tmp_path):
+    path = str(tmp_path / "ledger.sqlite3")
+    apply_history(week_frame([("doe", "john", 600)]), path, "2024-01-29", 2)
+    apply_history(week_frame([("doe", "john", 120), ("roe", "jane", 90)]), path, "2024-02-05", 2)
+
+    merged = apply_history(
+        week_frame([("doe", "john", 60), ("roe", "jane", 30), ("poe", "ed", 0)]), path, "2024-02-14", 2
+    )
+
+    assert merged.attrs["history_weeks"] == ["2024-02-12", "2024-02-05"]
+    assert merged["Rolling Minutes"].tolist() == [180, 120, 0]
+    assert merged["Average Minutes"].tolist() == [90, 60, 0]
+
+
+def test_index_adds_history_columns(tmp_path, monkeypatch):
+    monkeypatch.setitem(app.config, "UPLOAD_FOLDER", str(tmp_path))
+    monkeypatch.setitem(app.config, "LEDGER_PATH", str(tmp_path / "ledger.sqlite3"))
+    app.config["TESTING"] = True
+
+    with app.test_client() as client:
+        for week_of in ("2024-02-05", "2024-02-12"):
+            with open(WEEKLY_PATH, "rb") as wf, open(ATTENDANCE_PATH, "rb") as af:
+                data = {
+                    "weekly_file": (io.BytesIO(wf.read()), "weekly.csv"),
+                    "attendance_file": (io.BytesIO(af.read()), "attendance.csv"),
+                    "sort_option": "last_first",
+                    "columns": ["Weekly Hours", "Rolling Weekly Hours", "Average Weekly Hours"],
+                    "week_of": week_of,
+                    "rolling_weeks": "4",
+                }
+            response = client.post("/", data=data, content_type="multipart/form-data")
+            assert response.status_code == 200
+            report = pd.read_csv(io.StringIO(response.get_data(as_text=True)), dtype=str)
+            response.close()
+
+    weekly = report["Weekly Hours"].str.split(":", expand=True).astype(int)
+    rolling = report["Rolling Weekly Hours"].str.split(":", expand=True).astype(int)
+    assert ((rolling[0] * 60 + rolling[1]) == 2 * (weekly[0] * 60 + weekly[1])).all()
+    assert report["Average Weekly Hours"].tolist() == report["Weekly Hours"].tolist()
+
+
+def test_index_rejects_bad_rolling_weeks(tmp_path, monkeypatch):
+    monkeypatch.setitem(app.config, "UPLOAD_FOLDER", str(tmp_path))
+    app.config["TESTING"] = True
+    with app.test_client() as client, open(WEEKLY_PATH, "rb") as wf, open(ATTENDANCE_PATH, "rb") as af:
+        data = {
+            "weekly_file": (io.BytesIO(wf.read()), "weekly.csv"),
+            "attendance_file": (io.BytesIO(af.read()), "attendance.csv"),
+            "sort_option": "last_first",
+            "columns": ["Weekly Hours"],
+            "week_of": "2024-02-12",
+            "rolling_weeks": "0",
+        }
+        response = client.post("/", data=data, content_type="multipart/form-data", follow_redirects=True)
+
+    assert b"Rolling weeks must be between 1 and 52." in response.data
+
+
+def test_cli_records_history(tmp_path, capsys):
+    ledger = str(tmp_path / "ledger.sqlite3")
+    output = tmp_path / "report.csv"
+
+    assert main([ATTENDANCE_PATH, WEEKLY_PATH, "-o", str(output), "--ledger", ledger, "--week", "2024-02-12"]) == 0
+
+    report = pd.read_csv(output, dtype=str)
+    assert list(report.columns[-2:]) == ["Rolling Weekly Hours", "Average Weekly Hours"]
+    assert WeeklyLedger(ledger).recent_weeks("2024-02-12", 4) == ["2024-02-12"]
+
+
+@pytest.mark.parametrize("rolling_weeks", ["0", "-1", "53"])
+def test_cli_rejects_rolling_weeks_outside_the_form_bounds(tmp_path, capsys, rolling_weeks):
+    ledger = str(tmp_path / "ledger.sqlite3")
+
+    with pytest.raises(SystemExit) as exit_info:
+        main([ATTENDANCE_PATH, WEEKLY_PATH, "--ledger", ledger, "--rolling-weeks", rolling_weeks])
+
+    assert exit_info.value.code == 2
+    assert "--rolling-weeks must be between 1 and 52" in capsys.readouterr().err
+    assert not os.path.exists(ledger)
@@ -0,0 +1,152 @@
+import io
+
+import pandas as pd
+import pytest
+from openpyxl import Workbook
+
+from attendance_core import (
+    REQUIRED_WEEKLY_COLUMNS,
+    estimate_report_rows,
+    iter_report_chunks,
+    load_report,
+    validate_report,
+)
+
+
+def write_weekly_xlsx(path):
+    pd.DataFrame(
+        {
+            "Textbox4": ["Mon", "Mon", "Mon"],
+            "StudentName": ["doe, john", "roe, jane", "poe, ed"],
+            "DistrictStudentId": [1, 2, 3],
+            "TotalMin": ["01:30", "---", "02:00"],
+        }
+    ).to_excel(path, index=False)
+
+
+def test_load_report_xlsx_reads_only_requested_columns(tmp_path):
+    path = tmp_path / "weekly.xlsx"
+    write_weekly_xlsx(path)
+
+    df = load_report(str(path), is_weekly=True, columns=REQUIRED_WEEKLY_COLUMNS, source_label="Weekly report")
+
+    assert list(df.columns) == ["StudentName", "TotalMin"]
+    assert df["TotalMin"].tolist() == ["01:30", "---", "02:00"]
+
+
+def test_load_report_xlsx_validates_header_before_reading_rows(tmp_path):
+    path = tmp_path / "weekly.xlsx"
+    pd.DataFrame({"StudentName": ["doe, john"]}).to_excel(path, index=False)
+
+    with pytest.raises(ValueError, match="Weekly report missing required columns: TotalMin"):
+        load_report(str(path), is_weekly=True, columns=REQUIRED_WEEKLY_COLUMNS, source_label="Weekly report")
+
+
+def test_iter_report_chunks_streams_xlsx_in_batches(tmp_path):
+    path = tmp_path / "weekly.xlsx"
+    write_weekly_xlsx(path)
+
+    chunks = list(iter_report_chunks(str(path), 2, is_weekly=True, columns=REQUIRED_WEEKLY_COLUMNS))
+
+    assert [len(chunk) for chunk in chunks] == [2, 1]
+    assert chunks[1]["StudentName"].tolist() == ["poe, ed"]
+
+
+@pytest.mark.parametrize("engine", ["c", "pyarrow"])
+def test_load_report_csv_prunes_columns_and_declares_dtypes(tmp_path, monkeypatch, engine):
+    if engine == "pyarrow":
+        pytest.importorskip("pyarrow")
+    import attendance_core as core
+
+    monkeypatch.setattr(core, "CSV_ENGINE", engine)
+    path = tmp_path / "attendance.csv"
+    pd.DataFrame(
+        {
+            "Student": ["Doe, John"],
+            "Last Name": ["Doe"],
+            "First Name": ["John"],
+            "Lessons Complete": [10],
+            "Difference": [2],
+            "Hours Required": [10],
+            "Total Hours": [12.5],
+            "Academic Coach": ["CoachA"],
+        }
+    ).to_csv(path, index=False)
+
+    df = load_report(str(path), columns=core.REQUIRED_ATTENDANCE_COLUMNS, source_label="Attendance report")
+
+    assert set(df.columns) == core.REQUIRED_ATTENDANCE_COLUMNS
+    assert df["Total Hours"].dtype == "float64"
+    assert df["Lessons Complete"].dtype == "float64"
+    assert df["Last Name"].tolist() == ["Doe"]
+
+
+def test_load_report_csv_validates_header_first(tmp_path):
+    path = tmp_path / "weekly.csv"
+    pd.DataFrame({"StudentName": ["doe, john"], "Other": [1]}).to_csv(path, index=False)
+
+    with pytest.raises(ValueError, match="Weekly report missing required columns: TotalMin"):
+        load_report(str(path), is_weekly=True, columns=REQUIRED_WEEKLY_COLUMNS, source_label="Weekly report")
+
+
+def test_load_report_sniffs_format_of_file_objects(tmp_path):
+    path = tmp_path / "weekly.xlsx"
+    write_weekly_xlsx(path)
+    csv_stream = io.BytesIO(b"StudentName,TotalMin,Extra\n\"doe, john\",25:04,x\n")
+
+    with open(path, "rb") as xlsx_stream:
+        from_xlsx = load_report(xlsx_stream, is_weekly=True, columns=REQUIRED_WEEKLY_COLUMNS)
+    from_csv = load_report(csv_stream, is_weekly=True, columns=REQUIRED_WEEKLY_COLUMNS)
+
+    assert from_xlsx["StudentName"].tolist() == ["doe, john", "roe, jane", "poe, ed"]
+    assert list(from_csv.columns) == ["StudentName", "TotalMin"]
+    assert from_csv["TotalMin"].tolist() == ["25:04"]
+
+
+def test_validate_report_samples_xlsx_without_a_declared_dimension(tmp_path):
+    # openpyxl's write-only workbooks declare no <dimension>, like several exporters
+    path = tmp_path / "weekly.xlsx"
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet()
+    sheet.append(["StudentName", "TotalMin"])
+    for number in range(500):
+        sheet.append([f"doe{number}, john" if number != 3 else "Doe John", "1:30"])
+    workbook.save(path)
+
+    with open(path, "rb") as stream:
+        issues = validate_report(stream, is_weekly=True, sample_rows=10, source_label="Weekly report")
+        assert stream.tell() == 0
+
+    assert [(issue["code"], issue["rows"], issue["examples"]) for issue in issues] == [
+        ("name_format", [4], ["Doe John"])
+    ]
+    assert estimate_report_rows(str(path)) is None
+    assert len(load_report(str(path), is_weekly=True)) == 500
+
+
+def test_validate_report_flags_a_numeric_student_name_column(tmp_path):
+    # A wrong export with student IDs where the names belong reads as int64
+    path = tmp_path / "weekly.xlsx"
+    pd.DataFrame({"StudentName": [1001, 1002], "TotalMin": ["1:30", "2:00"]}).to_excel(path, index=False)
+
+    issues = validate_report(str(path), is_weekly=True, source_label="Weekly report")
+
+    assert [(issue["code"], issue["rows"], issue["examples"]) for issue in issues] == [
+        ("name_format", [1, 2], ["1001", "1002"])
+    ]
+
+
+def test_xlsx_reading_falls_back_to_public_openpyxl(tmp_path, monkeypatch, caplog):
+    path = tmp_path / "weekly.xlsx"
+    write_weekly_xlsx(path)
+    # A later openpyxl without the private parser the fast reader imports
+    monkeypatch.delattr("openpyxl.worksheet._reader.WorkSheetParser")
+
+    weekly = load_report(str(path), is_weekly=True)
+    with open(path, "rb") as stream:
+        issues = validate_report(stream, is_weekly=True, source_label="Weekly report")
+
+    assert weekly["StudentName"].tolist() == ["doe, john", "roe, jane", "poe, ed"]
+    assert issues == []
+    assert estimate_report_rows(str(path)) == 3
+    assert "using its public reader" in caplog.text
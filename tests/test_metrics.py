@@ -0,0 +1,131 @@
+import io
+import os
+import time
+import tracemalloc
+
+import pytest
+
+from app import app
+from attendance_core import build_report
+from attendance_metrics import MetricsRegistry, StageTimer, stage
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+WEEKLY_PATH = os.path.join(ROOT, "testdata", "Weekly Attendance Report (19).csv")
+ATTENDANCE_PATH = os.path.join(ROOT, "testdata", "Attendance Rep 02.17.24.xlsx - Attendance.csv")
+
+
+def test_nested_stage_time_is_not_counted_twice():
+    timer = StageTimer()
+    with timer.activate():
+        with stage("outer", rows_in=3) as outer:
+            time.sleep(0.02)
+            with stage("inner"):
+                time.sleep(0.05)
+            outer.rows_out = 2
+        with stage("inner"):
+            pass
+
+    stages = {totals["stage"]: totals for totals in timer.snapshot()}
+    assert stages["outer"]["seconds"] < 0.045
+    assert stages["inner"]["seconds"] >= 0.05
+    assert stages["inner"]["calls"] == 2
+    assert (stages["outer"]["rows_in"], stages["outer"]["rows_out"]) == (3, 2)
+    assert "outer;dur=" in timer.server_timing()
+
+
+def test_stage_without_active_timer_is_a_no_op():
+    with stage("load") as record:
+        record.rows_out = 1
+    timer = StageTimer()
+    assert timer.snapshot() == []
+
+
+def test_build_report_records_each_stage():
+    timer = StageTimer()
+    with timer.activate():
+        report, _ = build_report(WEEKLY_PATH, ATTENDANCE_PATH, "hours_last_first", ["Weekly Hours"])
+
+    stages = {totals["stage"]: totals for totals in timer.snapshot()}
+    assert {"load", "validate", "normalize", "parse_times", "index", "merge", "sort", "format", "group"} <= set(stages)
+    assert stages["merge"]["rows_out"] == len(report)
+
+
+def test_traced_memory_is_recorded_when_tracing():
+    tracemalloc.start()
+    try:
+        timer = StageTimer()
+        with timer.activate(), stage("allocate"):
+            data = bytearray(2 * 1024 * 1024)
+        del data
+    finally:
+        tracemalloc.stop()
+
+    assert timer.snapshot()[0]["traced_peak_bytes"] >= 2 * 1024 * 1024
+
+
+def test_registry_renders_prometheus_histograms():
+    timer = StageTimer()
+    with timer.activate(), stage("load", rows_in=10) as record:
+        record.rows_out = 10
+    registry = MetricsRegistry()
+    registry.record(timer, "sync")
+
+    text = registry.render()
+    assert 'attendance_runs_total{kind="sync",outcome="ok"} 1' in text
+    assert 'attendance_stage_seconds_bucket{stage="load",le="+Inf"} 1' in text
+    assert 'attendance_stage_seconds_count{stage="load"} 1' in text
+    assert 'attendance_stage_rows_out_total{stage="load"} 10' in text
+
+
+def test_registries_sharing_a_directory_render_combined_totals(tmp_path, monkeypatch):
+    timer = StageTimer()
+    with timer.activate(), stage("load", rows_in=10) as record:
+        record.rows_out = 10
+    # Two gunicorn workers; the second has exited but its counts stay in the totals
+    first, second = MetricsRegistry(str(tmp_path)), MetricsRegistry(str(tmp_path))
+    first.record(timer, "sync")
+    second.record(timer, "sync")
+    second.record([], "sync", "busy")
+    del second
+
+    text = first.render()
+    assert 'attendance_runs_total{kind="sync",outcome="ok"} 2' in text
+    assert 'attendance_runs_total{kind="sync",outcome="busy"} 1' in text
+    assert 'attendance_stage_seconds_count{stage="load"} 2' in text
+    assert 'attendance_stage_rows_out_total{stage="load"} 20' in text
+
+    # A worker forked from the registry's process starts from zero
+    monkeypatch.setattr("attendance_metrics.os.getpid", lambda: -1)
+    first.record([], "job")
+    assert 'attendance_runs_total{kind="job",outcome="ok"} 1' in first.render()
+    assert len(os.listdir(tmp_path)) == 3
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    monkeypatch.setitem(app.config, "UPLOAD_FOLDER", str(tmp_path))
+    app.config["TESTING"] = True
+    with app.test_client() as client:
+        yield client
+
+
+def test_index_sends_server_timing_and_updates_metrics(client, monkeypatch):
+    monkeypatch.setitem(app.config, "SERVER_TIMING", True)
+    with open(WEEKLY_PATH, "rb") as wf, open(ATTENDANCE_PATH, "rb") as af:
+        data = {
+            "weekly_file": (io.BytesIO(wf.read()), "weekly.csv"),
+            "attendance_file": (io.BytesIO(af.read()), "attendance.csv"),
+            "sort_option": "hours_last_first",
+            "columns": ["Weekly Hours"],
+        }
+
+    response = client.post("/", data=data, content_type="multipart/form-data")
+    response.get_data()
+    response.close()
+
+    assert "merge;dur=" in response.headers["Server-Timing"]
+    metrics = client.get("/metrics")
+    assert metrics.mimetype == "text/plain"
+    text = metrics.get_data(as_text=True)
+    assert 'attendance_stage_seconds_count{stage="serialize"}' in text
+    assert 'attendance_runs_total{kind="sync",outcome="ok"}' in text
@@ -0,0 +1,73 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from attendance_core import RosterIndex, process_files
+from attendance_matching import FuzzyIndex, fold_names, soundex
+
+
+def test_fold_names_strips_accents_punctuation_and_suffixes():
+    assert fold_names(["José O'Neil-Smith Jr.", "  MÜLLER ", "de la Cruz III"]).tolist() == [
+        "jose oneil smith",
+        "muller",
+        "de la cruz",
+    ]
+
+
+@pytest.mark.parametrize("word, code", [
+    ("robert", "R163"), ("rupert", "R163"), ("ashcraft", "A261"), ("tymczak", "T522"), ("pfister", "P236"),
+])
+def test_soundex(word, code):
+    assert soundex(word) == code
+
+
+def test_fuzzy_index_matches_variants_and_skips_ambiguous_names():
+    names = pd.MultiIndex.from_tuples([
+        ("smith", "john"), ("garcia-lopez", "maría"), ("o'neil", "patrick"), ("nguyen", "anh"), ("nguyen", "ann"),
+        ("johnson", "katherine"),
+    ])
+    last = ["smith jr.", "garcia lopez", "oneil", "nguyen", "jonson", "zzz"]
+    first = ["john", "maria", "patrick j", "an", "katherine", "john"]
+
+    key_ids, report = FuzzyIndex(names).match(last, first, np.full(len(last), -1))
+
+    assert key_ids.tolist() == [0, 1, 2, -1, 5, -1]
+    assert [(match["roster_name"], match["method"]) for match in report] == [
+        ("smith, john", "folded"),
+        ("garcia-lopez, maría", "folded"),
+        ("o'neil, patrick", "first_word"),
+        ("johnson, katherine", "fuzzy"),
+    ]
+
+
+def test_process_files_fuzzy_mode_recovers_students(tmp_path):
+    weekly = tmp_path / "weekly.csv"
+    attendance = tmp_path / "attendance.csv"
+    pd.DataFrame({
+        "StudentName": ["Peña Jr., José", "Doe, Jane", "Smyth, Jon Paul"],
+        "TotalMin": ["1:00", "2:00", "3:00"],
+    }).to_csv(weekly, index=False)
+    pd.DataFrame({
+        "Last Name": ["Pena", "Doe", "Smyth"],
+        "First Name": ["Jose", "Jane", "Jon"],
+        "Lessons Complete": [1, 2, 3],
+        "Difference": [0, 0, 0],
+        "Hours Required": [10, 10, 10],
+        "Total Hours": [5, 5, 5],
+    }).to_csv(attendance, index=False)
+
+    exact = process_files(str(weekly), str(attendance), "last_first", ["Weekly Hours"])
+    fuzzy = process_files(str(weekly), str(attendance), "last_first", ["Weekly Hours"], matching="fuzzy")
+    chunked = process_files(str(weekly), str(attendance), "last_first", ["Weekly Hours"], chunksize=2, matching="fuzzy")
+
+    assert exact["Last Name"].tolist() == ["doe"]
+    assert fuzzy["Last Name"].tolist() == ["doe", "pena", "smyth"]
+    assert fuzzy["Weekly Hours"].tolist() == ["2:00", "1:00", "3:00"]
+    assert chunked["Weekly Hours"].tolist() == fuzzy["Weekly Hours"].tolist()
+    assert [match["method"] for match in fuzzy.attrs["name_matches"]] == ["folded", "first_word"]
+
+
+def test_unknown_matching_mode_is_rejected():
+    roster = RosterIndex(pd.DataFrame({"Last Name": ["doe"], "First Name": ["jane"]}))
+    with pytest.raises(ValueError, match="Unknown matching mode"):
+        roster.match_names(["doe"], ["jane"], "loose")
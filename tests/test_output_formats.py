@@ -0,0 +1,104 @@
+import io
+import json
+import os
+
+import pandas as pd
+import pytest
+from openpyxl import load_workbook
+
+from app import app
+from attendance_cli import main
+from attendance_core import OUTPUT_COLUMNS, build_report, group_ids, write_report
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+WEEKLY_PATH = os.path.join(ROOT, "testdata", "Weekly Attendance Report (19).csv")
+ATTENDANCE_PATH = os.path.join(ROOT, "testdata", "Attendance Rep 02.17.24.xlsx - Attendance.csv")
+
+
+@pytest.fixture
+def report():
+    return build_report(WEEKLY_PATH, ATTENDANCE_PATH, "hours_last_first", list(OUTPUT_COLUMNS))
+
+
+def test_ndjson_has_one_typed_record_per_student(tmp_path, report):
+    report_df, boundaries = report
+    path = tmp_path / "report.ndjson"
+
+    write_report(report_df, boundaries, str(path), "ndjson", chunk_rows=10)
+
+    records = [json.loads(line) for line in path.read_text().splitlines()]
+    assert len(records) == len(report_df)
+    assert isinstance(records[0]["Hours Required"], int)
+    assert [record["Group"] for record in records] == group_ids(boundaries).tolist()
+
+
+def test_parquet_keeps_column_types(tmp_path, report):
+    pytest.importorskip("pyarrow")
+    report_df, boundaries = report
+    path = tmp_path / "report.parquet"
+
+    write_report(report_df, boundaries, str(path), "parquet")
+
+    table = pd.read_parquet(path)
+    assert len(table) == len(report_df)
+    assert table["Hours Required"].dtype.kind == "i"
+    assert table.groupby("Group")["Hours Required"].nunique().eq(1).all()
+
+
+def test_xlsx_outlines_each_hours_required_group(tmp_path, report):
+    report_df, boundaries = report
+    path = tmp_path / "report.xlsx"
+
+    write_report(report_df, boundaries, str(path), "xlsx", chunk_rows=10)
+
+    sheet = load_workbook(path).active
+    rows = list(sheet.iter_rows(values_only=True))
+    group_count = int(boundaries.sum()) + 1
+    assert rows[0] == tuple(report_df.columns)
+    assert len(rows) == 1 + group_count + len(report_df)
+    assert rows[1][0] == f"Hours Required: {report_df['Hours Required'].iat[0]}"
+    assert sheet.row_dimensions[2].outlineLevel == 0
+    assert sheet.row_dimensions[3].outlineLevel == 1
+    assert rows[2][:2] == tuple(report_df.iloc[0, :2])
+
+
+def test_unknown_format_is_rejected(tmp_path, report):
+    with pytest.raises(ValueError, match="Unknown output format"):
+        write_report(*report, str(tmp_path / "report.txt"), "txt")
+
+
+@pytest.mark.parametrize("output_format, mimetype", [
+    ("ndjson", "application/x-ndjson"),
+    ("xlsx", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"),
+])
+def test_index_returns_requested_format(tmp_path, monkeypatch, output_format, mimetype):
+    monkeypatch.setitem(app.config, "UPLOAD_FOLDER", str(tmp_path))
+    app.config["TESTING"] = True
+    with app.test_client() as client, open(WEEKLY_PATH, "rb") as wf, open(ATTENDANCE_PATH, "rb") as af:
+        data = {
+            "weekly_file": (io.BytesIO(wf.read()), "weekly.csv"),
+            "attendance_file": (io.BytesIO(af.read()), "attendance.csv"),
+            "sort_option": "hours_last_first",
+            "columns": list(OUTPUT_COLUMNS),
+            "output_format": output_format,
+        }
+        response = client.post("/", data=data, content_type="multipart/form-data")
+        body = response.get_data()
+        response.close()
+
+    assert response.status_code == 200
+    assert response.mimetype == mimetype
+    assert response.headers["Content-Disposition"].endswith(f".{output_format}")
+    assert sorted(os.listdir(tmp_path)) == ["cache"]
+    if output_format == "ndjson":
+        assert len(body.decode().splitlines()) == 112
+    else:
+        assert load_workbook(io.BytesIO(body)).active.max_row > 112
+
+
+def test_cli_takes_format_from_output_extension(tmp_path, capsys):
+    output = tmp_path / "report.xlsx"
+
+    assert main([ATTENDANCE_PATH, WEEKLY_PATH, "-o", str(output)]) == 0
+
+    assert load_workbook(output).active.cell(1, 1).value == "Last Name"
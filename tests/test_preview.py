@@ -0,0 +1,42 @@
+import pandas as pd
+import pytest
+
+from attendance_preview import ReportPreview
+
+
+def merged_frame():
+    return pd.DataFrame({
+        "Last Name": ["cole", "abel", "dean", "bell", "eyre"],
+        "First Name": ["ann", "bo", "cy", "di", "ed"],
+        "Weekly Minutes": [60, 30, 0, 90, 45],
+        "Lessons Complete": [1, 2, 3, 4, 5],
+        "Difference": [0, 0, 0, 0, 0],
+        "Hours Required": [20, 10, 20, 10, 20],
+        "Total Hours": [15, 5, 25, 5, 16],
+    })
+
+
+def names(result):
+    return [row[0] for row in result["rows"]]
+
+
+def test_preview_sorts_match_their_definitions():
+    preview = ReportPreview(merged_frame(), ["Hours Required", "Hours Ahead/Behind"])
+
+    assert names(preview.page("last_first", per_page=5)) == ["abel", "bell", "cole", "dean", "eyre"]
+    assert names(preview.page("hours_last_first", per_page=5)) == ["abel", "bell", "cole", "dean", "eyre"]
+    assert names(preview.page("behind", per_page=2)) == ["abel", "bell"]
+    assert names(preview.page("behind", page=3, per_page=2)) == ["dean"]
+    assert preview.page("behind", per_page=2)["pages"] == 3
+    with pytest.raises(ValueError, match="Unknown preview sort"):
+        preview.page("first_last")
+
+
+@pytest.mark.parametrize("count", [1, 2, 3, 5, 50])
+def test_most_behind_matches_the_full_sort_including_ties(count):
+    # abel, bell and cole are tied at -5, so cut-offs inside the tie must keep name order
+    preview = ReportPreview(merged_frame(), [])
+
+    result = preview.most_behind(count)
+
+    assert result["rows"] == preview.rows(preview.orders["behind"][:count])
@@ -2,6 +2,7 @@ import pandas as pd
 import pytest
 
 from app import process_files
+from attendance_core import merge_reports
 
 
 def test_process_files_with_csv(tmp_path):
@@ -137,3 +138,95 @@ def test_process_files_non_numeric_columns(tmp_path):
         process_files(
             str(weekly_path), str(attendance_path), "hours_last_first", ["Weekly Hours"]
         )
+
+
+def test_process_files_inserts_blank_rows_between_hours_groups(tmp_path):
+    weekly_path = tmp_path / "weekly.csv"
+    attendance_path = tmp_path / "attendance.csv"
+
+    pd.DataFrame(
+        {
+            "StudentName": ["doe, john", "roe, jane", "poe, ed"],
+            "TotalMin": ["01:00", "02:00", "03:00"],
+        }
+    ).to_csv(weekly_path, index=False)
+
+    pd.DataFrame(
+        {
+            "Last Name": ["doe", "roe", "poe"],
+            "First Name": ["john", "jane", "ed"],
+            "Lessons Complete": [10, 11, 12],
+            "Difference": [2, 3, 4],
+            "Hours Required": [10, 20, 10],
+            "Total Hours": [12.5, 18, 9],
+        }
+    ).to_csv(attendance_path, index=False)
+
+    result = process_files(
+        str(weekly_path), str(attendance_path), "hours_last_first", ["Weekly Hours", "Hours Required"]
+    )
+
+    assert result["Last Name"].tolist() == ["doe", "poe", "", "roe"]
+    assert result.iloc[2].tolist() == ["", "", "", ""]
+    assert result["Weekly Hours"].tolist() == ["1:00", "3:00", "", "2:00"]
+
+
+def test_process_files_chunked_sums_minutes_per_student(tmp_path):
+    weekly_path = tmp_path / "weekly.csv"
+    attendance_path = tmp_path / "attendance.csv"
+
+    pd.DataFrame(
+        {
+            "StudentName": ["doe, john", "roe, jane", "Doe, John ", "nobody, here", "roe, jane"],
+            "TotalMin": ["01:30", "---", "02:45:10", "05:00", "bad"],
+        }
+    ).to_csv(weekly_path, index=False)
+
+    pd.DataFrame(
+        {
+            "Last Name": ["doe", "roe"],
+            "First Name": ["john", "jane"],
+            "Lessons Complete": [10, 11],
+            "Difference": [2, 3],
+            "Hours Required": [10, 20],
+            "Total Hours": [12.5, 18],
+        }
+    ).to_csv(attendance_path, index=False)
+
+    result = process_files(
+        str(weekly_path), str(attendance_path), "last_first", ["Weekly Hours"], chunksize=2
+    )
+
+    assert result["Last Name"].tolist() == ["doe", "roe"]
+    assert result["Weekly Hours"].tolist() == ["4:15", "0:00"]
+    assert result.attrs["malformed_times"] == ["bad"]
+
+
+def test_merge_reports_chunked_reports_row_progress(tmp_path):
+    weekly_path = tmp_path / "weekly.csv"
+    attendance_path = tmp_path / "attendance.csv"
+    pd.DataFrame(
+        {"StudentName": ["doe, john"] * 5, "TotalMin": ["01:00"] * 5}
+    ).to_csv(weekly_path, index=False)
+    pd.DataFrame(
+        {
+            "Last Name": ["doe"],
+            "First Name": ["john"],
+            "Lessons Complete": [10],
+            "Difference": [2],
+            "Hours Required": [10],
+            "Total Hours": [12.5],
+        }
+    ).to_csv(attendance_path, index=False)
+    updates = []
+
+    merge_reports(
+        str(weekly_path), str(attendance_path), chunksize=2,
+        progress=lambda stage, percent: updates.append((stage, percent))
+    )
+
+    assert updates[2:] == [
+        ("Matching weekly report (2 rows)", 42),
+        ("Matching weekly report (4 rows)", 54),
+        ("Matching weekly report (5 rows)", 60),
+    ]
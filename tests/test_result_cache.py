@@ -0,0 +1,55 @@
+import os
+import time
+
+import pandas as pd
+
+from app import ResultCache
+
+
+def test_result_cache_round_trip_keeps_attrs(tmp_path):
+    cache = ResultCache(str(tmp_path), max_bytes=10 * 1024 * 1024, ttl=60)
+    frame = pd.DataFrame({"Weekly Minutes": [60, 90]})
+    frame.attrs["match_summary"] = {"matched_rows": 2}
+    key = ResultCache.make_key("weekly", "attendance", False)
+
+    assert cache.get(key) is None
+    cache.put(key, frame)
+
+    cached = cache.get(key)
+    assert cached["Weekly Minutes"].tolist() == [60, 90]
+    assert cached.attrs["match_summary"] == {"matched_rows": 2}
+
+
+def test_result_cache_expires_entries_after_ttl(tmp_path):
+    cache = ResultCache(str(tmp_path), max_bytes=10 * 1024 * 1024, ttl=60)
+    cache.put("old", pd.DataFrame({"a": [1]}))
+    stale = time.time() - 120
+    os.utime(tmp_path / "old.pkl", (stale, stale))
+
+    assert cache.get("old") is None
+    assert not (tmp_path / "old.pkl").exists()
+
+
+def test_result_cache_evicts_least_recently_used(tmp_path):
+    frame = pd.DataFrame({"a": range(1000)})
+    cache = ResultCache(str(tmp_path), max_bytes=10 * 1024 * 1024, ttl=3600)
+    cache.put("first", frame)
+    entry_size = os.path.getsize(tmp_path / "first.pkl")
+    cache.max_bytes = entry_size * 2
+    cache.put("second", frame)
+    now = time.time()
+    os.utime(tmp_path / "first.pkl", (now - 30, now - 30))
+    os.utime(tmp_path / "second.pkl", (now - 20, now - 20))
+    cache.get("first")  # refreshes "first", leaving "second" as least recently used
+
+    cache.put("third", frame)
+
+    assert sorted(os.listdir(tmp_path)) == ["first.pkl", "third.pkl"]
+
+
+def test_result_cache_disabled_when_max_bytes_is_zero(tmp_path):
+    cache = ResultCache(str(tmp_path), max_bytes=0, ttl=60)
+    cache.put("key", pd.DataFrame({"a": [1]}))
+
+    assert cache.get("key") is None
+    assert os.listdir(tmp_path) == []
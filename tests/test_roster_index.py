@@ -0,0 +1,143 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from attendance_core import RosterIndex, load_roster, process_files
+
+
+def make_attendance(last_names, first_names):
+    count = len(last_names)
+    return pd.DataFrame(
+        {
+            "Last Name": last_names,
+            "First Name": first_names,
+            "Lessons Complete": range(count),
+            "Difference": [0] * count,
+            "Hours Required": [10] * count,
+            "Total Hours": [12.5] * count,
+        }
+    )
+
+
+def test_roster_index_matches_names_to_key_ids():
+    roster = RosterIndex(make_attendance(["doe", "roe"], ["john", "jane"]))
+
+    key_ids = roster.match(["roe", "doe", "poe"], ["jane", "john", "ed"])
+
+    assert key_ids.tolist() == [1, 0, -1]
+    joined = roster.join(key_ids, pd.DataFrame({"Weekly Minutes": [60, 90, 30]}))
+    assert joined["Last Name"].tolist() == ["roe", "doe"]
+    assert joined["Weekly Minutes"].tolist() == [60, 90]
+
+
+def test_roster_index_join_expands_duplicate_roster_names():
+    roster = RosterIndex(make_attendance(["doe", "doe", "roe"], ["john", "john", "jane"]))
+
+    key_ids = roster.match(["doe"], ["john"])
+    joined = roster.join(key_ids, pd.DataFrame({"Weekly Minutes": [60]}))
+
+    assert len(roster) == 2
+    assert not roster.is_unique
+    assert joined["Lessons Complete"].tolist() == [0, 1]
+    assert joined["Weekly Minutes"].tolist() == [60, 60]
+
+
+@pytest.mark.parametrize(
+    "policy, lessons", [("first", [0, 1]), ("last", [2, 1]), ("keep", [0, 2, 1])]
+)
+def test_roster_index_applies_duplicate_policy(policy, lessons):
+    roster = RosterIndex(make_attendance(["doe", "roe", "doe"], ["john", "jane", "john"]), policy)
+
+    key_ids = roster.match(["doe", "roe"], ["john", "jane"])
+    joined = roster.join(key_ids, pd.DataFrame({"Weekly Minutes": [60, 30]}))
+
+    assert sorted(joined["Lessons Complete"]) == sorted(lessons)
+    assert roster.duplicate_records == 1
+    assert roster.collapsed_records == (0 if policy == "keep" else 1)
+
+
+def test_roster_index_rejects_duplicates_with_error_policy():
+    with pytest.raises(ValueError, match="doe, john"):
+        RosterIndex(make_attendance(["doe", "roe", "doe"], ["john", "jane", "john"]), "error")
+
+
+def test_weekly_rows_are_summed_per_student_before_the_join(tmp_path):
+    weekly_path = tmp_path / "weekly.csv"
+    attendance_path = tmp_path / "attendance.csv"
+    pd.DataFrame(
+        {
+            "StudentName": ["doe, john", "roe, jane", "Doe , John", "doe, john"],
+            "TotalMin": ["01:00", "02:00", "00:30", "---"],
+        }
+    ).to_csv(weekly_path, index=False)
+    make_attendance(["doe", "roe", "doe"], ["john", "jane", "john"]).to_csv(attendance_path, index=False)
+
+    roster = load_roster(str(attendance_path), duplicates="first")
+
+    for chunksize in (None, 2):
+        result = process_files(
+            str(weekly_path), None, "last_first", ["Weekly Hours", "Lessons Complete"],
+            chunksize=chunksize, roster=roster
+        )
+        assert result.values.tolist() == [["doe", "john", "1:30", 0], ["roe", "jane", "2:00", 1]]
+        summary = result.attrs["match_summary"]
+        assert summary["collapsed_weekly_rows"] == 2
+        assert summary["collapsed_attendance_records"] == 1
+
+
+def test_process_files_reports_match_summary(tmp_path):
+    weekly_path = tmp_path / "weekly.csv"
+    pd.DataFrame(
+        {
+            "StudentName": ["doe, john", "poe, ed", "roe, jane"],
+            "TotalMin": ["01:00", "02:00", "03:00"],
+        }
+    ).to_csv(weekly_path, index=False)
+    roster = RosterIndex(make_attendance(["doe", "roe", "moe"], ["john", "jane", "al"]))
+
+    for chunksize in (None, 2):
+        result = process_files(
+            str(weekly_path), None, "last_first", ["Weekly Hours"], chunksize=chunksize, roster=roster
+        )
+        summary = result.attrs["match_summary"]
+        assert summary["weekly_rows"] == 3
+        assert summary["matched_rows"] == 2
+        assert summary["unmatched_rows"] == 1
+        assert summary["roster_students"] == 3
+        assert summary["matched_students"] == 2
+        assert summary["unmatched_names"] == ["poe, ed"]
+        assert np.array_equal(result["Weekly Hours"], ["1:00", "3:00"])
+
+
+def test_compact_roster_narrows_dtypes_without_changing_the_report(tmp_path):
+    weekly_path = tmp_path / "weekly.csv"
+    attendance_path = tmp_path / "attendance.csv"
+    pd.DataFrame(
+        {
+            "StudentName": ["doe, john", "roe, jane", "doe, john", "moe, al"],
+            "TotalMin": ["01:00", "02:15", "40000:00", "---"],
+        }
+    ).to_csv(weekly_path, index=False)
+    attendance = make_attendance(["doe", "roe", "moe"], ["john", "jane", "al"])
+    attendance["Lessons Complete"] = [10, 70000, 3]
+    attendance["Hours Required"] = [-32768, 20, 20]
+    attendance["Total Hours"] = [32767, 0.1, 2]
+    attendance.to_csv(attendance_path, index=False)
+    columns = ["Weekly Hours", "Lessons Complete", "Total Cumulative Hours", "Hours Ahead/Behind"]
+
+    roster = load_roster(str(attendance_path), compact=True)
+    for chunksize in (None, 2):
+        expected = process_files(
+            str(weekly_path), str(attendance_path), "hours_last_first", columns, chunksize=chunksize
+        )
+        report = process_files(
+            str(weekly_path), None, "hours_last_first", columns, chunksize=chunksize, roster=roster
+        )
+        assert report.to_csv(index=False) == expected.to_csv(index=False)
+
+    records = roster.records
+    assert isinstance(records["Last Name"].dtype, pd.CategoricalDtype)
+    assert records["Lessons Complete"].dtype == np.int32
+    assert records["Hours Required"].dtype == np.int16
+    # 0.1 does not survive float32, so Total Hours stays float64
+    assert records["Total Hours"].dtype == np.float64
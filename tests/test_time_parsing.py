@@ -0,0 +1,27 @@
+import pandas as pd
+
+from attendance_core import format_minutes, parse_total_minutes
+
+
+def test_parse_total_minutes_handles_mixed_formats():
+    values = pd.Series(["25:04:00", "8:32", " 90:30 ", "---", "", None, "nan", "12"])
+
+    minutes, malformed = parse_total_minutes(values)
+
+    assert minutes.tolist() == [1504, 512, 5430, 0, 0, 0, 0, 720]
+    assert malformed.empty
+
+
+def test_parse_total_minutes_collects_malformed_values():
+    values = pd.Series(["1:00", "abc", "1:xx", "-2:00"])
+
+    minutes, malformed = parse_total_minutes(values)
+
+    assert minutes.tolist() == [60, 0, 0, 0]
+    assert malformed.tolist() == ["abc", "1:xx", "-2:00"]
+
+
+def test_format_minutes():
+    minutes = pd.Series([0, 5, 545, 5430])
+
+    assert format_minutes(minutes).tolist() == ["0:00", "0:05", "9:05", "90:30"]